@@ -0,0 +1,70 @@
+"""
+PURPOSE: measure the throughput of 1000 concurrent sc2players.aio lookups and
+         how long they hold up the event loop, compared with blocking lookups
+
+USAGE:   python benchmarks/bench_aio.py [numLookups [numPlayers]]
+"""
+
+from __future__ import absolute_import
+from __future__ import division       # python 2/3 compatibility
+from __future__ import print_function # python 2/3 compatibility
+
+import asyncio
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from sc2players import aio
+from sc2players import constants as c
+from sc2players import playerManagement
+from sc2players import playerStorage
+
+
+################################################################################
+async def heartbeat(delays, period=0.001):
+    """record how late the event loop runs a task that wakes every period"""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + period
+        await asyncio.sleep(period)
+        delays.append(loop.time() - expected)
+
+
+################################################################################
+async def concurrentLookups(names, lookup):
+    delays = []
+    beat = asyncio.ensure_future(heartbeat(delays))
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await asyncio.gather(*[lookup(name) for name in names])
+    elapsed = time.perf_counter() - start
+    beat.cancel()
+    return elapsed, max(delays or [0])
+
+
+################################################################################
+async def blockingLookup(name):
+    return playerManagement.getPlayer(name)
+
+
+################################################################################
+if __name__ == "__main__":
+    numLookups = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    numPlayers = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    c.PLAYERS_FOLDER = tempfile.mkdtemp()
+    try:
+        storage = playerStorage.getStorage()
+        storage.commit(dict(("player%d"%i, {"type": "human", "rating": 500 + i, "created": time.time()})
+            for i in range(numPlayers)))
+        rng = random.Random(0)
+        names = ["player%d"%rng.randrange(numPlayers) for i in range(numLookups)]
+        for label, lookup in [("blocking", blockingLookup), ("sc2players.aio", aio.getPlayer)]:
+            playerManagement.getKnownPlayers(reset=True)
+            elapsed, stall = asyncio.run(concurrentLookups(names, lookup))
+            print("%-16s %6d lookups/s  longest event loop stall %8.2f ms"%(
+                label, numLookups / elapsed, 1000 * stall))
+        aio.shutdown()
+    finally:
+        shutil.rmtree(c.PLAYERS_FOLDER)
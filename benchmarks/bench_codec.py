@@ -0,0 +1,38 @@
+"""
+PURPOSE: compare the encode and decode throughput and size of player records
+         in the json and binary codecs
+
+USAGE:   python benchmarks/bench_codec.py [numPlayers]
+"""
+
+from __future__ import absolute_import
+from __future__ import division       # python 2/3 compatibility
+from __future__ import print_function # python 2/3 compatibility
+
+import random
+import sys
+import time
+
+from sc2players import constants as c
+from sc2players import playerCodec
+from sc2players.playerRecord import PlayerRecord
+
+
+################################################################################
+if __name__ == "__main__":
+    numPlayers = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rng = random.Random(0)
+    records = [PlayerRecord(name="player%d"%i, type=c.BOT, initCmd="bot.exe --id %d"%i,
+        initOptions={"raw": True, "score": bool(i % 2)}, rating=rng.randint(0, 3000),
+        lastActivity=time.time() if i % 3 else None).simpleAttrs for i in range(numPlayers)]
+    for kind in c.CODEC_KINDS:
+        codec = playerCodec.getCodec(kind)
+        start = time.perf_counter()
+        encoded = [codec.encode(attrs) for attrs in records]
+        encodeTime = time.perf_counter() - start
+        start = time.perf_counter()
+        decoded = [playerCodec.decode(data) for data in encoded] # detected as when loaded from storage
+        decodeTime = time.perf_counter() - start
+        assert decoded == records
+        print("%-6s  encode %8.0f records/s  decode %8.0f records/s  %5.1f bytes/record"%(kind,
+            numPlayers / encodeTime, numPlayers / decodeTime, sum(len(data) for data in encoded) / numPlayers))
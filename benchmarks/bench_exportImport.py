@@ -0,0 +1,58 @@
+"""
+PURPOSE: measure the time and peak memory of a newline-delimited json round trip
+         of every player between two sqlite player storages
+
+USAGE:   python benchmarks/bench_exportImport.py [numPlayers]
+"""
+
+from __future__ import absolute_import
+from __future__ import division       # python 2/3 compatibility
+from __future__ import print_function # python 2/3 compatibility
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from sc2players import constants as c
+from sc2players import playerManagement
+from sc2players import playerStorage
+from sc2players.playerRecord import PlayerRecord
+
+
+################################################################################
+def measure(label, func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = func(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print("%s %d players in %.2fs (%.0f players/s) with a peak of %.1f MB"%(
+        label, count, elapsed, count / elapsed, peak / 1e6))
+
+
+################################################################################
+if __name__ == "__main__":
+    numPlayers = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    playerManagement.useDaemon(False)
+    folder = tempfile.mkdtemp()
+    try:
+        source = playerStorage.setStorage(c.STORAGE_SQLITE, os.path.join(folder, "source.sqlite"))
+        for first in range(0, numPlayers, 10000):
+            source.commit(dict(("player%d"%i, PlayerRecord(name="player%d"%i, type=c.BOT,
+                initCmd="bot.exe --id %d"%i, rating=i % 3000).simpleAttrs)
+                for i in range(first, min(first + 10000, numPlayers))))
+        filename = os.path.join(folder, "players.ndjson")
+        with open(filename, "w") as f:
+            measure("exported", playerManagement.exportPlayers, f)
+        print("%.1f MB of ndjson"%(os.path.getsize(filename) / 1e6))
+        playerStorage.setStorage(c.STORAGE_SQLITE, os.path.join(folder, "destination.sqlite"))
+        playerManagement.getKnownPlayers(reset=True)
+        with open(filename) as f:
+            measure("imported", playerManagement.importPlayers, f)
+    finally:
+        playerStorage.setStorage(c.STORAGE_JSON).close()
+        shutil.rmtree(folder)
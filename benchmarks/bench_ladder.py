@@ -0,0 +1,48 @@
+"""
+PURPOSE: measure RatingLadder operations over a large number of players and
+         compare ranking against sorting every player's rating
+
+USAGE:   python benchmarks/bench_ladder.py [numPlayers]
+"""
+
+from __future__ import absolute_import
+from __future__ import division       # python 2/3 compatibility
+from __future__ import print_function # python 2/3 compatibility
+
+import random
+import sys
+import time
+
+from sc2players.playerLadder import RatingLadder
+
+
+################################################################################
+def timed(label, count, func):
+    """report the average time of count invocations of func"""
+    start = time.perf_counter()
+    for i in range(count): func(i)
+    elapsed = time.perf_counter() - start
+    print("%-28s %10d ops %12.2f us/op"%(label, count, 1e6 * elapsed / count))
+
+
+################################################################################
+if __name__ == "__main__":
+    numPlayers = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    rng     = random.Random(0)
+    names   = ["player%07d"%i for i in range(numPlayers)]
+    ratings = [int(rng.gauss(1500, 350)) for i in range(numPlayers)]
+    ladder  = RatingLadder()
+    start   = time.perf_counter()
+    for name, rating in zip(names, ratings):
+        ladder.add(name, rating)
+    print("built ladder of %d players in %.2fs"%(numPlayers, time.perf_counter() - start))
+    probes = [rng.choice(names) for i in range(10000)]
+    timed("rankOf"          , 10000, lambda i: ladder.rankOf(probes[i]))
+    timed("percentileOf"    , 10000, lambda i: ladder.percentileOf(probes[i]))
+    timed("topN(100)"       , 1000 , lambda i: ladder.topN(100))
+    timed("countInRange"    , 10000, lambda i: ladder.countInRange(1400 + i % 100, 1600))
+    timed("playersInRange(width 2)", 1000, lambda i: ladder.playersInRange(1500 + i % 50, 1501 + i % 50))
+    timed("setRating"       , 10000, lambda i: ladder.setRating(probes[i], rng.randint(500, 2500)))
+    byRating = dict(zip(names, ratings))
+    timed("rank by full sort (baseline)", 3, lambda i: 1 + sorted(byRating.values(),
+        reverse=True).index(byRating[probes[i]]))
@@ -0,0 +1,50 @@
+"""
+PURPOSE: time NameIndex prefix, substring and nearest spelling lookups against
+         comparing the query with every name
+
+USAGE:   python benchmarks/bench_nameIndex.py [numNames]
+"""
+
+from __future__ import absolute_import
+from __future__ import division       # python 2/3 compatibility
+from __future__ import print_function # python 2/3 compatibility
+
+import random
+import string
+import sys
+import time
+
+from sc2players.playerNames import NameIndex, editDistance
+
+
+################################################################################
+def timed(label, func, repeat=20):
+    start = time.perf_counter()
+    for i in range(repeat): result = func()
+    print("%-26s %10.3f ms  (%d results)"%(label, 1000 * (time.perf_counter() - start) / repeat, len(result)))
+
+
+################################################################################
+if __name__ == "__main__":
+    numNames = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    rng   = random.Random(0)
+    names = set()
+    while len(names) < numNames:
+        names.add("".join(rng.choice(string.ascii_lowercase + string.digits) for i in range(rng.randint(5, 14))))
+    names = sorted(names)
+    rng.shuffle(names) # sorted first only so that the order is reproducible
+    start = time.perf_counter()
+    index = NameIndex(names)
+    print("indexed %d names in %.2fs"%(numNames, time.perf_counter() - start))
+    target = sorted(names)[numNames // 2]
+    typo   = target[:2] + target[3:] # one deletion
+    timed("prefixed"             , lambda: index.prefixed(target[:4]))
+    timed("containing"           , lambda: index.containing(target[1:5]))
+    timed("similar"              , lambda: index.similar(typo))
+    timed("search"               , lambda: index.search(typo))
+    timed("search (4 chars)"     , lambda: index.search("zerg"))
+    timed("search (5 chars)"     , lambda: index.search("abcde"))
+    timed("containing (2 chars)" , lambda: index.containing(target[1:3]))
+    timed("search (2 chars)"     , lambda: index.search(target[1:3]))
+    timed("containing (scan)"    , lambda: sorted(n for n in names if target[1:3] in n), repeat=1)
+    timed("similar (scan)"       , lambda: [n for n in names if editDistance(typo, n, 2) is not None], repeat=1)
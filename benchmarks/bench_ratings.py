@@ -0,0 +1,35 @@
+"""
+PURPOSE: time rating a batch of match results with and without numpy
+
+USAGE:   python benchmarks/bench_ratings.py [numGames [numPlayers]]
+"""
+
+from __future__ import absolute_import
+from __future__ import division       # python 2/3 compatibility
+from __future__ import print_function # python 2/3 compatibility
+
+import random
+import sys
+import time
+
+from sc2players import playerRatings
+
+
+################################################################################
+if __name__ == "__main__":
+    numGames   = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    numPlayers = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    rng     = random.Random(0)
+    ratings = dict(("player%d"%i, rng.randint(500, 2500)) for i in range(numPlayers))
+    names   = list(ratings)
+    games   = []
+    for i in range(numGames):
+        player, opponent = rng.sample(names, 2)
+        games.append((player, opponent, rng.choice([playerRatings.WIN, playerRatings.DRAW, playerRatings.LOSS])))
+    print("%d games among %d players in %d rounds"%(numGames, numPlayers,
+        len(playerRatings.scheduleRounds(games))))
+    for label, useNumpy in [("python", False), ("numpy", True)]:
+        if useNumpy and playerRatings.np is None: continue
+        start = time.perf_counter()
+        playerRatings.rateGames(ratings, games, useNumpy=useNumpy)
+        print("%-8s %8.3fs"%(label, time.perf_counter() - start))
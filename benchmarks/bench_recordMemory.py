@@ -0,0 +1,68 @@
+"""
+PURPOSE: compare the memory used by a large in-memory player cache of compact
+         PlayerRecord objects against the former dict-based record layout
+
+USAGE:   python benchmarks/bench_recordMemory.py [count ...]
+"""
+
+from __future__ import absolute_import
+from __future__ import division       # python 2/3 compatibility
+from __future__ import print_function # python 2/3 compatibility
+
+import gc
+import sys
+import time
+import tracemalloc
+
+from sc2players import constants as c
+from sc2players.playerRecord import PlayerRecord
+
+
+################################################################################
+class DictPlayerRecord(object):
+    """the former PlayerRecord layout: an instance __dict__, a private
+    initOptions dict and private RestrictedType instances per record"""
+    def __init__(self, attrs):
+        self.name           = attrs["name"]
+        self.type           = c.PlayerDesigns(attrs["type"])
+        self.difficulty     = c.ComputerDifficulties(attrs.get("difficulty"))
+        self.initCmd        = attrs["initCmd"]
+        self.initOptions    = dict(attrs["initOptions"])
+        self.rating         = attrs["rating"]
+        self.created        = attrs["created"]
+        self.raceDefault    = str(attrs["raceDefault"]) # a distinct string per parsed record
+        self._matches       = []
+
+
+################################################################################
+def sampleAttrs(i):
+    """representative attributes of the i-th generated player"""
+    attrs = {"name": "player%07d"%i, "type": c.HUMAN, "initCmd": "", "initOptions": {},
+        "rating": 300 + i % 1500, "created": time.time() - i, "raceDefault": "".join(c.ZERG)}
+    if i % 10 == 0: # some bots with launch options
+        attrs.update(type=c.BOT, initCmd="bots.cheese.init", initOptions={"raw": True})
+    return attrs
+
+
+################################################################################
+def measure(factory, count):
+    """the bytes allocated to keep count records alive"""
+    gc.collect()
+    tracemalloc.start()
+    records = [factory(sampleAttrs(i)) for i in range(count)]
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del records
+    gc.collect()
+    return used
+
+
+################################################################################
+if __name__ == "__main__":
+    counts = [int(n) for n in sys.argv[1:]] or [100000, 1000000]
+    print("%10s %16s %16s %8s"%("records", "dict (MB)", "compact (MB)", "saved"))
+    for count in counts:
+        before  = measure(DictPlayerRecord, count)
+        after   = measure(PlayerRecord, count)
+        print("%10d %16.1f %16.1f %7.0f%%"%(count, before / 2**20, after / 2**20,
+            100 * (1 - after / before)))
@@ -0,0 +1,56 @@
+"""
+PURPOSE: compare attaching a memory-mapped player snapshot against building a
+         private PlayerRegistry copy of every player
+
+USAGE:   python benchmarks/bench_snapshot.py [numPlayers]
+"""
+
+from __future__ import absolute_import
+from __future__ import division       # python 2/3 compatibility
+from __future__ import print_function # python 2/3 compatibility
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from sc2players import constants as c
+from sc2players.playerRecord import PlayerRecord
+from sc2players.playerSnapshot import SnapshotRegistry, compileSnapshot
+
+
+################################################################################
+if __name__ == "__main__":
+    numPlayers = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    folder = tempfile.mkdtemp()
+    try:
+        rng = random.Random(0)
+        records = [("player%d"%i, PlayerRecord(name="player%d"%i, type=c.BOT, initCmd="bot.exe --id %d"%i,
+            rating=rng.randint(0, 3000)).simpleAttrs) for i in range(numPlayers)]
+        filename = os.path.join(folder, "players.snapshot")
+        start = time.perf_counter()
+        compileSnapshot(records, filename)
+        print("compiled %d players in %.2fs (%.1f MB)"%(numPlayers, time.perf_counter() - start,
+            os.path.getsize(filename) / 1e6))
+        tracemalloc.start()
+        start = time.perf_counter()
+        registry = SnapshotRegistry(filename)
+        elapsed = time.perf_counter() - start
+        print("attached snapshot in %.1f us using %.1f KB of private memory"%(
+            1e6 * elapsed, tracemalloc.get_traced_memory()[0] / 1e3))
+        probes = [rng.choice(records)[0] for i in range(10000)]
+        start = time.perf_counter()
+        for name in probes: registry[name]
+        print("first lookups: %.1f us each"%(1e6 * (time.perf_counter() - start) / len(probes)))
+        tracemalloc.stop()
+        tracemalloc.start()
+        start = time.perf_counter()
+        private = dict((name, PlayerRecord.fromTrustedDict(attrs)) for name, attrs in records)
+        print("private copy of every player: %.2fs using %.1f MB"%(time.perf_counter() - start,
+            tracemalloc.get_traced_memory()[0] / 1e6))
+        registry.close()
+    finally:
+        shutil.rmtree(folder)
@@ -42,10 +42,45 @@ from __future__ import absolute_import
 from __future__ import division       # python 2/3 compatibility
 from __future__ import print_function # python 2/3 compatibility
 
-from sc2players.playerManagement  import addPlayer, updatePlayer, getPlayer, \
-            delPlayer, buildPlayer, getKnownPlayers, getBlizzBotPlayers, \
-            getStaleRecords, removeStaleRecords
-from sc2players.playerRecord      import PlayerRecord
-from sc2players.playerPreGame     import PlayerPreGame
+import importlib
 
 from sc2players .__version__ import *
+
+_LAZY = { # public name -> module defining it, imported when the name is first used
+    "PlayerRecord"      : "sc2players.playerRecord",
+    "PlayerPreGame"     : "sc2players.playerPreGame",
+    "Lobby"             : "sc2players.playerMatchmaking",
+    "MatchmakingQueue"  : "sc2players.playerMatchmaking",
+}
+for _name in ["addPlayer", "addPlayers", "updatePlayer", "updatePlayers", "modifyPlayer",
+              "getPlayer", "findPlayers", "delPlayer", "delPlayers", "buildPlayer",
+              "getKnownPlayers", "listPlayers", "iterPlayers", "useDaemon", "loadKnownPlayers",
+              "refreshKnownPlayers", "getBlizzBotPlayers", "getStaleRecords", "removeStaleRecords",
+              "migratePlayers", "flushPlayers", "queryPlayers", "getLadder", "applyResults",
+              "setCachePolicy", "getCacheStats", "convertPlayers", "exportPlayers", "importPlayers",
+              "snapshotPlayers", "attachSnapshot", "detachSnapshot"]:
+    _LAZY[_name] = "sc2players.playerManagement"
+del _name
+
+
+################################################################################
+def __getattr__(name):
+    """import the module providing name (or the submodule name) on first use"""
+    try:    moduleName = _LAZY[name]
+    except KeyError:
+        if name.startswith("_"): raise AttributeError("module %r has no attribute %r"%(__name__, name))
+        try:    return importlib.import_module("%s.%s"%(__name__, name))
+        except ModuleNotFoundError as e:
+            if e.name != "%s.%s"%(__name__, name): raise # the submodule exists but couldn't be imported
+            raise AttributeError("module %r has no attribute %r"%(__name__, name))
+    value = globals()[name] = getattr(importlib.import_module(moduleName), name)
+    return value
+
+
+################################################################################
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
+
+
+################################################################################
+__all__ = sorted(_LAZY) + ["VERSION"]
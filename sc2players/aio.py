@@ -0,0 +1,206 @@
+"""
+PURPOSE: awaitable equivalents of the playerManagement functions for asyncio
+         applications
+
+Reading and writing player records (file or database I/O and parsing) runs in
+a bounded pool of worker threads so that the event loop is never blocked.
+Players that are already loaded are returned without leaving the event loop.
+Concurrent requests for the same unloaded player share a single load, and
+changes to the same player are applied one at a time in the order requested.
+"""
+
+from __future__ import absolute_import
+from __future__ import division       # python 2/3 compatibility
+from __future__ import print_function # python 2/3 compatibility
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+import asyncio
+import weakref
+
+from sc2players import constants as c
+from sc2players import playerManagement
+from sc2players.playerRecord import PlayerRecord
+
+
+################################################################################
+_executor   = None # ThreadPoolExecutor performing player I/O, created on first use
+_loopStates = weakref.WeakKeyDictionary() # event loop -> _LoopState
+
+
+################################################################################
+class _LoopState(object):
+    """the loads in flight and record locks of a single event loop"""
+    def __init__(self):
+        self.loads  = {} # name -> future of the PlayerRecord being loaded
+        self.locks  = {} # name -> [asyncio.Lock, number of holders and waiters]
+
+
+################################################################################
+def _state():
+    loop = asyncio.get_running_loop()
+    try:    return _loopStates[loop]
+    except KeyError:
+        state = _loopStates[loop] = _LoopState()
+        return state
+
+
+################################################################################
+def getExecutor():
+    """the executor that performs player I/O, created on first use"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=c.AIO_WORKERS, thread_name_prefix="sc2players")
+    return _executor
+
+
+################################################################################
+def setExecutor(executor):
+    """perform player I/O with executor (None: a default pool of c.AIO_WORKERS
+    threads); return the executor that was replaced"""
+    global _executor
+    previous, _executor = _executor, executor
+    return previous
+
+
+################################################################################
+def shutdown(wait=True):
+    """stop the default executor; a new one is created if needed again"""
+    previous = setExecutor(None)
+    if previous is not None: previous.shutdown(wait=wait)
+
+
+################################################################################
+async def _run(func, *args, **kwargs):
+    return await asyncio.get_running_loop().run_in_executor(
+        getExecutor(), partial(func, *args, **kwargs))
+
+
+################################################################################
+@asynccontextmanager
+async def _recordLock(name):
+    """hold the named player's lock; changes to one player are applied in order"""
+    locks = _state().locks
+    entry = locks.setdefault(name.lower(), [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]: del locks[name.lower()]
+
+
+################################################################################
+async def _recordLocks(names):
+    """acquire the locks of many players, in a consistent order to avoid deadlock"""
+    held = []
+    try:
+        for name in sorted(set(name.lower() for name in names)):
+            lock = _recordLock(name)
+            await lock.__aenter__()
+            held.append(lock)
+    except BaseException:
+        await _releaseLocks(held)
+        raise
+    return held
+
+
+################################################################################
+async def _releaseLocks(held):
+    for lock in reversed(held):
+        await lock.__aexit__(None, None, None)
+
+
+################################################################################
+async def getPlayer(name):
+    """obtain a specific PlayerRecord, loading it in the executor if necessary"""
+    if isinstance(name, PlayerRecord): return name
+    key = name.lower()
+    cache = playerManagement.getKnownPlayers()
+    if cache.isLoaded(key): return cache[key]
+    loads = _state().loads
+    future = loads.get(key)
+    if future is None: # the first request for this player performs the load for all
+        future = loads[key] = asyncio.ensure_future(_run(playerManagement.getPlayer, name))
+        future.add_done_callback(lambda f: loads.pop(key, None))
+    return await asyncio.shield(future) # a cancelled caller doesn't cancel the others' load
+
+
+################################################################################
+async def getPlayers(names):
+    """obtain many PlayerRecords concurrently"""
+    return await asyncio.gather(*[getPlayer(name) for name in names])
+
+
+################################################################################
+async def getKnownPlayers(reset=False):
+    """identify all of the currently defined players (names are enumerated in the executor)"""
+    cache = playerManagement.getKnownPlayers(reset=reset)
+    await _run(len, cache)
+    return cache
+
+
+################################################################################
+async def loadKnownPlayers(workers=None, useProcesses=True):
+    """load every known player now, in parallel, without blocking the event loop"""
+    return await _run(playerManagement.loadKnownPlayers, workers=workers, useProcesses=useProcesses)
+
+
+################################################################################
+async def addPlayer(settings):
+    """define a new PlayerRecord setting and store it"""
+    return (await addPlayers([settings]))[0]
+
+
+################################################################################
+async def addPlayers(settingsList):
+    """define many new PlayerRecords, all validated before any are stored together"""
+    held = await _recordLocks([settings["name"] for settings in settingsList if "name" in settings])
+    try:    return await _run(playerManagement.addPlayers, settingsList)
+    finally: await _releaseLocks(held)
+
+
+################################################################################
+async def updatePlayer(name, settings):
+    """update an existing PlayerRecord after any earlier changes to it are applied"""
+    return (await updatePlayers([(name, settings)]))[0]
+
+
+################################################################################
+async def updatePlayers(updates):
+    """update many existing PlayerRecords given a dict or pairs of (name, settings)"""
+    if isinstance(updates, dict): updates = list(updates.items())
+    names = [getattr(name, "name", name) for name, settings in updates]
+    names += [settings["name"] for name, settings in updates if "name" in settings] # renamed to
+    held = await _recordLocks(names)
+    try:    return await _run(playerManagement.updatePlayers, updates)
+    finally: await _releaseLocks(held)
+
+
+################################################################################
+async def delPlayer(name):
+    """forget about a previously defined PlayerRecord by deleting its stored record"""
+    return (await delPlayers([name]))[0]
+
+
+################################################################################
+async def delPlayers(names):
+    """forget about many previously defined PlayerRecords together"""
+    held = await _recordLocks([getattr(name, "name", name) for name in names])
+    try:    return await _run(playerManagement.delPlayers, names)
+    finally: await _releaseLocks(held)
+
+
+################################################################################
+async def flushPlayers():
+    """write any saved records held back by write-behind mode"""
+    return await _run(playerManagement.flushPlayers)
+
+
+################################################################################
+__all__ = ["getPlayer", "getPlayers", "getKnownPlayers", "loadKnownPlayers",
+           "addPlayer", "addPlayers", "updatePlayer", "updatePlayers",
+           "delPlayer", "delPlayers", "flushPlayers",
+           "getExecutor", "setExecutor", "shutdown"]
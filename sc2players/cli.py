@@ -1,4 +1,161 @@
+"""
+command-line interface to interact with the player repository
 
-def main():
-    pass
+Only what argument parsing needs is imported up front; player management is
+imported once the requested action is known, so --help and usage errors return
+quickly.
+"""
+from __future__ import absolute_import
+from __future__ import division       # python 2/3 compatibility
+from __future__ import print_function # python 2/3 compatibility
 
+import argparse
+import sys
+
+from sc2players import constants as c
+from sc2players.__version__ import __version__
+
+
+################################################################################
+def buildParser():
+    """the parser of the command-line options"""
+    parser = argparse.ArgumentParser(
+       #usage="python %s"%__file__,
+        prog="sc2players",
+        description=__doc__.split("\n\n")[0],
+        epilog="version: %s"%__version__)
+    # main routine behavior
+    #parser.add_argument("--list"        , default=None, action="store_true" , help="Display all known players.")
+    #parser.add_argument("--path"        , default=None, action="store_true" , help="provide the absolute path to the file")
+    #
+    #parser.add_argument("--all"         , action="store_true"   , help="Display all known ladders.")
+    actionOpts = parser.add_argument_group('player record action options (pick at most one)')
+    actionOpts.add_argument('criteria'      , nargs='*'                         , help="define additional attributes as key=value pairs.  KEYS: %s"%(", ".join(c.PLAYER_SETTINGS))) # the remaining arguments are processed together
+    actionOpts.add_argument("--add"         , action="store_true"               , help="Add settings as a new player definition. (Provide criteria)")
+    actionOpts.add_argument("--update"      , type=str                          , help="update settings for selected record.")
+    actionOpts.add_argument("--get"         , type=str                          , help="the specific player to highlight.")
+    actionOpts.add_argument("--rm"          , type=str                          , help="the specific player to remove from the player database.")
+    actionOpts.add_argument("--stale"       , type=float                        , help="select all stale player records (specify value in days)")
+    actionOpts.add_argument("--rmstale"     , type=float                        , help="remove all stale player records (specify value in days)")
+    actionOpts.add_argument("--batch"       , type=str                          , help="perform each action (add, update, get, rm, stale) listed one per line within this file ('-' for stdin), as words or json.")
+    filterOpts = parser.add_argument_group('player --get filter options')
+    filterOpts.add_argument("--exclude"     , action="store_true"               , help="exclude players with names specified by --get.")
+    filterOpts.add_argument("--best"        , action="store_true"               , help="match players that are closer with --get")
+    #filterOpts.add_argument("--race"
+    displayOpts = parser.add_argument_group('display options')
+    displayOpts.add_argument("--details"    , default=None, action="store_true" , help="show details of each player identified.")
+    displayOpts.add_argument("--summary"    , action="store_true"               , help="show an additional summary")
+    displayOpts.add_argument("--matches"    , type=int                          , help="display the most recent X matches")
+    displayOpts.add_argument("--apm"        , type=int                          , help="calculate the apm for the most recent X matches (0 = all matches)")
+    #displayOpts.add_argument("--recent"     , type=int                          , help="display the recent RECENT matches")
+    storageOpts = parser.add_argument_group('player storage options')
+    storageOpts.add_argument("--storage"    , choices=c.STORAGE_KINDS           , help="the player storage backend to use (default: %s)"%(c.PLAYERS_STORAGE))
+    storageOpts.add_argument("--migrate"    , choices=c.STORAGE_KINDS           , help="copy all player records from the selected backend into this backend.")
+    storageOpts.add_argument("--convert"    , choices=c.CODEC_KINDS             , help="rewrite every player record of the storage in this encoding (default for new saves: %s)."%(c.PLAYERS_CODEC))
+    storageOpts.add_argument("--export"     , dest="exportFile"                 , help="write every player record to this file ('-' for stdout) as newline-delimited json.")
+    storageOpts.add_argument("--import"     , dest="importFile"                 , help="store every player record read from this file ('-' for stdin) of newline-delimited json.")
+    storageOpts.add_argument("--snapshot"   , nargs="?", const=c.PLAYERS_SNAPSHOT  , help="compile all player records into a read-only snapshot file (default: %s)"%(c.PLAYERS_SNAPSHOT))
+
+    # player match filter options?
+    # race
+    # duration
+    return parser
+
+
+################################################################################
+def main(argv=None):
+    """PURPOSE: command-line interface for map information"""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["serve"]: # run a player daemon instead
+        from sc2players import playerDaemon
+        playerDaemon.main(argv[1:])
+        sys.exit(0)
+    options = buildParser().parse_args(argv)
+    criteria= {} # translate options.args into a dictionary
+    terms   = [a.split('=') for a in options.criteria]
+    try:
+        for i,(k,v) in enumerate(terms):
+            criteria[k] = v
+    except ValueError:
+        print("ERROR: key '%s' must specify a value using '=' followed by a value (no whitespace)."%(terms[i][0]))
+        sys.exit(1)
+    import time
+    from sc2players import playerStorage
+    from sc2players.playerManagement import addPlayer, convertPlayers, delPlayer, exportPlayers, findPlayers, \
+        getKnownPlayers, getPlayer, getStaleRecords, importPlayers, listPlayers, migratePlayers, \
+        removeStaleRecords, snapshotPlayers, updatePlayer
+    if options.storage: playerStorage.setStorage(options.storage)
+    if options.migrate:
+        count = migratePlayers(options.migrate)
+        print("migrated %d player(s) from %s to %s"%(count, playerStorage.getStorage(), options.migrate))
+        sys.exit(0)
+    if options.convert:
+        count = convertPlayers(options.convert)
+        print("converted %d player(s) of %s to %s"%(count, playerStorage.getStorage(), options.convert))
+        sys.exit(0)
+    if options.exportFile:
+        if options.exportFile == "-":   count = exportPlayers(sys.stdout)
+        else:
+            with open(options.exportFile, "w") as f: count = exportPlayers(f)
+        print("exported %d player(s) from %s"%(count, playerStorage.getStorage()), file=sys.stderr)
+        sys.exit(0)
+    if options.importFile:
+        if options.importFile == "-":   count = importPlayers(sys.stdin)
+        else:
+            with open(options.importFile) as f: count = importPlayers(f)
+        print("imported %d player(s) into %s"%(count, playerStorage.getStorage()))
+        sys.exit(0)
+    if options.snapshot:
+        count = snapshotPlayers(options.snapshot)
+        print("compiled %d player(s) from %s into %s"%(count, playerStorage.getStorage(), options.snapshot))
+        sys.exit(0)
+    if options.batch:
+        from sc2players.playerBatch import runScript
+        if options.batch == "-":    failures = runScript(sys.stdin)
+        else:
+            with open(options.batch) as f: failures = runScript(f)
+        sys.exit(1 if failures else 0)
+    action = True
+    # identify which player records are desired/affected by the retrieval option
+    if   options.stale:     records = getStaleRecords(limit=options.stale)
+    elif options.rmstale:   records = removeStaleRecords(limit=options.rmstale)
+    elif options.get and options.exclude:
+        known = getKnownPlayers()
+        if options.best:    excluded = set(p.name.lower() for p in findPlayers(options.get, limit=None))
+        else:               excluded = set(known.names.containing(options.get.lower()))
+        records = [known[name] for name in known.names if name not in excluded] ; options.summary=True
+    elif options.get and options.best: records = findPlayers(options.get)             ; options.summary=True
+    elif options.get:       records = [getPlayer(options.get)]                        ; options.summary=True # ensure the single record is a list
+    elif options.add:       records = [addPlayer(criteria)]    ; options.details=True ; options.summary=True
+    elif options.update:    records = [updatePlayer(options.update, criteria)] ; options.details=True ; options.summary=True
+    elif options.rm:        records = [delPlayer(options.rm)]  ; options.details=True ; options.summary=True
+    else:
+        records = listPlayers(); action=False # only re-parses records that changed since last seen
+    # perform the desired action on them
+    for r in records:
+        printStr = "%15s : %s"
+        print(r)
+        if options.details:
+            attrs = [("type", r.type)]
+            if r.type in [c.BOT, c.AI]:
+                attrs.append(("init command", r.initCmd))
+            attrs.append(("init options", r.initOptStr))
+            attrs.append(("default race", r.raceDefault))
+            attrs.append(("total matches", len(r.matches)))
+            attrs.append(("rating", r.rating))
+            attrs.append(("creation", time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(r.created))))
+            for k,v in attrs:#sorted(iteritems(attrs), reverse=True):
+                print(printStr%(k, v))
+        if options.apm:
+            if options.matches: apm = r.apmRecent(maxMatches=options.matches, **criteria)
+            else:               apm = r.apmAggregate(**criteria)
+            print(printStr%("apm", apm))
+        if options.matches:
+            newCriteria = dict(criteria)
+            newCriteria["maxMatches"] = options.matches
+            foundMatches = r.recentMatches(**newCriteria)
+            print(printStr%("recent matches", len(foundMatches)))
+            for m in foundMatches:
+                print(" "*12, m)
+    if options.summary:
+        print("num players(s)%s: %d"%(" affected by action" if action else "", len(records)))
@@ -1,17 +1,40 @@
 
 """
 constants that are applicable only to sc2players package
-"""
 
-from sc2common.constants import *
-from sc2common.types     import *
+sc2common's constants and types are also provided, as if star imported, but
+are only imported when one of them is first used because they are costly to
+import (and many short-lived processes never need them).
+"""
 
+import importlib
 import os
 
+_COMMON_MODULES = ("sc2common.constants", "sc2common.types")
+
+
+################################################################################
+def __getattr__(name):
+    """provide the named sc2common constant or type on first use"""
+    if not name.startswith("_"): # as a star import would
+        for moduleName in _COMMON_MODULES:
+            try:    value = getattr(importlib.import_module(moduleName), name)
+            except AttributeError: continue
+            globals()[name] = value # later uses needn't search again
+            return value
+    raise AttributeError("module %r has no attribute %r"%(__name__, name))
+
+
 ################################################################################
 class InvalidPlayerTypeException(Exception): pass
 class InvalidRaceException(      Exception): pass
 class InvalidDifficultyException(Exception): pass
+class InvalidPlayerRecordsException(ValueError):
+    """one or more stored player records could not be loaded"""
+    def __init__(self, errors):
+        self.errors = errors # list of (player name, reason) sorted by player name
+        super(InvalidPlayerRecordsException, self).__init__("%d invalid player record(s): %s"%(
+            len(errors), "; ".join("%s (%s)"%(name, reason) for name, reason in errors)))
 
 ################################################################################
 PLAYERS_FOLDER      = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dataPlayers")
@@ -19,4 +42,33 @@ DEFAULT_TIME_LIMIT  = 90 # days
 NO_ACTIVITY_LIMIT   = 10 # days
 RECENT_MATCHES      = 15 # number of matches
 DEFAULT_RATING      = 500
+LADDER_MIN_RATING   = 0 # ratings counted by the ladder's tree; others are counted by visiting them
+LADDER_MAX_RATING   = 10000
+ELO_K_FACTOR        = 32 # largest rating change from a single game
+PLAYER_SETTINGS     = ["name", "type", "difficulty", "initCmd", "initOptions", "raceDefault", "rating"] # given when defining a player
+
+################################################################################
+STORAGE_JSON        = "json"   # one json file per player within PLAYERS_FOLDER
+STORAGE_SQLITE      = "sqlite" # all players within a single indexed database
+STORAGE_KINDS       = [STORAGE_JSON, STORAGE_SQLITE]
+PLAYERS_STORAGE     = os.environ.get("SC2PLAYERS_STORAGE", STORAGE_JSON)
+CODEC_JSON          = "json"   # pretty-printed, human-editable json
+CODEC_BINARY        = "binary" # compact struct layout; see playerCodec
+CODEC_KINDS         = [CODEC_JSON, CODEC_BINARY]
+PLAYERS_CODEC       = os.environ.get("SC2PLAYERS_CODEC", CODEC_JSON) # how saved records are encoded (any are loaded)
+PLAYERS_DATABASE    = os.path.join(PLAYERS_FOLDER, "players.sqlite")
+PLAYERS_SNAPSHOT    = os.path.join(PLAYERS_FOLDER, "players.snapshot") # read-only, memory-mapped copy of every player
+CACHE_MAX_RECORDS   = None # most players kept loaded in memory (None: unbounded)
+CACHE_MAX_BYTES     = None # approximate most bytes of players kept loaded in memory (None: unbounded)
+LOAD_WORKERS        = None # number of parallel bulk loading workers (None: one per cpu)
+LOAD_CHUNKS         = 4 # number of work chunks given to each parallel bulk loading worker
+AIO_WORKERS         = 8 # threads performing player I/O for sc2players.aio
+BATCH_SIZE          = 500 # most consecutive changes of a batch run stored together
+WRITE_BEHIND_INTERVAL = 5.0 # seconds that saves may be held back in write-behind mode
+PLAYERS_DAEMON      = os.environ.get("SC2PLAYERS_DAEMON", "1") != "0" # forward requests to a reachable player daemon
+PLAYERS_SOCKET      = os.environ.get("SC2PLAYERS_SOCKET") # the player daemon's unix socket (None: derived from the storage)
+DAEMON_REFRESH      = 5.0 # seconds between the player daemon's rescans of the player storage
+DAEMON_TIMEOUT      = 30.0 # seconds a client waits for the player daemon to answer
+MATCH_HISTORY_FOLDER= "matchHistory" # subfolder of PLAYERS_FOLDER holding each player's match history
+RATING_HISTORY_FOLDER = "ratingHistory" # subfolder of PLAYERS_FOLDER holding each player's rating changes
 
@@ -0,0 +1,301 @@
+"""
+PURPOSE: columnar match history of each player, loaded on demand
+
+Each player's history is kept as one typed array per match attribute (endTime,
+race, opponent, duration and apm) so that filtering by criteria, selecting the
+most recent matches and averaging apm operate on whole columns at once.  When
+numpy is available these operations are vectorized; otherwise equivalent
+loops over the columns are used.  Matches are kept ordered by endTime, so the
+most recent matches are always read from the end of the columns.
+"""
+
+from __future__ import absolute_import
+from __future__ import division       # python 2/3 compatibility
+from __future__ import print_function # python 2/3 compatibility
+
+from six import iteritems # python 2/3 compatibility
+
+from array import array
+import bisect
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+
+try:    import numpy as np
+except ImportError: # optional; vectorizes column operations when available
+        np = None
+
+from sc2players import constants as c
+
+
+################################################################################
+RACES       = [None, c.PROTOSS, c.ZERG, c.TERRAN, c.RANDOM] # race code -> race name
+COLUMNS     = [ # (attribute, array typecode) of each stored column, in file order
+    ("endTime"  , "d"),
+    ("race"     , "b"),
+    ("opponent" , "i"),
+    ("duration" , "d"),
+    ("apm"      , "d"),
+]
+NUMERIC     = ["endTime", "duration", "apm"] # criteria for these may specify a (low, high) range
+MAGIC       = b"SC2MH"
+HEADER      = struct.Struct("<BI") # format version, number of matches
+VERSION     = 1
+
+
+################################################################################
+def historyFolder():
+    """where the match history of every player is stored"""
+    return os.path.join(c.PLAYERS_FOLDER, c.MATCH_HISTORY_FOLDER)
+
+
+################################################################################
+def historyFilename(name):
+    """the absolute path to the named player's match history file"""
+    return os.path.join(historyFolder(), "matches_%s.bin"%(name))
+
+
+################################################################################
+def deleteHistory(name):
+    """forget the named player's match history, if any"""
+    try:    os.remove(historyFilename(name))
+    except (IOError, OSError): pass
+
+
+################################################################################
+def renameHistory(oldName, newName):
+    """associate the match history of oldName with newName"""
+    try:    os.replace(historyFilename(oldName), historyFilename(newName))
+    except (IOError, OSError): pass # no history to move
+
+
+################################################################################
+def _raceCode(race):
+    if isinstance(race, c.RestrictedType): race = race.type
+    race = getattr(race, "name", race) # MultiType values are identified by name
+    try:    return RACES.index(race if race is None else str(race).lower())
+    except ValueError:
+        raise ValueError("'%s' is not a race.  Allowed: %s"%(race, RACES[1:]))
+
+
+################################################################################
+class MatchRecord(object):
+    """a read-only view of a single match within a player's MatchHistory"""
+    __slots__ = ("history", "index")
+    ############################################################################
+    def __init__(self, history, index):
+        self.history    = history
+        self.index      = index
+    ############################################################################
+    def __str__(self): return self.__repr__()
+    def __repr__(self):
+        return "<%s %s %s vs %s %ds apm=%.1f>"%(self.__class__.__name__,
+            time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.endTime)),
+            self.race, self.opponent, self.duration, self.apm())
+    ############################################################################
+    @property
+    def endTime(self):  return self.history.endTime[self.index]
+    ############################################################################
+    @property
+    def race(self):     return RACES[self.history.race[self.index]]
+    ############################################################################
+    @property
+    def opponent(self): return self.history.opponentNames[self.history.opponent[self.index]]
+    ############################################################################
+    @property
+    def duration(self): return self.history.duration[self.index]
+    ############################################################################
+    def apm(self, player=None):
+        """the actions per minute the player performed in this match"""
+        return self.history.apm[self.index]
+
+
+################################################################################
+class MatchHistory(object):
+    """the match history of one player, stored as one array per match attribute"""
+    ############################################################################
+    def __init__(self, name):
+        self.name           = name
+        self.opponentNames  = [] # opponent code -> opponent name
+        self._opponentCodes = {} # opponent name -> opponent code
+        self.modified       = False # whether matches were added since the history was loaded/saved
+        for attr, typecode in COLUMNS:
+            setattr(self, attr, array(typecode))
+    ############################################################################
+    def __repr__(self):
+        return "<%s %s %d matches>"%(self.__class__.__name__, self.name, len(self))
+    ############################################################################
+    def __len__(self):      return len(self.endTime)
+    ############################################################################
+    def __iter__(self):
+        return (MatchRecord(self, i) for i in range(len(self)))
+    ############################################################################
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [MatchRecord(self, j) for j in range(*i.indices(len(self)))]
+        if i < 0: i += len(self)
+        if not 0 <= i < len(self): raise IndexError(i)
+        return MatchRecord(self, i)
+    ############################################################################
+    @classmethod
+    def load(cls, name):
+        """retrieve the named player's match history; an empty history if none is stored"""
+        ret = cls(name)
+        try:
+            with open(historyFilename(name), "rb") as f:
+                data = f.read()
+        except (IOError, OSError):
+            return ret # no matches have been recorded
+        if not data.startswith(MAGIC):
+            raise ValueError("%s is not a match history file"%(historyFilename(name)))
+        version, count = HEADER.unpack_from(data, len(MAGIC))
+        if version != VERSION:
+            raise ValueError("unsupported match history version %d in %s"%(version, historyFilename(name)))
+        offset = len(MAGIC) + HEADER.size
+        for attr, typecode in COLUMNS:
+            column = getattr(ret, attr)
+            size = count * column.itemsize
+            column.frombytes(data[offset : offset+size])
+            if sys.byteorder == "big": column.byteswap() # stored little-endian
+            offset += size
+        ret.opponentNames = json.loads(data[offset:].decode("utf-8"))
+        ret._opponentCodes = dict((n, i) for i, n in enumerate(ret.opponentNames))
+        return ret
+    ############################################################################
+    def save(self):
+        """atomically store this match history"""
+        parts = [MAGIC, HEADER.pack(VERSION, len(self))]
+        for attr, typecode in COLUMNS:
+            column = getattr(self, attr)
+            if sys.byteorder == "big":
+                column = array(typecode, column)
+                column.byteswap()
+            parts.append(column.tobytes())
+        parts.append(json.dumps(self.opponentNames).encode("utf-8"))
+        folder = historyFolder()
+        if not os.path.isdir(folder): os.makedirs(folder)
+        fd, tempName = tempfile.mkstemp(prefix=".matches_", suffix=".tmp", dir=folder)
+        with os.fdopen(fd, "wb") as f:
+            f.write(b"".join(parts))
+        os.replace(tempName, historyFilename(self.name))
+        self.modified = False
+    ############################################################################
+    def append(self, endTime, opponent, race=None, duration=0.0, apm=0.0):
+        """record a finished match, keeping matches ordered by endTime.  A match
+        that ended after every other one (the usual case) is simply appended."""
+        opponent = str(opponent)
+        try:    code = self._opponentCodes[opponent]
+        except KeyError:
+            code = self._opponentCodes[opponent] = len(self.opponentNames)
+            self.opponentNames.append(opponent)
+        endTime = float(endTime)
+        values  = (endTime, _raceCode(race), code, float(duration), float(apm))
+        times   = self.endTime
+        if not times or endTime >= times[-1]:
+            for (attr, typecode), value in zip(COLUMNS, values):
+                getattr(self, attr).append(value)
+        else: # reported late; insert at its place in time
+            i = bisect.bisect_right(times, endTime)
+            for (attr, typecode), value in zip(COLUMNS, values):
+                getattr(self, attr).insert(i, value)
+        self.modified = True
+    ############################################################################
+    def _column(self, attr):
+        """a numpy view of the named column (sharing its memory), if numpy is available"""
+        column = getattr(self, attr)
+        if np is None or not len(column): return column
+        return np.frombuffer(column, dtype=column.typecode)
+    ############################################################################
+    def _allowedCodes(self, attr, wanted):
+        """the stored codes of the race or opponent values that satisfy a criterion"""
+        if not isinstance(wanted, (list, tuple, set)): wanted = [wanted]
+        if attr == "race":
+            return set(_raceCode(w) for w in wanted)
+        wanted = [str(w) for w in wanted] # an opponent matches by name or partial name
+        return set(code for code, name in enumerate(self.opponentNames)
+            if any(w == name or w in name for w in wanted))
+    ############################################################################
+    def _tests(self, criteria):
+        """(attribute, allowed codes or None, low, high) describing each criterion"""
+        ret = []
+        for attr, wanted in iteritems(criteria):
+            if attr in ("race", "opponent"):
+                ret.append((attr, self._allowedCodes(attr, wanted), None, None))
+            elif attr in NUMERIC:
+                if isinstance(wanted, (list, tuple)): low, high = wanted
+                else:                                 low, high = wanted, wanted
+                low  = float("-inf") if low  is None else float(low)
+                high = float("inf")  if high is None else float(high)
+                ret.append((attr, None, low, high))
+            else:
+                raise ValueError("'%s' is not a match attribute.  Allowed: %s"%(
+                    attr, [attr for attr, typecode in COLUMNS]))
+        return ret
+    ############################################################################
+    def _matcher(self, criteria):
+        """a function which determines whether the match at an index satisfies every criterion"""
+        tests = [(getattr(self, attr), codes, low, high) for attr, codes, low, high in self._tests(criteria)]
+        def matches(i):
+            for column, codes, low, high in tests:
+                if codes is None:
+                    if not low <= column[i] <= high: return False
+                elif column[i] not in codes: return False
+            return True
+        return matches
+    ############################################################################
+    def select(self, **criteria):
+        """the indexes (in time order) of all matches satisfying every criterion.
+        race and opponent criteria are a value or a list of allowed values;
+        endTime, duration and apm criteria are a value or a (low, high) range."""
+        if np is None:
+            matches = self._matcher(criteria)
+            return [i for i in range(len(self)) if matches(i)]
+        return self._selectWithin(self._tests(criteria), 0, len(self))
+    ############################################################################
+    def _selectWithin(self, tests, start, stop):
+        """the indexes (in time order) of the matches from start up to stop that
+        pass every test, found with numpy"""
+        if start >= stop: return np.arange(0)
+        masks = []
+        for attr, codes, low, high in tests:
+            column = self._column(attr)[start:stop]
+            if codes is None:   masks.append((column >= low) & (column <= high))
+            else:               masks.append(np.isin(column, list(codes)))
+        if not masks: return np.arange(start, stop)
+        return start + np.flatnonzero(np.logical_and.reduce(masks))
+    ############################################################################
+    def recent(self, maxMatches=c.RECENT_MATCHES, **criteria):
+        """the indexes of the maxMatches most recent matches satisfying criteria,
+        most recent first.  Matches are read backward from the newest, so no
+        sorting is performed and reading stops once maxMatches are found."""
+        last = len(self) - 1
+        if not criteria:
+            return list(range(last, max(last - maxMatches, -1), -1))
+        ret = []
+        if np is not None: # select within ever larger windows, newest first
+            tests, stop, window = self._tests(criteria), len(self), 4 * maxMatches + 16
+            while stop > 0 and len(ret) < maxMatches:
+                start = max(stop - window, 0)
+                ret.extend(self._selectWithin(tests, start, stop)[::-1][:maxMatches - len(ret)].tolist())
+                stop, window = start, 2 * window
+            return ret
+        matches = self._matcher(criteria)
+        for i in range(last, -1, -1):
+            if len(ret) >= maxMatches: break
+            if matches(i): ret.append(i)
+        return ret
+    ############################################################################
+    def apmMean(self, indexes):
+        """the average apm of the given matches; 0 without any matches"""
+        if not len(indexes): return 0
+        if np is None:
+            apms = self.apm
+            return sum(apms[i] for i in indexes) / len(indexes)
+        return float(self._column("apm")[indexes].mean())
+
+
+################################################################################
+__all__ = ["MatchHistory", "MatchRecord", "deleteHistory", "renameHistory"]
@@ -0,0 +1,163 @@
+"""
+PURPOSE: perform a script of player record actions within a single process
+
+Each line of a script is one action, either as words like the command-line
+options
+    add name=mybot type=bot initCmd=mybot.run
+    update mybot rating=1200
+    get mybot
+    rm mybot
+    stale 30
+or as a json object
+    {"op": "add", "settings": {"name": "mybot", "type": "bot"}}
+    {"op": "update", "name": "mybot", "settings": {"rating": 1200}}
+    {"op": "get", "name": "mybot"}
+    {"op": "stale", "days": 30}
+Blank lines and lines starting with # are ignored.  Consecutive changes of the
+same kind are stored together, up to batchSize at a time.  A result is
+reported for every line, in order; a failed line doesn't stop the others.
+"""
+
+from __future__ import absolute_import
+from __future__ import division       # python 2/3 compatibility
+from __future__ import print_function # python 2/3 compatibility
+
+from collections import namedtuple
+import json
+import shlex
+import sys
+
+from sc2players import constants as c
+from sc2players import playerManagement
+
+
+################################################################################
+BatchRequest    = namedtuple("BatchRequest", ["line", "op", "target", "settings", "isJson"])
+BatchResult     = namedtuple("BatchResult",  ["line", "op", "players", "error", "isJson"])
+WRITES          = { # op -> function storing many changes together
+    "add"       : playerManagement.addPlayers,
+    "update"    : playerManagement.updatePlayers,
+    "rm"        : playerManagement.delPlayers,
+}
+READS           = { # op -> function(target) returning the players it identifies
+    "get"       : lambda name: [playerManagement.getPlayer(name)],
+    "stale"     : lambda days: playerManagement.getStaleRecords(limit=days),
+}
+OPERATIONS      = sorted(list(WRITES) + list(READS))
+
+
+################################################################################
+def parseLine(text, line=0):
+    """the BatchRequest of a line of a script, or None if it has no action"""
+    text = text.strip()
+    if not text or text.startswith("#"): return None
+    isJson = text.startswith("{")
+    if isJson:
+        request = json.loads(text)
+        if not isinstance(request, dict): raise ValueError("expected a json object")
+        op = request.get("op")
+        target = request.get("days" if op == "stale" else "name")
+        settings = request.get("settings") or {}
+        if not isinstance(settings, dict): raise ValueError("'settings' must be a json object")
+        if op == "add" and target is not None: settings = dict(settings, name=target)
+    else:
+        words = shlex.split(text)
+        op, target, settings = words[0], None, {}
+        for word in words[1:]:
+            if "=" in word:
+                key, value = word.split("=", 1)
+                settings[key] = value
+            elif target is None:    target = word
+            else: raise ValueError("unexpected '%s'; settings are given as key=value"%(word))
+    if op not in OPERATIONS:
+        raise ValueError("unknown action %r; expected one of: %s"%(op, ", ".join(OPERATIONS)))
+    if op == "add":
+        if target is not None and not isJson:
+            raise ValueError("add expects only key=value settings")
+    elif target is None:
+        raise ValueError("%s expects %s"%(op, "a number of days" if op == "stale" else "a player name"))
+    elif op == "stale":
+        try:    target = float(target)
+        except (TypeError, ValueError):
+            raise ValueError("stale expects a number of days, not %r"%(target,))
+    elif not isinstance(target, str):
+        raise ValueError("%s expects a player name, not %r"%(op, target))
+    return BatchRequest(line, op, target, settings, isJson)
+
+
+################################################################################
+def _argument(request):
+    """the request as an item of its WRITES function's list"""
+    if request.op == "add":     return request.settings
+    if request.op == "update":  return (request.target, request.settings)
+    return request.target
+
+
+################################################################################
+def _perform(request):
+    """the BatchResult of performing request by itself"""
+    try:
+        if request.op in WRITES:    players = WRITES[request.op]([_argument(request)])
+        else:                       players = READS[request.op](request.target)
+    except Exception as e:
+        return BatchResult(request.line, request.op, [], e, request.isJson)
+    return BatchResult(request.line, request.op, list(players), None, request.isJson)
+
+
+################################################################################
+def _store(requests):
+    """the BatchResults of performing consecutive changes of the same kind together"""
+    if len(requests) < 2: return [_perform(request) for request in requests]
+    try:
+        players = WRITES[requests[0].op]([_argument(request) for request in requests])
+    except Exception: # nothing was stored; find which requests fail by performing each alone
+        return [_perform(request) for request in requests]
+    return [BatchResult(request.line, request.op, [player], None, request.isJson)
+        for request, player in zip(requests, players)]
+
+
+################################################################################
+def runBatch(lines, batchSize=c.BATCH_SIZE):
+    """perform the action of each line, generating a BatchResult per action in order"""
+    pending = [] # consecutive changes of the same kind not yet stored
+    for number, text in enumerate(lines, 1):
+        try:    request = parseLine(text, number)
+        except (ValueError, TypeError) as e:
+            request = BatchResult(number, None, [], e, text.lstrip().startswith("{"))
+        if request is None: continue
+        if pending and (request.op != pending[0].op or len(pending) >= batchSize):
+            for result in _store(pending): yield result
+            pending = []
+        if isinstance(request, BatchResult):    yield request # unparsable
+        elif request.op in WRITES:              pending.append(request)
+        else:                                   yield _perform(request)
+    for result in _store(pending): yield result
+
+
+################################################################################
+def formatResult(result):
+    """a line of text (json for json requests) describing result"""
+    if result.isJson:
+        response = {"line": result.line, "op": result.op, "ok": result.error is None}
+        if result.error is None:    response["players"] = [player.simpleAttrs for player in result.players]
+        else:                       response["error"] = "%s: %s"%(type(result.error).__name__, result.error)
+        return json.dumps(response, sort_keys=True)
+    if result.error is not None:
+        return "%d %s: ERROR %s"%(result.line, result.op or "?", result.error)
+    return "%d %s: %s"%(result.line, result.op, ", ".join(str(player) for player in result.players) or "no players")
+
+
+################################################################################
+def runScript(stream, output=None, batchSize=c.BATCH_SIZE):
+    """perform each line of stream, writing its result to output (default:
+    stdout); return the number of lines that failed"""
+    output = output or sys.stdout
+    failures = 0
+    for result in runBatch(stream, batchSize=batchSize):
+        if result.error is not None: failures += 1
+        output.write(formatResult(result) + "\n")
+    return failures
+
+
+################################################################################
+__all__ = ["BatchRequest", "BatchResult", "parseLine", "runBatch", "runScript", "formatResult"]
@@ -0,0 +1,173 @@
+"""
+PURPOSE: encode the attributes of a player record (its simpleAttrs) as bytes
+         for a storage backend, and decode them again in whichever format they
+         were written
+
+JSON (the default) remains human-editable.  The binary format is compact and
+quicker to produce and parse; it is laid out as (all values little-endian):
+    header      MAGIC, format version, a bit per FIELDS attribute that is present,
+                a bit per FIELDS attribute whose value is None, then rating,
+                created and lastActivity (zero unless present)
+    strings     utf-8 text of each present string attribute, then initOptions
+                as compact json (empty: no options), then any other attributes
+                or values of an unexpected type as a json object (empty: none),
+                each separated by a NUL character
+Any record is decoded as binary if it begins with MAGIC and as json otherwise,
+so both formats may be mixed within one storage.
+"""
+
+from __future__ import absolute_import
+from __future__ import division       # python 2/3 compatibility
+from __future__ import print_function # python 2/3 compatibility
+
+import json
+import struct
+
+from sc2players import constants as c
+
+
+################################################################################
+MAGIC       = b"SC2PR"
+VERSION     = 1
+HEADER      = struct.Struct("<5sBHHqdd") # magic, version, present bits, None bits, rating, created, lastActivity
+STRINGS     = ["name", "type", "difficulty", "initCmd", "raceDefault"]
+FIELDS      = STRINGS + ["initOptions", "rating", "created", "lastActivity"]
+OPTIONS, RATING, CREATED, ACTIVITY = [1 << FIELDS.index(key) for key in FIELDS[len(STRINGS):]]
+INT64       = (-1 << 63, (1 << 63) - 1)
+SEPARATOR   = u"\0"
+SCALARS     = (str, int, float, bool, type(None))
+MAX_OPTIONS = 1024 # most distinct initOptions texts whose parsed value is remembered
+_layouts    = {} # present bits -> keys of the separated strings, in order
+_options    = {} # initOptions json -> parsed options holding only scalar values
+
+
+################################################################################
+def _layout(present):
+    """the keys of the strings stored for the present bits (extras follow them)"""
+    try:    return _layouts[present]
+    except KeyError:
+        keys = _layouts[present] = [key for bit, key in enumerate(FIELDS[:len(STRINGS) + 1]) if present & 1 << bit]
+        return keys
+
+
+################################################################################
+def _parseOptions(text):
+    """a new dict of the initOptions json text; many players share the same options"""
+    try:    return dict(_options[text])
+    except KeyError: pass
+    options = json.loads(text)
+    if all(isinstance(value, SCALARS) for value in options.values()): # a copy doesn't share values
+        if len(_options) >= MAX_OPTIONS: _options.clear()
+        _options[text] = dict(options)
+    return options
+
+
+################################################################################
+class JsonCodec(object):
+    """pretty-printed, sorted json"""
+    kind = c.CODEC_JSON
+    ############################################################################
+    def encode(self, attrs):
+        return str.encode( json.dumps(attrs, indent=4, sort_keys=True) )
+    ############################################################################
+    def decode(self, data):
+        if not isinstance(data, str): data = bytes(data).decode("utf-8")
+        return json.loads(data)
+
+
+################################################################################
+class BinaryCodec(object):
+    """a struct layout of the known attributes (see module documentation)"""
+    kind = c.CODEC_BINARY
+    ############################################################################
+    def _fits(self, key, value):
+        """whether value is stored in the fixed layout of attribute key"""
+        if key in STRINGS:          return isinstance(value, str) and SEPARATOR not in value
+        if key == "initOptions":    return isinstance(value, dict)
+        if key == "rating":         return type(value) is int and INT64[0] <= value <= INT64[1]
+        return type(value) is float # created, lastActivity
+    ############################################################################
+    def encode(self, attrs):
+        present, nones, extras = 0, 0, {}
+        for bit, key in enumerate(FIELDS):
+            if key not in attrs: continue
+            value = attrs[key]
+            if value is None:               nones |= 1 << bit
+            elif self._fits(key, value):    present |= 1 << bit
+            else:                           extras[key] = value
+        for key in attrs:
+            if key not in FIELDS: extras[key] = attrs[key]
+        texts = [attrs[key] for key in _layout(present)]
+        if present & OPTIONS:
+            texts[-1] = json.dumps(texts[-1], sort_keys=True, separators=(",", ":")) if texts[-1] else ""
+        texts.append(json.dumps(extras, sort_keys=True, separators=(",", ":")) if extras else "")
+        return HEADER.pack(MAGIC, VERSION, present, nones,
+            attrs["rating"]         if present & RATING   else 0,
+            attrs["created"]        if present & CREATED  else 0.0,
+            attrs["lastActivity"]   if present & ACTIVITY else 0.0) + SEPARATOR.join(texts).encode("utf-8")
+    ############################################################################
+    def decode(self, data):
+        try:
+            magic, version, present, nones, rating, created, lastActivity = HEADER.unpack_from(data, 0)
+            texts = str(data[HEADER.size:], "utf-8").split(SEPARATOR)
+        except (struct.error, UnicodeDecodeError) as e:
+            raise ValueError("invalid binary player record: %s"%(e))
+        if magic != MAGIC: raise ValueError("not a binary player record")
+        if version != VERSION: raise ValueError("unsupported binary player record version %d"%(version))
+        keys = _layouts.get(present) or _layout(present)
+        if len(texts) != len(keys) + 1:
+            raise ValueError("invalid binary player record: %d strings instead of %d"%(len(texts), len(keys) + 1))
+        attrs = dict(zip(keys, texts))
+        if present & OPTIONS:
+            options = attrs["initOptions"]
+            attrs["initOptions"] = _parseOptions(options) if options else {}
+        if present & RATING:    attrs["rating"] = rating
+        if present & CREATED:   attrs["created"] = created
+        if present & ACTIVITY:  attrs["lastActivity"] = lastActivity
+        if nones:
+            for bit, key in enumerate(FIELDS):
+                if nones & 1 << bit: attrs[key] = None
+        if texts[-1]: attrs.update(json.loads(texts[-1]))
+        return attrs
+
+
+################################################################################
+_json   = JsonCodec()
+_binary = BinaryCodec()
+CODECS  = {
+    c.CODEC_JSON        : _json,
+    c.CODEC_BINARY      : _binary,
+}
+
+
+################################################################################
+def getCodec(kind=None):
+    """the codec of the given kind (default: PLAYERS_CODEC)"""
+    kind = kind or c.PLAYERS_CODEC
+    try:    return CODECS[kind]
+    except KeyError:
+        raise ValueError("unknown player record codec '%s'.  Allowed: %s"%(kind, list(CODECS)))
+
+
+################################################################################
+def isBinary(data):
+    """whether data is a record in the binary format"""
+    return not isinstance(data, str) and data[:len(MAGIC)] == MAGIC
+
+
+################################################################################
+def encode(attrs, kind=None):
+    """the bytes of attrs in the format of the given kind (default: PLAYERS_CODEC)"""
+    return getCodec(kind).encode(attrs)
+
+
+################################################################################
+def decode(data):
+    """the attrs of a record in any format, identified by its leading bytes"""
+    if not isinstance(data, str) and data[:len(MAGIC)] == MAGIC: # as isBinary, inlined for bulk loads
+        return _binary.decode(data)
+    return _json.decode(data)
+
+
+################################################################################
+__all__ = ["JsonCodec", "BinaryCodec", "getCodec", "isBinary", "encode", "decode"]
@@ -0,0 +1,257 @@
+"""
+PURPOSE: serve the known players from a long-running process over a local unix
+         socket so that short-lived tools needn't load the registry themselves
+
+Requests and responses are frames: a 4 byte big-endian length followed by that
+many bytes of compact json.
+    request     {"op": <name>, "args": [...]}
+    response    {"ok": true, "result": ...} or
+                {"ok": false, "error": <exception name>, "message": <text>}
+Players are exchanged as their simpleAttrs, and restricted values (such as a
+PlayerDesigns type) within settings are sent by name in the same way.  A client
+only performs a request itself if the daemon cannot have received it; once a
+request is sent, errors (including timeouts) are raised rather than repeated.
+
+USAGE:   python -m sc2players serve [--socket PATH] [--storage KIND] [--refresh SECONDS]
+"""
+
+from __future__ import absolute_import
+from __future__ import division       # python 2/3 compatibility
+from __future__ import print_function # python 2/3 compatibility
+
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+import zlib
+
+from sc2players import constants as c
+from sc2players import playerManagement
+from sc2players import playerStorage
+from sc2players.playerRecord import PlayerRecord
+
+
+################################################################################
+FRAME       = struct.Struct(">I")
+MAX_FRAME   = 64 * 1024 * 1024 # largest accepted frame, in bytes
+ERRORS      = { # exceptions re-raised by the client, by name
+    "ValueError"                    : ValueError,
+    "KeyError"                      : KeyError,
+    "TypeError"                     : TypeError,
+    "InvalidPlayerRecordsException" : ValueError,
+}
+
+
+################################################################################
+def socketPath():
+    """where the daemon serving the active player storage listens"""
+    if c.PLAYERS_SOCKET: return c.PLAYERS_SOCKET
+    location = playerStorage.getStorage().location
+    return os.path.join(tempfile.gettempdir(), "sc2players-%s-%08x.sock"%(
+        getattr(os, "getuid", lambda: 0)(), zlib.crc32(os.path.abspath(location).encode("utf-8"))))
+
+
+################################################################################
+class RequestNotSent(Exception):
+    """the daemon didn't receive the request, so it may be performed elsewhere"""
+
+
+################################################################################
+def _simple(value):
+    """the json representation of a restricted value, as stored by simpleAttrs"""
+    if isinstance(value, c.RestrictedType): return getattr(value.type, "name", value.type)
+    raise TypeError("%r is not json serializable"%(value,))
+
+
+################################################################################
+def encodeFrame(message):
+    data = json.dumps(message, separators=(",", ":"), default=_simple).encode("utf-8")
+    return FRAME.pack(len(data)) + data
+
+
+################################################################################
+def sendFrame(sock, message):
+    sock.sendall(encodeFrame(message))
+
+
+################################################################################
+def _receive(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk: raise EOFError("connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+################################################################################
+def receiveFrame(sock):
+    size, = FRAME.unpack(_receive(sock, FRAME.size))
+    if size > MAX_FRAME: raise ValueError("frame of %d bytes exceeds %d"%(size, MAX_FRAME))
+    return json.loads(_receive(sock, size).decode("utf-8"))
+
+
+################################################################################
+def _attrs(players):
+    return [player.simpleAttrs for player in players]
+
+
+################################################################################
+OPERATIONS = { # op -> function(*args) of the daemon process whose result is sent as json
+    "ping"      : lambda: os.getpid(),
+    "get"       : lambda name: playerManagement.getPlayer(name).simpleAttrs,
+    "list"      : lambda: _attrs(playerManagement.listPlayers(refresh=False)), # rescanned periodically
+    "query"     : lambda criteria: _attrs(playerManagement.queryPlayers(**criteria)),
+    "find"      : lambda text, limit, maxDistance: _attrs(playerManagement.findPlayers(text, limit, maxDistance)),
+    "add"       : lambda settingsList: _attrs(playerManagement.addPlayers(settingsList)),
+    "update"    : lambda updates: _attrs(playerManagement.updatePlayers(updates)),
+    "remove"    : lambda names: _attrs(playerManagement.delPlayers(names)),
+}
+
+
+################################################################################
+class _RequestHandler(socketserver.BaseRequestHandler):
+    """answer each request of a connection, in order, until it closes"""
+    def handle(self):
+        while True:
+            try:    request = receiveFrame(self.request)
+            except (EOFError, OSError): return
+            except ValueError as e: # malformed or oversized; the rest of the stream can't be trusted
+                try:    sendFrame(self.request, {"ok": False, "error": "ValueError", "message": str(e)})
+                except OSError: pass
+                return # the server closes the connection
+            try:
+                result = OPERATIONS[request["op"]](*request.get("args", []))
+                response = {"ok": True, "result": result}
+            except Exception as e:
+                response = {"ok": False, "error": type(e).__name__, "message": str(e)}
+            try:    sendFrame(self.request, response)
+            except OSError: return
+
+
+################################################################################
+class PlayerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """answers player requests on a unix socket, one thread per connection,
+    refreshing the known players from storage every refresh seconds"""
+    daemon_threads = True
+    ############################################################################
+    def __init__(self, path=None, refresh=c.DAEMON_REFRESH):
+        self.path = path or socketPath()
+        if os.path.exists(self.path):
+            if PlayerClient.reachable(self.path):
+                raise ValueError("a player daemon already listens on %s"%(self.path))
+            os.remove(self.path) # left behind by a daemon that didn't exit cleanly
+        playerManagement.useDaemon(False) # this process answers requests itself
+        socketserver.UnixStreamServer.__init__(self, self.path, _RequestHandler)
+        self.refresh = refresh
+        self._stopped = threading.Event()
+    ############################################################################
+    def _refreshLoop(self):
+        while not self._stopped.wait(self.refresh):
+            try:    playerManagement.refreshKnownPlayers()
+            except Exception: pass # try again next interval
+    ############################################################################
+    def serve_forever(self, poll_interval=0.5):
+        if self.refresh:
+            threading.Thread(target=self._refreshLoop, daemon=True).start()
+        try:     socketserver.UnixStreamServer.serve_forever(self, poll_interval)
+        finally: self._stopped.set()
+    ############################################################################
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        self._stopped.set()
+        try:    os.remove(self.path)
+        except OSError: pass
+
+
+################################################################################
+class PlayerClient(object):
+    """a connection to a player daemon; safe to share between threads"""
+    ############################################################################
+    def __init__(self, path=None, timeout=None):
+        self.path = path or socketPath()
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(c.DAEMON_TIMEOUT if timeout is None else timeout)
+        try:    self._sock.connect(self.path)
+        except Exception:
+            self._sock.close()
+            raise
+        self._lock = threading.Lock() # one request in flight at a time
+    ############################################################################
+    def __repr__(self):
+        return "<%s %s>"%(self.__class__.__name__, self.path)
+    ############################################################################
+    @classmethod
+    def reachable(cls, path=None):
+        """whether a daemon answers on path"""
+        try:    cls(path).close()
+        except (OSError, EOFError): return False
+        return True
+    ############################################################################
+    @property
+    def closed(self):
+        return self._sock.fileno() < 0
+    ############################################################################
+    def call(self, op, *args):
+        """perform op within the daemon and return its result.  RequestNotSent
+        is raised if the daemon cannot have received the request; the connection
+        is closed if it can't be used any more."""
+        try:    data = encodeFrame({"op": op, "args": list(args)})
+        except (TypeError, ValueError) as e:
+            raise RequestNotSent("cannot send '%s' to %s: %s"%(op, self, e))
+        with self._lock:
+            try:    self._sock.sendall(data) # an incomplete frame is never performed
+            except OSError as e:
+                self.close()
+                raise RequestNotSent("cannot send '%s' to %s: %s"%(op, self, e))
+            try:    response = receiveFrame(self._sock)
+            except Exception: # a late response would answer the next request
+                self.close()
+                raise
+        if response["ok"]: return response["result"]
+        raise ERRORS.get(response["error"], RuntimeError)(response["message"])
+    ############################################################################
+    def _players(self, op, *args):
+        return [PlayerRecord.fromTrustedDict(attrs) for attrs in self.call(op, *args)]
+    ############################################################################
+    def getPlayer(self, name):
+        return PlayerRecord.fromTrustedDict(self.call("get", name))
+    def listPlayers(self):                      return self._players("list")
+    def queryPlayers(self, **criteria):         return self._players("query", criteria)
+    def findPlayers(self, text, limit=10, maxDistance=2):
+        return self._players("find", text, limit, maxDistance)
+    def addPlayers(self, settingsList):         return self._players("add", list(settingsList))
+    def updatePlayers(self, updates):           return self._players("update", list(updates))
+    def delPlayers(self, names):                return self._players("remove", list(names))
+    ############################################################################
+    def close(self):
+        self._sock.close()
+
+
+################################################################################
+def main(argv=None):
+    """run a player daemon until interrupted"""
+    parser = argparse.ArgumentParser(prog="python -m sc2players serve", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--socket"  , help="the unix socket to listen on (default: derived from the player storage)")
+    parser.add_argument("--storage" , choices=list(playerStorage.BACKENDS), help="the player storage backend to use (default: %s)"%(c.PLAYERS_STORAGE))
+    parser.add_argument("--refresh" , type=float, default=c.DAEMON_REFRESH, help="seconds between rescans of the player storage (0: never)")
+    options = parser.parse_args(argv)
+    if options.storage: playerStorage.setStorage(options.storage)
+    server = PlayerServer(options.socket, refresh=options.refresh)
+    signal.signal(signal.SIGTERM, lambda *args: threading.Thread(target=server.shutdown).start())
+    playerManagement.loadKnownPlayers()
+    print("serving %d player(s) from %s on %s"%(len(playerManagement.getKnownPlayers()),
+        playerStorage.getStorage(), server.path))
+    try:                        server.serve_forever()
+    except KeyboardInterrupt:   pass
+    finally:                    server.server_close()
+
+
+################################################################################
+__all__ = ["PlayerServer", "PlayerClient", "RequestNotSent", "socketPath", "main"]
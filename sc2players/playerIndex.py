@@ -0,0 +1,122 @@
+"""
+PURPOSE: secondary indexes over player attributes which answer queries without
+         examining every player record
+"""
+
+from __future__ import absolute_import
+from __future__ import division       # python 2/3 compatibility
+from __future__ import print_function # python 2/3 compatibility
+
+from six import iteritems # python 2/3 compatibility
+
+import bisect
+
+from sc2players import constants as c
+from sc2players.playerLadder import RatingLadder
+
+
+################################################################################
+def _keyValue(value):
+    """the normalized form of an indexed attribute value"""
+    if isinstance(value, c.RestrictedType): value = value.type
+    value = getattr(value, "name", value) # MultiType values are indexed by name
+    if value is None: return None
+    return str(value).lower()
+
+
+################################################################################
+class PlayerIndex(object):
+    """map indexed attribute values to player names and keep players ordered by
+    rating and by their most recent activity"""
+    KEYED_ATTRS = ["type", "difficulty", "raceDefault"]
+    ############################################################################
+    def __init__(self, records=()):
+        self._keyed     = dict((attr, {}) for attr in self.KEYED_ATTRS) # attr -> value -> set(names)
+        self.ladder     = RatingLadder() # players ordered by rating
+        self._played    = [] # sorted (lastActivity, name) pairs of players who finished a match
+        self._idle      = [] # sorted (created, name) pairs of players who haven't
+        self._entries   = {} # name -> (keyed values, rating, activity list, activity time) as currently indexed
+        for name, attrs in records:
+            self.add(name, attrs)
+    ############################################################################
+    def __len__(self):          return len(self._entries)
+    def __contains__(self, name): return name in self._entries
+    ############################################################################
+    def add(self, name, attrs):
+        """index (or re-index) the named player given its simpleAttrs"""
+        if name in self._entries: self.remove(name)
+        values = tuple(_keyValue(attrs.get(attr)) for attr in self.KEYED_ATTRS)
+        if values[0] != c.COMPUTER: # difficulty only matters for computer players
+            values = (values[0], None, values[2])
+        rating  = int(attrs.get("rating", c.DEFAULT_RATING))
+        created = float(attrs.get("created") or 0)
+        active  = float(attrs.get("lastActivity") or created)
+        if active > created:    activity = self._played
+        else:                   activity, active = self._idle, created
+        for attr, value in zip(self.KEYED_ATTRS, values):
+            self._keyed[attr].setdefault(value, set()).add(name)
+        self.ladder.add(name, rating)
+        bisect.insort(activity, (active, name))
+        self._entries[name] = (values, rating, activity, active)
+    ############################################################################
+    def remove(self, name):
+        """forget the named player, if indexed"""
+        try:    values, rating, activity, active = self._entries.pop(name)
+        except KeyError: return
+        for attr, value in zip(self.KEYED_ATTRS, values):
+            names = self._keyed[attr][value]
+            names.discard(name)
+            if not names: del self._keyed[attr][value]
+        self.ladder.remove(name)
+        del activity[bisect.bisect_left(activity, (active, name))]
+    ############################################################################
+    def setRating(self, name, rating):
+        """re-rank an indexed player whose rating changed"""
+        try:    values, oldRating, activity, active = self._entries[name]
+        except KeyError: return
+        self._entries[name] = (values, int(rating), activity, active)
+        self.ladder.setRating(name, rating)
+    ############################################################################
+    def ratingRange(self, low=None, high=None):
+        """the names of all players whose rating is within [low, high], in rating order"""
+        return self.ladder.playersInRange(low, high)
+    ############################################################################
+    def inactiveSince(self, playedBefore, createdBefore):
+        """the names of players whose last match ended before playedBefore, followed
+        by those who never finished a match and were created before createdBefore"""
+        played  = self._played[:bisect.bisect_left(self._played, (playedBefore,))]
+        idle    = self._idle[  :bisect.bisect_left(self._idle,   (createdBefore,))]
+        return [name for t, name in played] + [name for t, name in idle]
+    ############################################################################
+    def query(self, **criteria):
+        """identify the names of players matching every criterion.  Each keyed
+        attribute criterion is a value or a list of allowed values; rating is a
+        value or a (low, high) range where either end may be None.  Results are
+        ordered by rating if rating is a criterion, otherwise by name."""
+        candidates = []
+        for attr, wanted in iteritems(criteria):
+            if attr == "rating": continue
+            try:    index = self._keyed[attr]
+            except KeyError:
+                raise ValueError("'%s' is not an indexed player attribute.  Allowed: %s"%(
+                    attr, self.KEYED_ATTRS + ["rating"]))
+            if not isinstance(wanted, (list, tuple, set)): wanted = [wanted]
+            found = set()
+            for value in wanted:
+                found.update(index.get(_keyValue(value), ()))
+            candidates.append(found)
+        candidates.sort(key=len) # intersect beginning with the most selective criterion
+        if "rating" in criteria:
+            rating = criteria["rating"]
+            if isinstance(rating, (list, tuple)): low, high = rating
+            else:                                 low, high = rating, rating
+            ordered = self.ratingRange(low, high)
+            if not candidates: return ordered
+            return [name for name in ordered if all(name in found for found in candidates)]
+        if not candidates: return sorted(self._entries)
+        first = candidates.pop(0)
+        return sorted(name for name in first if all(name in found for found in candidates))
+
+
+################################################################################
+__all__ = ["PlayerIndex"]
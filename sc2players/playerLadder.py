@@ -0,0 +1,130 @@
+"""
+PURPOSE: rank players by rating
+
+Players are counted per rating in a Fenwick (binary indexed) tree so that rank,
+percentile and range counts take logarithmic time, while the distinct ratings
+in use are kept in order so that top-N and range listings only visit ratings
+that players actually have.  Only the counts are bounded by the tree; every
+player keeps its exact rating.
+"""
+
+from __future__ import absolute_import
+from __future__ import division       # python 2/3 compatibility
+from __future__ import print_function # python 2/3 compatibility
+
+import bisect
+
+from sc2players import constants as c
+
+
+################################################################################
+class RatingLadder(object):
+    """order statistics over player ratings.  Ratings outside [low, high] are
+    counted in the tree at the nearest bound and told apart by visiting the
+    (few) distinct ratings beyond it."""
+    ############################################################################
+    def __init__(self, low=c.LADDER_MIN_RATING, high=c.LADDER_MAX_RATING):
+        self.low        = int(low)
+        self.high       = int(high)
+        self._tree      = [0] * (self.high - self.low + 2) # 1-based Fenwick tree of players per rating
+        self._levels    = [] # sorted distinct ratings held by at least one player
+        self._members   = {} # rating -> set(names)
+        self._ratings   = {} # name -> rating (exact, even outside [low, high])
+    ############################################################################
+    def __repr__(self):
+        return "<%s %d players>"%(self.__class__.__name__, len(self))
+    ############################################################################
+    def __len__(self):              return len(self._ratings)
+    def __contains__(self, name):   return name in self._ratings
+    ############################################################################
+    def _level(self, rating):
+        """the rating as counted by the tree"""
+        return min(max(rating, self.low), self.high)
+    ############################################################################
+    def _adjust(self, level, delta):
+        i = level - self.low + 1
+        tree = self._tree
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+    ############################################################################
+    def _countUpTo(self, rating):
+        """the number of players whose rating is at most rating"""
+        levels, members = self._levels, self._members
+        if rating < self.low: # only players rated below the tree are counted
+            return sum(len(members[level]) for level in levels[:bisect.bisect_right(levels, rating)])
+        if rating >= self.high: # all but the players rated above rating
+            return len(self) - sum(len(members[level]) for level in levels[bisect.bisect_right(levels, rating):])
+        i = rating - self.low + 1
+        total, tree = 0, self._tree
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+    ############################################################################
+    def add(self, name, rating):
+        """place (or move) the named player at rating"""
+        if name in self._ratings: self.remove(name)
+        rating = int(rating)
+        members = self._members.get(rating)
+        if members is None:
+            members = self._members[rating] = set()
+            bisect.insort(self._levels, rating)
+        members.add(name)
+        self._ratings[name] = rating
+        self._adjust(self._level(rating), 1)
+    setRating = add
+    ############################################################################
+    def remove(self, name):
+        """take the named player off the ladder, if present"""
+        try:    rating = self._ratings.pop(name)
+        except KeyError: return
+        members = self._members[rating]
+        members.discard(name)
+        if not members:
+            del self._members[rating]
+            del self._levels[bisect.bisect_left(self._levels, rating)]
+        self._adjust(self._level(rating), -1)
+    ############################################################################
+    def ratingOf(self, name):
+        """the named player's rating"""
+        try:    return self._ratings[name]
+        except KeyError:
+            raise ValueError("player '%s' is not on the ladder"%(name))
+    ############################################################################
+    def rankOf(self, name):
+        """1 + the number of players rated higher than the named player (ties share a rank)"""
+        return len(self) - self._countUpTo(self.ratingOf(name)) + 1
+    ############################################################################
+    def percentileOf(self, name):
+        """the percentage of players rated lower than the named player"""
+        return 100.0 * self._countUpTo(self.ratingOf(name) - 1) / len(self)
+    ############################################################################
+    def countInRange(self, low=None, high=None):
+        """the number of players whose rating is within [low, high]"""
+        below = 0         if low  is None else self._countUpTo(int(low) - 1)
+        upTo  = len(self) if high is None else self._countUpTo(int(high))
+        return max(upTo - below, 0)
+    ############################################################################
+    def topN(self, n):
+        """(name, rating) of the n highest rated players, best first (ties by name)"""
+        ret = []
+        for level in reversed(self._levels):
+            for name in sorted(self._members[level]):
+                if len(ret) >= n: return ret
+                ret.append((name, level))
+        return ret
+    ############################################################################
+    def playersInRange(self, low=None, high=None):
+        """the names of players whose rating is within [low, high], lowest first (ties by name)"""
+        levels = self._levels
+        lo = 0           if low  is None else bisect.bisect_left( levels, low)
+        hi = len(levels) if high is None else bisect.bisect_right(levels, high)
+        ret = []
+        for level in levels[lo:hi]:
+            ret.extend(sorted(self._members[level]))
+        return ret
+
+
+################################################################################
+__all__ = ["RatingLadder"]
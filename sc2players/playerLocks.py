@@ -0,0 +1,161 @@
+"""
+PURPOSE: coordinate access to player records between threads and processes
+
+A ReadWriteLock lets any number of threads read the known players at once
+while each change is made by one thread at a time.  A FileLock serializes
+changes made by separate processes that share the same player storage; it
+relies upon advisory fcntl locks where available and otherwise only
+coordinates the threads of the current process.
+"""
+
+from __future__ import absolute_import
+from __future__ import division       # python 2/3 compatibility
+from __future__ import print_function # python 2/3 compatibility
+
+from contextlib import contextmanager
+import os
+import threading
+
+try:    import fcntl
+except ImportError: # optional; unavailable on windows
+        fcntl = None
+
+
+################################################################################
+class ReadWriteLock(object):
+    """many readers or a single writer.  Waiting writers take precedence over new
+    readers so that a steady stream of reads cannot starve changes.  The writing
+    thread may also read or write again (re-entrant), and a reading thread may
+    read again, but a reader cannot become a writer."""
+    ############################################################################
+    def __init__(self):
+        self._cond      = threading.Condition(threading.Lock())
+        self._readers   = 0 # number of read locks held by threads other than the writer
+        self._writer    = None # identity of the thread holding the write lock
+        self._writes    = 0 # depth of the writer's write locks
+        self._waiting   = 0 # number of threads waiting to write
+        self._local     = threading.local() # each thread's depth of read locks
+    ############################################################################
+    def __repr__(self):
+        return "<%s %d readers%s>"%(self.__class__.__name__, self._readers,
+            ", writing" if self._writer is not None else "")
+    ############################################################################
+    def _reads(self):   return getattr(self._local, "reads", 0)
+    ############################################################################
+    def acquireRead(self):
+        me = threading.current_thread().ident
+        with self._cond:
+            if self._writer != me and not self._reads(): # a nested read never waits
+                while self._writer is not None or self._waiting:
+                    self._cond.wait()
+            if self._writer != me: self._readers += 1
+            self._local.reads = self._reads() + 1
+    ############################################################################
+    def releaseRead(self):
+        me = threading.current_thread().ident
+        with self._cond:
+            self._local.reads = self._reads() - 1
+            if self._writer == me: return # not counted while writing
+            self._readers -= 1
+            if not self._readers: self._cond.notify_all()
+    ############################################################################
+    def acquireWrite(self):
+        me = threading.current_thread().ident
+        with self._cond:
+            if self._writer == me:
+                self._writes += 1
+                return
+            if self._reads():
+                raise RuntimeError("a thread holding a read lock cannot also acquire the write lock")
+            self._waiting += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting -= 1
+            self._writer = me
+            self._writes = 1
+    ############################################################################
+    def releaseWrite(self):
+        with self._cond:
+            self._writes -= 1
+            if self._writes: return
+            self._writer = None
+            self._cond.notify_all()
+    ############################################################################
+    @contextmanager
+    def reading(self):
+        self.acquireRead()
+        try:     yield self
+        finally: self.releaseRead()
+    ############################################################################
+    @contextmanager
+    def writing(self):
+        self.acquireWrite()
+        try:     yield self
+        finally: self.releaseWrite()
+
+
+################################################################################
+class FileLock(object):
+    """an exclusive, re-entrant lock shared with other processes through filename"""
+    ############################################################################
+    def __init__(self, filename):
+        self.filename   = filename
+        self._lock      = threading.RLock() # one thread of this process at a time
+        self._depth     = 0
+        self._fd        = None
+    ############################################################################
+    def __repr__(self):
+        return "<%s %s>"%(self.__class__.__name__, self.filename)
+    ############################################################################
+    def acquire(self):
+        self._lock.acquire()
+        try:
+            if not self._depth and fcntl is not None:
+                folder = os.path.dirname(os.path.abspath(self.filename))
+                if not os.path.isdir(folder): os.makedirs(folder)
+                fd = os.open(self.filename, os.O_RDWR | os.O_CREAT, 0o644)
+                try:    fcntl.flock(fd, fcntl.LOCK_EX) # wait for other processes
+                except BaseException:
+                    os.close(fd)
+                    raise
+                self._fd = fd
+        except BaseException:
+            self._lock.release()
+            raise
+        self._depth += 1
+    ############################################################################
+    def release(self):
+        self._depth -= 1
+        if not self._depth and self._fd is not None:
+            fd, self._fd = self._fd, None
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        self._lock.release()
+    ############################################################################
+    def __enter__(self):
+        self.acquire()
+        return self
+    def __exit__(self, *args):
+        self.release()
+
+
+################################################################################
+_fileLocks      = {} # filename -> FileLock
+_fileLocksLock  = threading.Lock()
+
+
+################################################################################
+def fileLock(filename):
+    """the FileLock of filename shared by every thread of this process"""
+    filename = os.path.abspath(filename)
+    with _fileLocksLock:
+        try:    return _fileLocks[filename]
+        except KeyError:
+            lock = _fileLocks[filename] = FileLock(filename)
+            return lock
+
+
+################################################################################
+__all__ = ["ReadWriteLock", "FileLock", "fileLock"]
@@ -6,61 +6,145 @@ from __future__ import absolute_import
 from __future__ import division       # python 2/3 compatibility
 from __future__ import print_function # python 2/3 compatibility
 
-from six import iteritems, itervalues # python 2/3 compatibility
+from six import iteritems # python 2/3 compatibility
 
-import glob
+from contextlib import contextmanager
+import json
 import os
-import re
+import threading
 import time
 
 from sc2players import constants as c
+from sc2players import matchHistory
+from sc2players import playerLocks
+from sc2players import playerRatings
+from sc2players import playerSnapshot
+from sc2players import playerStorage
 from sc2players.playerRecord import PlayerRecord
 from sc2players.playerPreGame import PlayerPreGame
+from sc2players.playerRegistry import PlayerRegistry
 
 
 ################################################################################
-playerCache = {} # mapping of player names to PlayerRecord objects
+playerCache = PlayerRegistry() # lazy mapping of player names to PlayerRecord objects
+_daemons    = {} # (socket, folder, storage) -> PlayerClient of the reachable player daemon, or None
+_useDaemon  = c.PLAYERS_DAEMON
+_local      = threading.local() # depth of this thread's local changes, which are never forwarded
+_LOCAL      = object() # the request must be performed by this process
 
 
 ################################################################################
 def addPlayer(settings):
     """define a new PlayerRecord setting and save to disk file"""
-    _validate(settings)
-    player = PlayerRecord(settings)
-    player.save()
-    getKnownPlayers()[player.name] = player
-    return player
+    return addPlayers([settings])[0]
+
+
+################################################################################
+def addPlayers(settingsList):
+    """define many new PlayerRecords, all validated before any are stored together"""
+    forwarded = _forward("addPlayers", settingsList)
+    if forwarded is not _LOCAL: return forwarded
+    players = []
+    for settings in settingsList:
+        _validate(settings)
+        players.append(PlayerRecord(settings))
+    with _writing():
+        _commit(players)
+    return players
 
 
 ################################################################################
 def updatePlayer(name, settings):
     """update an existing PlayerRecord setting and save to disk file"""
-    player = delPlayer(name) # remove the existing record
-    _validate(settings)
-    player.update(settings)
-    player.save()
-    getKnownPlayers()[player.name] = player
-    return player
+    return updatePlayers([(name, settings)])[0]
+
+
+################################################################################
+def updatePlayers(updates):
+    """update many existing PlayerRecords given a dict or pairs of (name, settings).
+    All updates are validated before any record is changed or stored."""
+    if isinstance(updates, dict): updates = list(iteritems(updates))
+    forwarded = _forward("updatePlayers", [(getattr(name, "name", name), settings) for name, settings in updates])
+    if forwarded is not _LOCAL: return forwarded
+    for name, settings in updates:
+        _validate(settings)
+    with _writing() as cache:
+        cache.revalidate(_names(name for name, settings in updates))
+        players = []
+        for name, settings in updates:
+            player = getPlayer(name)
+            type(player)(player).update(settings) # prove the update succeeds on a copy first
+            players.append((player, settings))
+        renamed = []
+        for player, settings in players:
+            oldName = player.name
+            player.update(settings)
+            if player.name == oldName: continue
+            renamed.append(oldName)
+            matchHistory.renameHistory(oldName, player.name) # match history follows the player
+            playerRatings.renameHistory(oldName, player.name)
+            if player._matches is not None: player._matches.name = player.name
+        _commit([player for player, settings in players], renamed)
+    return [player for player, settings in players]
+
+
+################################################################################
+def modifyPlayer(name, modify):
+    """update an existing PlayerRecord with the settings returned by modify(player),
+    which sees the player's current stored record.  No other thread or process
+    changes the player in between, so read-modify-write updates aren't lost.
+    EXAMPLE: modifyPlayer("test", lambda player: {"rating": player.rating + 10})"""
+    with _writing() as cache:
+        cache.revalidate(_names([name]))
+        return updatePlayers([(name, modify(getPlayer(name)))])[0]
 
 
 ################################################################################
 def getPlayer(name):
     """obtain a specific PlayerRecord settings file"""
     if isinstance(name, PlayerRecord): return name
-    try:    return getKnownPlayers()[name.lower()]
+    forwarded = _forward("getPlayer", name)
+    if forwarded is not _LOCAL: return forwarded
+    cache = getKnownPlayers()
+    try:
+        with cache.lock.reading():
+            return cache[name.lower()]
     except KeyError:
         raise ValueError("given player name '%s' is not a known player definition"%(name))
 
 
+################################################################################
+def findPlayers(text, limit=10, maxDistance=2):
+    """identify the limit (None: all) known players whose names best match text:
+    the exact name, then names starting with text, then names containing text
+    and then names within maxDistance edits of text, closest first"""
+    forwarded = _forward("findPlayers", text, limit=limit, maxDistance=maxDistance)
+    if forwarded is not _LOCAL: return forwarded
+    cache = getKnownPlayers()
+    with cache.lock.reading():
+        return [cache[name] for quality, name in
+            cache.names.search(text.lower(), limit=limit, maxDistance=maxDistance)]
+
+
 ################################################################################
 def delPlayer(name):
-    """forget about a previously defined PlayerRecord setting by deleting its disk file"""
-    player = getPlayer(name)
-    try:    os.remove(player.filename) # delete from disk
-    except IOError: pass # shouldn't happen, but don't crash if the disk data doesn't exist
-    try:    del getKnownPlayers()[player.name] # forget object from cache
-    except: pass
-    return player # leave it to the caller to process further or allow deallocation 
+    """forget about a previously defined PlayerRecord setting by deleting its stored record"""
+    return delPlayers([name])[0] # leave it to the caller to process further or allow deallocation 
+
+
+################################################################################
+def delPlayers(names):
+    """forget about many previously defined PlayerRecords by deleting their stored records together"""
+    forwarded = _forward("delPlayers", _names(names))
+    if forwarded is not _LOCAL: return forwarded
+    with _writing() as cache:
+        cache.revalidate(_names(names))
+        players = [getPlayer(name) for name in names]
+        _commit(removed=[player.name for player in players])
+        for player in players:
+            matchHistory.deleteHistory(player.name)
+            playerRatings.deleteHistory(player.name)
+    return players
 
 
 ################################################################################
@@ -79,61 +163,359 @@ def buildPlayer(name, ptype, cmd='', options={}, difficulty=None, rating=None,
 
 ################################################################################
 def getKnownPlayers(reset=False):
-    """identify all of the currently defined players"""
-    global playerCache
-    if not playerCache or reset:
-        jsonFiles = os.path.join(c.PLAYERS_FOLDER, "*.json")
-        for playerFilepath in glob.glob(jsonFiles):
-            filename = os.path.basename(playerFilepath)
-            name = re.sub("^player_", "", filename)
-            name = re.sub("\.json$",  "", name)
-            player = PlayerRecord(name)
-            playerCache[player.name] = player
+    """identify all of the currently defined players (each record is loaded on first access)"""
+    if reset:
+        with playerCache.lock.writing():
+            playerCache.clear()
     return playerCache
 
 
+################################################################################
+def listPlayers(refresh=True):
+    """every known player, first rescanning the storage for changes if refresh"""
+    forwarded = _forward("listPlayers")
+    if forwarded is not _LOCAL: return forwarded
+    if refresh: refreshKnownPlayers() # only re-parse records that changed since last seen
+    cache = getKnownPlayers()
+    with cache.lock.reading():
+        return [cache[name] for name in cache]
+
+
+################################################################################
+def iterPlayers():
+    """generate the simpleAttrs of every stored player, one at a time, straight
+    from the storage backend without loading them into the known players"""
+    for storedName, attrs in _iterStored(playerStorage.getStorage()):
+        yield attrs
+
+
+################################################################################
+def useDaemon(enabled=True):
+    """whether requests are forwarded to a player daemon (see playerDaemon) when
+    one is reachable rather than performed by this process"""
+    global _useDaemon
+    _useDaemon = enabled
+    for client in _daemons.values():
+        if client is not None: client.close()
+    _daemons.clear() # reachability is determined again if enabled
+
+
+################################################################################
+def _daemon():
+    """the client of the player daemon serving the active storage, if one is reachable"""
+    if not _useDaemon or getattr(_local, "depth", 0): return None
+    if isinstance(playerCache, playerSnapshot.SnapshotRegistry): return None # players are looked up in the snapshot
+    key = (c.PLAYERS_SOCKET, c.PLAYERS_FOLDER, playerStorage.activeStorage)
+    try:    return _daemons[key]
+    except KeyError: pass
+    from sc2players import playerDaemon # deferred: the daemon itself uses this module
+    path, client = playerDaemon.socketPath(), None
+    if os.path.exists(path):
+        try:    client = playerDaemon.PlayerClient(path)
+        except (OSError, EOFError): pass # not listening
+    _daemons[key] = client
+    return client
+
+
+################################################################################
+def _forward(method, *args, **kwargs):
+    """perform a request within the reachable player daemon, if any; otherwise _LOCAL"""
+    client = _daemon()
+    if client is None: return _LOCAL
+    from sc2players import playerDaemon # already imported by _daemon
+    try:    return getattr(client, method)(*args, **kwargs)
+    except playerDaemon.RequestNotSent: # perform it here instead
+        if client.closed: _dropDaemon(client) # the daemon went away; continue without it
+        return _LOCAL
+    except (OSError, EOFError): # the daemon may have performed it, so it mustn't be repeated here
+        _dropDaemon(client)
+        raise
+
+
+################################################################################
+def _dropDaemon(client):
+    """stop forwarding requests to client's daemon"""
+    client.close()
+    for key, value in list(_daemons.items()):
+        if value is client: _daemons[key] = None
+
+
+################################################################################
+def loadKnownPlayers(workers=None, useProcesses=True):
+    """load every known player now, in parallel, rather than on first access"""
+    with playerCache.lock.writing():
+        return playerCache.loadAll(workers=workers, useProcesses=useProcesses)
+
+
+################################################################################
+def setCachePolicy(maxRecords=None, maxBytes=None, pinned=None):
+    """keep at most maxRecords players (and approximately maxBytes of them) loaded
+    in memory, None being unbounded.  The least recently used players are evicted
+    first and are loaded again when next needed.  pinned players are never
+    evicted (None: Blizzard's built-in bots)."""
+    cache = getKnownPlayers()
+    with cache.lock.writing():
+        cache.setPolicy(maxRecords=maxRecords, maxBytes=maxBytes, pinned=None if pinned is None else _names(pinned))
+    return cache.stats
+
+
+################################################################################
+def getCacheStats():
+    """the CacheStats (hits, misses, evictions, loaded records and their approximate bytes) of the known players"""
+    return getKnownPlayers().stats
+
+
+################################################################################
+def flushPlayers():
+    """write any saved records held back by write-behind mode"""
+    playerStorage.getStorage().flush()
+
+
+################################################################################
+def refreshKnownPlayers():
+    """update the known players with stored records that were added, changed or
+    removed since the last scan; return the PlayerChanges that were found"""
+    with playerCache.lock.writing():
+        return playerCache.refresh()
+
+
+################################################################################
+def queryPlayers(**criteria):
+    """identify the players matching every criterion using indexes rather than
+    examining every player.  type, difficulty and raceDefault criteria are a
+    value or a list of allowed values; rating is a value or a (low, high) range
+    where either end may be None.
+    EXAMPLE: queryPlayers(type=[c.AI, c.BOT], rating=(1000, None))"""
+    forwarded = _forward("queryPlayers", **criteria)
+    if forwarded is not _LOCAL: return forwarded
+    cache = getKnownPlayers()
+    with cache.lock.reading():
+        return [cache[name] for name in cache.index.query(**criteria)]
+
+
+################################################################################
+def applyResults(results, kFactor=c.ELO_K_FACTOR, history=False):
+    """update the ratings of every player in a batch of match results, each
+    (winner, loser) or (player, opponent, score) with score the player's
+    playerRatings.WIN, DRAW or LOSS.  A player's games are rated in the given
+    order and all new ratings are stored together.  When history is set, each
+    game's resulting ratings are also appended to the players' rating history."""
+    results = list(results)
+    with _writing() as cache:
+        cache.revalidate(_names(name for result in results for name in result[:2]))
+        games, players = [], {}
+        for result in results:
+            player, opponent = getPlayer(result[0]), getPlayer(result[1])
+            score = result[2] if len(result) > 2 else playerRatings.WIN
+            players[player.name] = player
+            players[opponent.name] = opponent
+            games.append((player.name, opponent.name, score))
+        ratings = dict((name, player.rating) for name, player in iteritems(players))
+        ratings, after = playerRatings.rateGames(ratings, games, kFactor=kFactor)
+        for name, player in iteritems(players):
+            player.rating = int(round(ratings[name]))
+        _commit(list(players.values()))
+    if history:
+        entries = []
+        for (player, opponent, score), (pRating, oRating) in zip(games, after):
+            entries.append((player, int(round(pRating))))
+            entries.append((opponent, int(round(oRating))))
+        playerRatings.appendHistory(entries)
+    return list(players.values())
+
+
+################################################################################
+def getLadder():
+    """the RatingLadder of all known players; kept current as players are added,
+    updated, removed or re-rated"""
+    cache = getKnownPlayers()
+    with cache.lock.reading():
+        return cache.index.ladder
+
+
 ################################################################################
 def getBlizzBotPlayers():
     """identify all of Blizzard's built-in bots"""
-    ret = {}
-    for pName,p in iteritems(getKnownPlayers()):
-        if p.isComputer:
-            ret[pName] = p
-    return ret
+    cache = getKnownPlayers()
+    with cache.lock.reading():
+        return dict((name, cache[name]) for name in cache.index.query(type=c.COMPUTER))
 
 
 ################################################################################
 def getStaleRecords(limit=c.DEFAULT_TIME_LIMIT):
-    ret     = []
+    """identify players whose last match ended more than limit days ago and
+    players without any match that were created long enough ago to have played"""
     now     = time.time()
     seconds = float(limit) * 24 * 60 * 60 # convert days to seconds
     maxNoAct= min(seconds, c.NO_ACTIVITY_LIMIT * 24 * 60 * 60) # convert days to seconds
-    for player in itervalues(getKnownPlayers()):
-        if player.matches: # can only determine time since last match if matches exist
-            sinceLastMatch, match = sorted( # player's last match is the shortest time since now 
-                [(now - m.endTime, m) for m in player.matches])[0]
-            if sinceLastMatch > seconds:
-                ret.append(player)
-        else: # if no matches, verify player's time since creation for sufficient time to play a match
-            sinceCreation = now - player.created
-            if sinceCreation > maxNoAct: # players created > 10 days ago without any recorded matches are identifed as stale
-                ret.append(player)
-    return ret
+    cache   = getKnownPlayers()
+    with cache.lock.reading():
+        return [cache[name] for name in cache.index.inactiveSince(now - seconds, now - maxNoAct)]
 
 
 ################################################################################
 def removeStaleRecords(**kwargs):
-    """identify all currently stale records and remove them"""
-    return [delPlayer(record) for record in getStaleRecords(**kwargs)]
+    """identify all currently stale records and remove them together"""
+    with _writing():
+        return delPlayers(getStaleRecords(**kwargs))
+
+
+################################################################################
+def migratePlayers(destination, location=None):
+    """copy all player records from the current storage backend into another
+    backend; return the number of players copied"""
+    source = playerStorage.getStorage()
+    if not isinstance(destination, playerStorage.PlayerStorage):
+        destination = playerStorage.openStorage(destination, location)
+    if destination.kind == source.kind and destination.location == source.location:
+        raise ValueError("cannot migrate %s onto itself"%(source))
+    return playerStorage.migrateStorage(source, destination)
+
+
+################################################################################
+def convertPlayers(codec):
+    """save players in the codec kind of encoding (c.CODEC_JSON or c.CODEC_BINARY)
+    from now on and rewrite every stored player in it; return how many were rewritten"""
+    with _writing():
+        return playerStorage.convertStorage(playerStorage.getStorage(), codec)
+
+
+################################################################################
+def exportPlayers(stream):
+    """write every stored player to the text stream as newline-delimited json,
+    one player's simpleAttrs per line; return the number of players written"""
+    storage = playerStorage.getStorage()
+    count = 0
+    with playerLocks.fileLock(storage.lockFilename): # a consistent set of records
+        for storedName, attrs in _iterStored(storage):
+            stream.write(json.dumps(attrs, sort_keys=True, separators=(",", ":")) + "\n")
+            count += 1
+    return count
+
+
+################################################################################
+def importPlayers(stream, batchSize=c.BATCH_SIZE):
+    """store each player read from the text stream of newline-delimited json
+    (see exportPlayers), replacing any existing record of the same name.  Every
+    chunk of batchSize players is validated before any of it is stored together,
+    so an invalid line leaves only the earlier chunks stored.  Imported players
+    are loaded when first accessed; return the number of players stored"""
+    count, chunk, errors = 0, [], []
+    for number, line in enumerate(stream, 1):
+        if not line.strip(): continue
+        try:    chunk.append(PlayerRecord(json.loads(line)))
+        except (ValueError, TypeError) as e:
+            errors.append(("line %d"%(number), str(e)))
+        if len(chunk) + len(errors) >= batchSize:
+            count += _storeChunk(chunk, errors)
+            chunk = []
+    return count + _storeChunk(chunk, errors)
+
+
+################################################################################
+def _storeChunk(players, errors):
+    """store players imported together; return how many were stored"""
+    if errors: raise c.InvalidPlayerRecordsException(errors)
+    if not players: return 0
+    with _writing() as cache:
+        saves = dict((cache.storedName(player.name, scan=False), player.simpleAttrs) for player in players)
+        playerStorage.getStorage().commit(saves)
+        for storedName, attrs in iteritems(saves):
+            cache.noteStored(storedName, attrs) # not loaded until needed, so memory stays bounded
+    return len(players)
+
+
+################################################################################
+def _iterStored(storage):
+    """generate (stored name, simpleAttrs) of every player within storage"""
+    storage.flush()
+    for storedName, attrs in storage.iterRecords():
+        simpleAttrs = PlayerRecord(dict(attrs, name=attrs.get("name") or storedName)).simpleAttrs
+        if not attrs.get("name"): # the json layout allows the filename to provide the name
+            simpleAttrs["name"] = storedName
+        yield storedName, simpleAttrs
+
+
+################################################################################
+@contextmanager
+def _writing():
+    """exclude readers and other writers of this process and writers of other
+    processes sharing the player storage while changing players"""
+    cache = getKnownPlayers()
+    if isinstance(cache, playerSnapshot.SnapshotRegistry): # refused before anything is stored
+        raise TypeError("players are read-only while %s is attached; detachSnapshot to change them"%(cache))
+    _local.depth = getattr(_local, "depth", 0) + 1 # nested requests are performed here, not forwarded
+    try:
+        with cache.lock.writing(), playerLocks.fileLock(playerStorage.getStorage().lockFilename):
+            yield cache
+    finally:
+        _local.depth -= 1
+
+
+################################################################################
+def _names(players):
+    """the names of the given names or PlayerRecords"""
+    return [getattr(player, "name", player) for player in players]
+
+
+################################################################################
+def snapshotPlayers(filename=None):
+    """compile every stored player into a read-only snapshot file that many
+    processes can attach with attachSnapshot; return the number of players"""
+    storage = playerStorage.getStorage()
+    with playerLocks.fileLock(storage.lockFilename): # a consistent set of records
+        records = list(_iterStored(storage))
+    return playerSnapshot.compileSnapshot(records, filename or c.PLAYERS_SNAPSHOT)
+
+
+################################################################################
+def attachSnapshot(filename=None):
+    """look players up within a memory-mapped snapshot (see snapshotPlayers)
+    rather than the storage backend.  Players become read-only; forked worker
+    processes share the snapshot's memory."""
+    global playerCache
+    playerCache = playerSnapshot.SnapshotRegistry(filename)
+    return playerCache
+
+
+################################################################################
+def detachSnapshot():
+    """look players up within the storage backend again"""
+    global playerCache
+    if isinstance(playerCache, playerSnapshot.SnapshotRegistry):
+        playerCache.close()
+        playerCache = PlayerRegistry()
+    return playerCache
+
+
+################################################################################
+def _commit(saved=(), removed=()):
+    """store and remove records as a single storage operation, then update the cache"""
+    cache = getKnownPlayers()
+    playerStorage.getStorage().commit(
+        dict((cache.storedName(player.name), player.simpleAttrs)
+            for player in saved if player.isDirty), # unchanged records aren't rewritten
+        [cache.storedName(name) for name in removed])
+    for player in saved:
+        player.markClean()
+        if player._matches is not None and player._matches.modified:
+            player._matches.save() # match history is stored separately from player information
+    for name in removed:
+        try:    del cache[name.lower()] # forget object from cache
+        except KeyError: pass
+    for player in saved:
+        cache[player.name.lower()] = player
 
 
 ################################################################################
 def _validate(settings):
     if "created"  in settings:  raise ValueError("parameter 'created' is expected to be automatmically generated.")
+    if "lastActivity" in settings: raise ValueError("parameter 'lastActivity' is determined by playing matches.")
     if "_matches" in settings:  raise ValueError("matches are declared after playing matches, not during init.")
     
 
 ################################################################################
-__all__ = ["addPlayer", "getPlayer", "delPlayer", "getKnownPlayers", "getBlizzBotPlayers",
-           "updatePlayer", "getStaleRecords", "removeStaleRecords"]
-
+__all__ = ["addPlayer", "addPlayers", "applyResults", "getPlayer", "delPlayer", "delPlayers", "modifyPlayer",
+           "findPlayers", "getKnownPlayers", "listPlayers", "iterPlayers", "useDaemon", "loadKnownPlayers", "refreshKnownPlayers", "getBlizzBotPlayers",
+           "flushPlayers", "getCacheStats", "setCachePolicy", "getLadder", "queryPlayers", "updatePlayer", "updatePlayers", "getStaleRecords", "removeStaleRecords", "migratePlayers",
+           "convertPlayers", "exportPlayers", "importPlayers", "snapshotPlayers", "attachSnapshot", "detachSnapshot"]
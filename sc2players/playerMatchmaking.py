@@ -0,0 +1,153 @@
+"""
+PURPOSE: pair queued players into rating-balanced lobbies
+
+Queued players are kept ordered by rating so that every lobby is drawn from a
+contiguous window of that order.  Choosing which windows to form is a single
+linear pass over the queue (rather than comparing every pair of players) that
+first maximizes the number of players placed and then minimizes the total
+rating spread of the lobbies formed.
+"""
+
+from __future__ import absolute_import
+from __future__ import division       # python 2/3 compatibility
+from __future__ import print_function # python 2/3 compatibility
+
+from collections import namedtuple
+import bisect
+import itertools
+
+from sc2players.playerManagement import getPlayer
+from sc2players.playerPreGame import PlayerPreGame
+
+
+################################################################################
+class Lobby(namedtuple("Lobby", ["teams", "spread"])):
+    """teams of ready-to-launch PlayerPreGame objects and the lobby's rating spread"""
+    __slots__ = ()
+    @property
+    def players(self):
+        """every player within the lobby, ordered by playerID"""
+        return [p for team in self.teams for p in team]
+
+
+################################################################################
+class MatchmakingQueue(object):
+    """players waiting to be placed into lobbies of numTeams teams of teamSize
+    players each.  A player's rating is taken when the player is enqueued."""
+    ############################################################################
+    def __init__(self, teamSize=1, numTeams=2, maxSpread=None):
+        if teamSize < 1 or numTeams < 2:
+            raise ValueError("a lobby requires at least two teams of at least one player")
+        self.teamSize   = teamSize
+        self.numTeams   = numTeams
+        self.maxSpread  = maxSpread # largest allowed rating difference within a lobby (None: any)
+        self._order     = [] # sorted (rating, enqueue sequence, name)
+        self._queued    = {} # name -> ((rating, enqueue sequence, name), PlayerRecord, race)
+        self._sequence  = itertools.count()
+    ############################################################################
+    def __repr__(self):
+        return "<%s %d teams of %d, %d queued>"%(self.__class__.__name__,
+            self.numTeams, self.teamSize, len(self))
+    ############################################################################
+    def __len__(self):              return len(self._order)
+    def __contains__(self, name):   return self._key(name) in self._queued
+    ############################################################################
+    @property
+    def lobbySize(self):
+        """the number of players placed into each lobby"""
+        return self.teamSize * self.numTeams
+    ############################################################################
+    def _key(self, player):
+        try:    return player.name.lower()
+        except AttributeError:
+            return player.lower()
+    ############################################################################
+    def enqueue(self, player, race=None, rating=None):
+        """add a player (name or PlayerRecord) to the queue, or requeue it with
+        the new race and rating.  race defaults to the player's raceDefault and
+        rating to the player's current rating."""
+        record = getPlayer(player)
+        name = self._key(record)
+        self.dequeue(name)
+        if race   is None: race   = record.raceDefault
+        if rating is None: rating = record.rating
+        key = (rating, next(self._sequence), name)
+        bisect.insort(self._order, key)
+        self._queued[name] = (key, record, race)
+    ############################################################################
+    def enqueueMany(self, players):
+        """add many players given names, PlayerRecords or (player, race) pairs"""
+        for player in players:
+            if isinstance(player, tuple): self.enqueue(*player)
+            else:                         self.enqueue(player)
+    ############################################################################
+    def dequeue(self, player):
+        """take a player (name or PlayerRecord) off the queue, if present"""
+        try:    key, record, race = self._queued.pop(self._key(player))
+        except KeyError: return
+        del self._order[bisect.bisect_left(self._order, key)]
+    ############################################################################
+    def _windows(self, maxSpread):
+        """the starting positions within the rating order of the lobbies that
+        place the most players with the least total rating spread"""
+        order, size = self._order, self.lobbySize
+        best = [(0, 0)] * (len(order) + 1) # (players left out, total spread) of order[:i]
+        formed = [False] * (len(order) + 1) # whether order[:i] ends with a lobby
+        for i in range(1, len(order) + 1):
+            unplaced, spread = best[i - 1]
+            best[i] = (unplaced + 1, spread)
+            if i < size: continue
+            window = order[i - 1][0] - order[i - size][0]
+            if maxSpread is not None and window > maxSpread: continue
+            unplaced, spread = best[i - size]
+            if (unplaced, spread + window) < best[i]:
+                best[i] = (unplaced, spread + window)
+                formed[i] = True
+        starts = []
+        i = len(order)
+        while i > 0:
+            if formed[i]:
+                i -= size
+                starts.append(i)
+            else:
+                i -= 1
+        starts.reverse()
+        return starts
+    ############################################################################
+    def _teams(self, keys):
+        """divide a lobby's players (ordered by rating) into teams of similar
+        total rating by drafting highest rated first, alternating direction"""
+        teams = [[] for i in range(self.numTeams)]
+        ranked = keys[::-1] # highest rated first
+        for start in range(0, len(ranked), self.numTeams):
+            picking = teams if start // self.numTeams % 2 == 0 else teams[::-1]
+            for team, key in zip(picking, ranked[start:start + self.numTeams]):
+                team.append(key)
+        return teams
+    ############################################################################
+    def makeLobbies(self, maxSpread=None):
+        """remove and return as many rating-balanced lobbies as the queue allows.
+        Players that cannot be placed within maxSpread (default: the queue's
+        maxSpread) remain queued."""
+        if maxSpread is None: maxSpread = self.maxSpread
+        size = self.lobbySize
+        lobbies = []
+        for start in self._windows(maxSpread):
+            keys = self._order[start:start + size]
+            pid = itertools.count(1)
+            teams = []
+            for team in self._teams(keys):
+                players = []
+                for rating, sequence, name in team:
+                    key, record, race = self._queued[name]
+                    players.append(PlayerPreGame(record, selectedRace=race, playerID=next(pid)))
+                teams.append(players)
+            lobbies.append(Lobby(teams, keys[-1][0] - keys[0][0]))
+        for lobby in lobbies:
+            for player in lobby.players:
+                self.dequeue(player.name)
+        return lobbies
+
+
+################################################################################
+__all__ = ["Lobby", "MatchmakingQueue"]
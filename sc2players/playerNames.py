@@ -0,0 +1,203 @@
+"""
+PURPOSE: find player names by prefix, substring or nearest spelling without
+         comparing the query against every known name
+
+Names are kept sorted for prefix queries and are indexed by the trigrams
+(three character sequences) they contain.  A substring query only examines the
+names holding the query's least common trigram.  A name within edit distance d
+of a query shares all but at most 3*d of the query's trigrams, so only names
+holding one of the query's 3*d+1 least common trigrams are edit-distanced.
+A substring query too short to hold a trigram lies within one of each matching
+name's padded trigrams, so only the names holding such a trigram are examined.
+A query too short to hold that many trigrams can only match short names, which
+are also indexed by bigram and by length: a name within d edits shares all but
+at most 2*d of its bigrams, and is otherwise within d characters of its length.
+
+Trigram postings are compact arrays of name ids; removed names leave a gap
+that is skipped until the postings are rebuilt.
+"""
+
+from __future__ import absolute_import
+from __future__ import division       # python 2/3 compatibility
+from __future__ import print_function # python 2/3 compatibility
+
+from six import itervalues # python 2/3 compatibility
+
+from array import array
+import bisect
+import heapq
+
+
+################################################################################
+PAD         = "\0" # marks the start and end of a name; never part of a name
+SHORT_NAME  = 8 # names of at most this many characters are also indexed by bigram and length
+EXACT, PREFIX, SUBSTRING, SIMILAR = range(4) # how closely a name matches, best first
+
+
+################################################################################
+def trigrams(text, padded=True):
+    """the distinct trigrams of text, including those marking its start and end if padded"""
+    if padded: text = PAD + PAD + text + PAD + PAD
+    return set(text[i:i + 3] for i in range(len(text) - 2))
+
+
+################################################################################
+def bigrams(text):
+    """the distinct bigrams of text, including those marking its start and end"""
+    text = PAD + text + PAD
+    return set(text[i:i + 2] for i in range(len(text) - 1))
+
+
+################################################################################
+def editDistance(a, b, limit=None):
+    """the Levenshtein distance between a and b, or None if it exceeds limit"""
+    if limit is not None and abs(len(a) - len(b)) > limit: return None
+    if len(a) < len(b): a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if limit is not None and min(current) > limit: return None
+        previous = current
+    distance = previous[-1]
+    if limit is not None and distance > limit: return None
+    return distance
+
+
+################################################################################
+class NameIndex(object):
+    """prefix, substring and edit distance lookups over a changing set of names"""
+    ############################################################################
+    def __init__(self, names=()):
+        self._sorted    = [] # every name, in order
+        self._ids       = {} # name -> id
+        self._names     = [] # id -> name (None once removed)
+        self._postings  = {} # trigram -> array of ids of names that contain it
+        self._short     = {} # bigram or length -> array of ids of short names that contain / have it
+        self._removed   = 0 # ids of removed names still held within postings
+        for name in names:
+            self._index(name)
+        self._sorted = sorted(self._ids) # sorted once, not inserted name by name
+    ############################################################################
+    def __repr__(self):
+        return "<%s %d names>"%(self.__class__.__name__, len(self))
+    ############################################################################
+    def __len__(self):              return len(self._ids)
+    def __contains__(self, name):   return name in self._ids
+    def __iter__(self):             return iter(self._sorted)
+    ############################################################################
+    def add(self, name):
+        """index name, if not already indexed"""
+        if self._index(name): bisect.insort(self._sorted, name)
+    ############################################################################
+    def update(self, names):
+        """index each of names not already indexed"""
+        added = [name for name in names if self._index(name)]
+        if not added: return
+        self._sorted.extend(added)
+        self._sorted.sort() # merges the sorted run of added names in linear time
+    ############################################################################
+    def _index(self, name):
+        """add name's postings, but not its place in the sorted names; False if
+        already indexed"""
+        if name in self._ids: return False
+        nameId = len(self._names)
+        self._names.append(name)
+        self._ids[name] = nameId
+        postings = self._postings
+        for gram in trigrams(name):
+            try:    postings[gram].append(nameId)
+            except KeyError:
+                postings[gram] = array("I", [nameId])
+        if len(name) > SHORT_NAME: return True
+        short = self._short
+        for key in list(bigrams(name)) + [len(name)]:
+            try:    short[key].append(nameId)
+            except KeyError:
+                short[key] = array("I", [nameId])
+        return True
+    ############################################################################
+    def remove(self, name):
+        """stop indexing name, if indexed"""
+        try:    nameId = self._ids.pop(name)
+        except KeyError: return
+        self._names[nameId] = None
+        del self._sorted[bisect.bisect_left(self._sorted, name)]
+        self._removed += 1
+        if self._removed > len(self._ids): self._rebuild() # most postings are gaps
+    ############################################################################
+    def _rebuild(self):
+        self.__init__(self._sorted)
+    ############################################################################
+    def _candidates(self, grams, needed=None, postings=None):
+        """the names holding at least one of the needed (default: all) least
+        common of grams within postings (default: the trigram postings)"""
+        postings = self._postings if postings is None else postings
+        postings = sorted((postings.get(gram, ()) for gram in grams), key=len)
+        names = self._names
+        ids = set()
+        for posting in postings[:needed]:
+            ids.update(posting)
+        return (names[i] for i in ids if names[i] is not None)
+    ############################################################################
+    def prefixed(self, text, limit=None):
+        """the names starting with text, in order"""
+        names = self._sorted
+        ret = []
+        for i in range(bisect.bisect_left(names, text), len(names)):
+            if not names[i].startswith(text): break
+            if limit is not None and len(ret) >= limit: break
+            ret.append(names[i])
+        return ret
+    ############################################################################
+    def containing(self, text):
+        """the names containing text, in order"""
+        if not text: return list(self._sorted)
+        grams = trigrams(text, padded=False)
+        if not grams: # too short to hold a trigram, but held within a trigram of each match
+            grams = [gram for gram in self._postings if text in gram]
+            needed = None
+        else:
+            needed = 1
+        candidates = self._candidates(grams, needed)
+        return sorted(name for name in candidates if text in name)
+    ############################################################################
+    def similar(self, text, maxDistance=2):
+        """(distance, name) of the names within maxDistance edits of text, nearest first"""
+        grams = trigrams(text)
+        needed = 3 * maxDistance + 1
+        if needed < len(grams):
+            candidates = self._candidates(grams, needed)
+        elif len(text) + maxDistance > SHORT_NAME: # too few trigrams (repeated characters) to rule any name out
+            candidates = self._sorted
+        else: # only short names are near enough
+            pairs = bigrams(text)
+            needed = 2 * maxDistance + 1
+            if needed <= len(pairs):    candidates = self._candidates(pairs, needed, self._short)
+            else:                       candidates = self._candidates( # every short name of a length within reach
+                range(max(len(text) - maxDistance, 0), len(text) + maxDistance + 1), postings=self._short)
+        ret = []
+        for name in candidates:
+            distance = editDistance(text, name, maxDistance)
+            if distance is not None: ret.append((distance, name))
+        ret.sort()
+        return ret
+    ############################################################################
+    def search(self, text, limit=10, maxDistance=2):
+        """the (EXACT, PREFIX, SUBSTRING or SIMILAR, name) of the limit (None: all)
+        names that best match text, ranked by how closely they match and then by
+        edit distance"""
+        ranked = {}
+        for name in self.containing(text): # edit distance is the number of extra characters
+            quality = EXACT if name == text else PREFIX if name.startswith(text) else SUBSTRING
+            ranked[name] = (quality, len(name) - len(text), name)
+        for distance, name in self.similar(text, maxDistance):
+            ranked.setdefault(name, (SIMILAR, distance, name))
+        if limit is None:   ranked = sorted(itervalues(ranked))
+        else:               ranked = heapq.nsmallest(limit, itervalues(ranked))
+        return [(quality, name) for quality, distance, name in ranked]
+
+
+################################################################################
+__all__ = ["NameIndex", "EXACT", "PREFIX", "SUBSTRING", "SIMILAR", "trigrams", "bigrams", "editDistance"]
@@ -7,7 +7,7 @@ from __future__ import absolute_import
 from __future__ import division       # python 2/3 compatibility
 from __future__ import print_function # python 2/3 compatibility
 
-from sc2players.playerRecord import PlayerRecord
+from sc2players.playerRecord import PlayerRecord, internType
 from sc2players import constants as c
 
 
@@ -20,7 +20,7 @@ class PlayerPreGame(PlayerRecord):
             self.isObserver     = playerProfile.isObserver
             self.playerID       = playerProfile.playerID
         else:
-            self.selectedRace   = c.SelectRaces(selectedRace)
+            self.selectedRace   = internType(c.SelectRaces, selectedRace)
             self.isObserver     = observe
             self.playerID       = playerID
         super(PlayerPreGame, self).__init__(source=playerProfile) # could also specify a player's profile name
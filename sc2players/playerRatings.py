@@ -0,0 +1,156 @@
+"""
+PURPOSE: compute Elo rating changes for a batch of match results
+
+The games of a batch are scheduled into rounds in which each player appears at
+most once while every player's games keep their batch order.  Each round is
+then rated as a whole: when numpy is available the expected scores and rating
+changes of all of a round's games are computed at once; otherwise an
+equivalent loop over the round's games is used.
+
+Rating changes may also be logged to a per-player rating history that is only
+ever appended to.
+"""
+
+from __future__ import absolute_import
+from __future__ import division       # python 2/3 compatibility
+from __future__ import print_function # python 2/3 compatibility
+
+import os
+import time
+
+try:    import numpy as np
+except ImportError: # optional; vectorizes the rating of each round when available
+        np = None
+
+from sc2players import constants as c
+
+
+################################################################################
+WIN         = 1.0 # score of the first player of a game that it won
+DRAW        = 0.5
+LOSS        = 0.0
+
+
+################################################################################
+def expectedScore(rating, opponentRating):
+    """the Elo expected score of a player against an opponent"""
+    return 1.0 / (1.0 + 10.0 ** ((opponentRating - rating) / 400.0))
+
+
+################################################################################
+def scheduleRounds(games):
+    """group the indexes of (player, opponent, ...) games into rounds in which
+    no player appears twice, preserving the order of each player's games"""
+    rounds = []
+    nextRound = {} # player -> first round in which it is free
+    for i, game in enumerate(games):
+        player, opponent = game[0], game[1]
+        if player == opponent:
+            raise ValueError("player '%s' cannot play against itself"%(player))
+        r = max(nextRound.get(player, 0), nextRound.get(opponent, 0))
+        if r == len(rounds): rounds.append([])
+        rounds[r].append(i)
+        nextRound[player] = nextRound[opponent] = r + 1
+    return rounds
+
+
+################################################################################
+def rateGames(ratings, games, kFactor=c.ELO_K_FACTOR, useNumpy=None):
+    """apply the Elo rating changes of games, each (player, opponent, score)
+    where score is the player's WIN, DRAW or LOSS, to ratings: a dict of
+    player -> rating covering every player of games.  Return the new ratings
+    (unrounded) and each game's (player rating, opponent rating) afterwards."""
+    if useNumpy is None: useNumpy = np is not None
+    names = list(ratings)
+    ids = dict((name, i) for i, name in enumerate(names))
+    player   = [ids[game[0]] for game in games]
+    opponent = [ids[game[1]] for game in games]
+    score    = [float(game[2]) for game in games]
+    if useNumpy:
+        current  = np.array([ratings[name] for name in names], dtype=float)
+        player   = np.array(player, dtype=np.intp)
+        opponent = np.array(opponent, dtype=np.intp)
+        score    = np.array(score)
+        pAfter, oAfter = np.empty(len(games)), np.empty(len(games))
+        for gameIds in scheduleRounds(games):
+            gameIds = np.array(gameIds, dtype=np.intp)
+            p, o = player[gameIds], opponent[gameIds]
+            change = kFactor * (score[gameIds] - 1.0 / (1.0 + 10.0 ** ((current[o] - current[p]) / 400.0)))
+            current[p] += change # no player is repeated within a round
+            current[o] -= change
+            pAfter[gameIds] = current[p]
+            oAfter[gameIds] = current[o]
+        current = current.tolist()
+        after = list(zip(pAfter.tolist(), oAfter.tolist()))
+    else:
+        current = [float(ratings[name]) for name in names]
+        after = [None] * len(games)
+        for gameIds in scheduleRounds(games):
+            for i in gameIds:
+                p, o = player[i], opponent[i]
+                change = kFactor * (score[i] - expectedScore(current[p], current[o]))
+                current[p] += change
+                current[o] -= change
+                after[i] = (current[p], current[o])
+    return dict(zip(names, current)), after
+
+
+################################################################################
+def historyFolder():
+    """where the rating history of every player is stored"""
+    return os.path.join(c.PLAYERS_FOLDER, c.RATING_HISTORY_FOLDER)
+
+
+################################################################################
+def historyFilename(name):
+    """the absolute path to the named player's rating history file"""
+    return os.path.join(historyFolder(), "ratings_%s.csv"%(name))
+
+
+################################################################################
+def appendHistory(entries, when=None):
+    """append each (name, rating) of entries, in order, to the named player's
+    rating history; when defaults to now"""
+    if when is None: when = time.time()
+    byName = {}
+    for name, rating in entries:
+        byName.setdefault(name, []).append("%r,%d\n"%(when, rating))
+    if not byName: return
+    folder = historyFolder()
+    if not os.path.isdir(folder): os.makedirs(folder)
+    for name, lines in byName.items():
+        with open(historyFilename(name), "a") as f:
+            f.writelines(lines)
+
+
+################################################################################
+def loadHistory(name):
+    """the named player's logged (time, rating) changes, oldest first"""
+    try:
+        with open(historyFilename(name)) as f:
+            lines = f.read().splitlines()
+    except (IOError, OSError): return []
+    ret = []
+    for line in lines:
+        when, rating = line.split(",")
+        ret.append((float(when), int(rating)))
+    return ret
+
+
+################################################################################
+def deleteHistory(name):
+    """forget the named player's rating history, if any"""
+    try:    os.remove(historyFilename(name))
+    except (IOError, OSError): pass
+
+
+################################################################################
+def renameHistory(oldName, newName):
+    """associate the rating history of oldName with newName"""
+    try:    os.replace(historyFilename(oldName), historyFilename(newName))
+    except (IOError, OSError): pass # no history to move
+
+
+################################################################################
+__all__ = ["WIN", "DRAW", "LOSS", "expectedScore", "scheduleRounds", "rateGames",
+           "appendHistory", "loadHistory", "deleteHistory", "renameHistory"]
@@ -8,49 +8,212 @@ from __future__ import print_function # python 2/3 compatibility
 
 from six import iteritems # python 2/3 compatibility
 
-import json
+from functools import partial
+import copy
 import os
 import re
+import sys
 import time
+import weakref
 
 from sc2players import constants as c
-#from sc2matchHistory import getPlayerHistory
+from sc2players import playerStorage
+from sc2players.matchHistory import MatchHistory
+
+
+################################################################################
+_REGEX_BRACES   = re.compile(r"[\{\}]+")
+_REGEX_TERMS    = re.compile(r"[,\s]+")
+_REGEX_KEYVAL   = re.compile(":")
+_REGEX_QUOTES   = re.compile("['\"]")
+_REGEX_TRUE     = re.compile("true" , flags=re.IGNORECASE)
+_REGEX_FALSE    = re.compile("false", flags=re.IGNORECASE)
+
+
+################################################################################
+def _convertStrToDict(strVal):
+    """interpret a string such as "{key: value, key2: value2}" as a dictionary"""
+    if isinstance(strVal, dict): return strVal
+    strVal = _REGEX_BRACES.sub("", str(strVal))
+    ret = {}
+    for t in _REGEX_TERMS.split(strVal):
+        k, v = _REGEX_KEYVAL.split(t)
+        k = _REGEX_QUOTES.sub("", k)
+        v = _REGEX_QUOTES.sub("", v)
+        if   _REGEX_TRUE.search(v):     v = True
+        elif _REGEX_FALSE.search(v):    v = False
+        else:
+            if '.' in v:
+                try:                    v = float(v)
+                except:                 pass
+            else:
+                try:                    v = int(v)
+                except:                 pass
+        ret[k] = v
+    return ret
+
+
+################################################################################
+_ratingListeners = [] # weak references to methods called as (player, oldRating, newRating)
+
+
+################################################################################
+def addRatingListener(method):
+    """call the given bound method whenever the rating of any PlayerRecord
+    changes, for as long as the method's object exists"""
+    _ratingListeners.append(weakref.WeakMethod(method))
+
+
+################################################################################
+def _ratingChanged(player, oldRating, newRating):
+    for ref in list(_ratingListeners):
+        listener = ref()
+        if listener is None:    _ratingListeners.remove(ref)
+        else:                   listener(player, oldRating, newRating)
+
+
+################################################################################
+_internedTypes = {} # (RestrictedType subclass, value) -> the instance shared by all records
+
+
+################################################################################
+def internType(typecast, value):
+    """obtain the typecast(value) instance shared by every record.  Shared
+    instances must be replaced, never modified in place."""
+    if isinstance(value, c.RestrictedType): value = value.type
+    key = (typecast, value)
+    try:    return _internedTypes[key]
+    except KeyError: pass
+    except TypeError: return typecast(value) # unhashable values aren't shared
+    ret = _internedTypes[key] = typecast(value)
+    return ret
+
+
+################################################################################
+def _internStr(v):
+    """strings that repeat across many records (e.g. race names) are stored once"""
+    strVal = str(v)
+    if "<" in strVal or v is None:      return sys.intern(strVal)
+    return sys.intern(strVal.lower())
+
+
+################################################################################
+def _coerceAs(typecast):
+    """build a coercer that converts a value into typecast, as PlayerRecord.update does"""
+    def coerce(v):
+        strVal = str(v)
+        if "<" in strVal or v is None:  return typecast(v)
+        return typecast(strVal.lower())
+    return coerce
+
+
+################################################################################
+def _coerceTime(v):
+    if v is None:                       return None
+    return float(v)
+
+
+################################################################################
+def _coerceOptions(v):
+    if v is None or "<" in str(v):      return dict(v)
+    return _convertStrToDict(v)
+
+
+################################################################################
+_TRACKED_ATTRS = { # slot -> persisted attribute it holds
+    "name"          : "name",
+    "type"          : "type",
+    "difficulty"    : "difficulty",
+    "initCmd"       : "initCmd",
+    "_initOptions"  : "initOptions",
+    "rating"        : "rating",
+    "created"       : "created",
+    "_lastActivity" : "lastActivity",
+    "raceDefault"   : "raceDefault",
+}
+_FIELD_BITS    = dict((field, 1 << i) for i, field in enumerate(sorted(_TRACKED_ATTRS.values()))) # persisted attribute -> its bit of _dirty
+_SLOT_BITS     = dict((slot, _FIELD_BITS[field]) for slot, field in iteritems(_TRACKED_ATTRS))
+_ALL_DIRTY     = sum(_FIELD_BITS.values())
 
 
 ################################################################################
 class PlayerRecord(object):
     """manage the out-of-game meta data of a given player"""
-    AVAILABLE_KEYS = [
-        "name",
-        "type",
-        "difficulty",
-        "initCmd",
-        "initOptions",
-        "raceDefault",
-        "rating",
-    ]
+    __slots__ = ("name", "type", "difficulty", "initCmd", "_initOptions",
+        "rating", "created", "_lastActivity", "raceDefault", "_matches", "_dirty", "_storedOptions", "__weakref__")
+    FIELDS = ["name", "type", "difficulty", "initCmd", "initOptions", "rating",
+        "created", "lastActivity", "raceDefault"] # every persisted attribute, in presentation order
+    AVAILABLE_KEYS = list(c.PLAYER_SETTINGS)
+    FIELD_SCHEMA = { # the coercer of each known attribute, built once
+        "name"          : _coerceAs(str),
+        "type"          : partial(internType, c.PlayerDesigns),
+        "difficulty"    : partial(internType, c.ComputerDifficulties),
+        "initCmd"       : str, # specifically don't mangle the command as specified
+        "initOptions"   : _coerceOptions,
+        "raceDefault"   : _internStr,
+        "rating"        : _coerceAs(int),
+        "created"       : _coerceAs(float),
+        "lastActivity"  : _coerceTime,
+    }
     ############################################################################
     def __init__(self, source=None, **override):
+        self._dirty                 = _ALL_DIRTY # nothing has been stored yet (a bit per changed field)
+        self._storedOptions         = None # a copy of the stored initOptions, once they've been handed out
         # define default values and their type
         self.name                   = ""
-        self.type                   = c.PlayerDesigns(c.HUMAN)
-        self.difficulty             = c.ComputerDifficulties(None) # only matters if type is a computer
+        self.type                   = internType(c.PlayerDesigns, c.HUMAN)
+        self.difficulty             = internType(c.ComputerDifficulties, None) # only matters if type is a computer
         self.initCmd                = "" # only used if self.type is an AI or bot
-        self.initOptions            = {}
+        self._initOptions           = None # no dict is allocated until options are defined
         self.rating                 = c.DEFAULT_RATING
         self.created                = time.time() # origination timestamp
+        self._lastActivity          = None # end of the most recent match, if any
         self.raceDefault            = c.RANDOM
-        self._matches               = [] # match history
+        self._matches               = None # match history (loaded on demand)
         # initialize with new values
         if   isinstance(source, str):           self.load(source) # assume a player file to load
         elif isinstance(source, dict):          self.update(source) # assume attribute dictionary
-        elif isinstance(source, PlayerRecord):  self.update(source.__dict__) # copy constructor
+        elif isinstance(source, PlayerRecord):  self.update(source.attrs) # copy constructor
         self.update(override)
         if not self.name:
             raise ValueError("must define 'name' parameter as part of %s source settings"%(self.__class__.__name__))
         if self.type in [c.BOT, c.AI] and not self.initCmd:
             raise ValueError("must provide initCmd attribute when specifying type=%s"%self.type)
     ############################################################################
+    @classmethod
+    def fromTrustedDict(cls, attrs):
+        """construct a PlayerRecord from attributes produced by simpleAttrs (e.g.
+        read back from save() output) without validating them again"""
+        self = cls.__new__(cls)
+        self._dirty         = 0
+        self._storedOptions = None
+        self.name           = attrs["name"]
+        self.type           = internType(c.PlayerDesigns, attrs.get("type", c.HUMAN))
+        self.difficulty     = internType(c.ComputerDifficulties, attrs.get("difficulty"))
+        self.initCmd        = attrs.get("initCmd", "")
+        self._initOptions   = dict(attrs["initOptions"]) if attrs.get("initOptions") else None
+        self.rating         = attrs.get("rating", c.DEFAULT_RATING)
+        self.created        = attrs.get("created") or time.time()
+        self._lastActivity  = attrs.get("lastActivity")
+        self.raceDefault    = sys.intern(attrs.get("raceDefault", c.RANDOM))
+        self._matches       = None
+        self._dirty         = 0 # identical to what is stored
+        return self
+    ############################################################################
+    def __setattr__(self, key, value):
+        """note which persisted attributes change so that unchanged records aren't
+        saved again, and announce rating changes"""
+        try:    bit = _SLOT_BITS[key]
+        except KeyError:
+            object.__setattr__(self, key, value)
+            return
+        oldValue = getattr(self, key, None)
+        object.__setattr__(self, key, value)
+        if oldValue == value: return
+        self._dirty |= bit
+        if key == "rating" and oldValue is not None and _ratingListeners:
+            _ratingChanged(self, oldValue, value)
+    ############################################################################
     def __str__(self): return self.__repr__()
     def __repr__(self):
         if self.isComputer: diff = "-%s"%self.difficulty.type 
@@ -65,8 +228,33 @@ class PlayerRecord(object):
         return self
     ############################################################################
     @property
+    def initOptions(self):
+        """the options passed to this player's initCmd"""
+        if self._initOptions is None: # allocate on first use so it can be modified in place
+            object.__setattr__(self, "_initOptions", {})
+        if self._storedOptions is None: # the caller may modify them in place
+            self._storedOptions = copy.deepcopy(self._initOptions)
+        return self._initOptions
+    @initOptions.setter
+    def initOptions(self, value):
+        self._initOptions = value or None
+    ############################################################################
+    @property
+    def lastActivity(self):
+        """when this player last finished a match (or was created, if no match has been played)"""
+        return self._lastActivity or self.created
+    @lastActivity.setter
+    def lastActivity(self, value):
+        self._lastActivity = value
+    ############################################################################
+    @property
+    def hasPlayed(self):
+        """whether this player has finished any match"""
+        return self.lastActivity > self.created
+    ############################################################################
+    @property
     def initOptStr(self):
-        return " ".join(["%s=%s"%(k,v) for k, v in self.initOptions.items()])
+        return " ".join(["%s=%s"%(k,v) for k, v in (self._initOptions or {}).items()])
     ############################################################################
     @property
     def isAI(self):         return self.type == c.AI
@@ -90,14 +278,16 @@ class PlayerRecord(object):
     ############################################################################
     @property
     def filename(self):
-        """return the absolute path to the object's filename"""
-        return os.path.join(c.PLAYERS_FOLDER, "player_%s.json"%(self.name))
+        """return the absolute path to the file in which the active storage keeps this player"""
+        return playerStorage.getStorage().filename(self.name)
     ############################################################################
     @property
     def attrs(self):
         """provide a copy of this player's attributes as a dictionary"""
-        ret = dict(self.__dict__) # obtain copy of internal __dict__
-        del ret["_matches"] # match history is specifically distinguished from player information (and stored separately)
+        ret = dict((k, getattr(self, k)) for k in self.FIELDS if k != "initOptions")
+        ret["initOptions"] = dict(self._initOptions or {})
+        ret.update(getattr(self, "__dict__", {})) # attributes defined by derived classes
+        # match history is specifically distinguished from player information (and stored separately)
         if self.type != c.COMPUTER: # difficulty only matters for computer playres
             del ret["difficulty"]
         return ret
@@ -108,30 +298,29 @@ class PlayerRecord(object):
         simpleAttrs = {}
         for k,v in iteritems(self.attrs):
             if k in ["_matches"]: continue # attributes to specifically ignore
-            try:    simpleAttrs[k] = v.type
+            try:    simpleAttrs[k] = getattr(v.type, "name", v.type) # MultiType values are stored by name
             except: simpleAttrs[k] = v
         return simpleAttrs
     ############################################################################
     @property
     def matches(self):
-        """retrieve the match history for this player from the matchHistory repo and cache the result"""
-        return []
-        #raise NotImplementedError("must finish player history first")
-        #if not self._matches: # load match History applicable to this player
-        #    self._matches = getPlayerHistory(self.name)
-        #return self._matches
+        """retrieve the match history for this player and cache the result"""
+        if self._matches is None: # load match history applicable to this player
+            self._matches = MatchHistory.load(self.name)
+        return self._matches
     ############################################################################
     def _validateAttrs(self, keys):
         """prove that all attributes are defined appropriately"""
+        allowed = self.FIELDS + list(getattr(self, "__dict__", {})) # include attributes of derived classes
         badAttrs = []
         for k in keys:
-            if k not in self.__dict__:
+            if k not in allowed:
                 badAttrs.append("Attribute key '%s' is not a valid attribute"%(k))
         badAttrsMsg = os.linesep.join(badAttrs)
         if not keys: return # is iterable, but didn't contain any keys
         if badAttrsMsg:
             raise ValueError("Encountered invalid attributes.  ALLOWED: %s%s%s"\
-                %(list(self.__dict__), os.linesep, badAttrsMsg))
+                %(allowed, os.linesep, badAttrsMsg))
     ############################################################################
     @property
     def control(self):
@@ -141,108 +330,97 @@ class PlayerRecord(object):
         return c.PlayerControls(value)
     ############################################################################
     def load(self, playerName=None):
-        """retrieve the PlayerRecord settings from saved disk file"""
+        """retrieve the PlayerRecord settings from the player storage backend"""
         if playerName: # switch the PlayerRecord this object describes
-            self.name = playerName # preset value to load self.filename
+            self.name = playerName # preset value to identify the stored record
+        storage = playerStorage.getStorage()
         try:
-            with open(self.filename, "rb") as f:
-                data = f.read()
-        except Exception:
-            raise ValueError("invalid profile, '%s'. file does not exist: %s"%(self.name, self.filename))
-        self.update(json.loads(data))
-        self._matches = [] # mandate match history be recalculated for this newly loaded player
-    ############################################################################
-    def save(self):
-        """save PlayerRecord settings to disk"""
-        data = str.encode( json.dumps(self.simpleAttrs, indent=4, sort_keys=True) )
-        with open(self.filename, "wb") as f:
-            f.write(data)
+            data = storage.load(self.name)
+        except KeyError:
+            raise ValueError("invalid profile, '%s'. record does not exist in %s"%(self.name, storage))
+        self.update(data)
+        self._matches = None # mandate match history be recalculated for this newly loaded player
+        self.markClean() # identical to what is stored
+    ############################################################################
+    def reload(self, attrs):
+        """adopt the given stored attributes (e.g. changed by another process)
+        while keeping any changes to this player that haven't been saved"""
+        dirty = self._dirtyFields()
+        self.update(dict((k, v) for k, v in iteritems(attrs) if not dirty & _FIELD_BITS.get(k, 0)))
+        self._dirty = dirty
+    ############################################################################
+    @property
+    def isDirty(self):
+        """whether this player has changes that haven't been saved"""
+        return bool(self._dirtyFields())
+    ############################################################################
+    def _dirtyFields(self):
+        """the bits of the fields changed since last stored, including options modified in place"""
+        stored = self._storedOptions
+        if stored is None or (self._initOptions or {}) == stored: return self._dirty
+        return self._dirty | _FIELD_BITS["initOptions"]
+    ############################################################################
+    def markClean(self):
+        """declare that this player's current attributes are stored"""
+        self._dirty = 0
+        if self._storedOptions is not None: # options handed out may still be modified in place
+            self._storedOptions = copy.deepcopy(self._initOptions or {})
+    ############################################################################
+    def save(self, force=False):
+        """save PlayerRecord settings to the player storage backend if they changed"""
+        if self._matches is not None and self._matches.modified:
+            self._matches.save() # match history is stored separately from player information
+        if not (self.isDirty or force): return False
+        playerStorage.getStorage().save(self.name, self.simpleAttrs)
+        self.markClean()
+        return True
     ############################################################################
     def update(self, attrs):
         """update attributes initialized with the proper type"""
-        ########################################################################
-        def convertStrToDict(strVal):
-            if isinstance(strVal, dict): return strVal
-            strVal = re.sub("[\{\}]+", "", str(strVal))
-            regexCol = re.compile(":")
-            terms = re.split("[,\s]+", strVal)
-            keyvals = [re.split(regexCol, t) for t in terms]
-            x = re.compile("['\"]")
-            ret = {}
-            boolTrue  = re.compile("true" , flags=re.IGNORECASE)
-            boolFalse = re.compile("false", flags=re.IGNORECASE)
-            for k, v in keyvals:
-                k = re.sub(x, "", k)
-                v = re.sub(x, "", v)
-                if   re.search(boolTrue, v):    v = True
-                elif re.search(boolFalse, v):   v = False
-                else:
-                    if '.' in v:
-                        try:                    v = float(v)
-                        except:                 pass
-                    else:
-                        try:                    v = int(v)
-                        except:                 pass
-                ret[k] = v
-            return ret
-        ########################################################################
-        self._validateAttrs(attrs)
+        schema = self.FIELD_SCHEMA
+        others = [k for k in attrs if k not in schema]
+        if others: self._validateAttrs(others) # only attributes outside the schema need checking
         for k,v in iteritems(attrs):
-            typecast = type( getattr(self, k) )
-            if typecast==bool and v=="False":   newval = False # "False" evalued as boolean is True because its length > 0
-            elif issubclass(typecast, c.RestrictedType): # let the RestrictedType handle the type setting, value matching
-                                                newval = typecast(v)
-            elif "<" in str(v) or v==None:      newval = typecast(v)
-            elif k == "initCmd":                newval = str(v) # specifically don't mangle the command as specified
-            elif k == "initOptions":            newval = convertStrToDict(v)
-            else:                               newval = typecast(str(v).lower())
+            try:    coerce = schema[k]
+            except KeyError: # an attribute defined by a derived class
+                typecast = type( getattr(self, k) )
+                if typecast==bool and v=="False":   newval = False # "False" evalued as boolean is True because its length > 0
+                elif issubclass(typecast, c.RestrictedType): # let the RestrictedType handle the type setting, value matching
+                                                    newval = typecast(v)
+                elif "<" in str(v) or v==None:      newval = typecast(v)
+                else:                               newval = typecast(str(v).lower())
+            else:                                   newval = coerce(v)
             setattr(self, k, newval)
         if self.isComputer: pass
         elif "difficulty" in attrs and attrs["difficulty"]!=None: # the final state of this PlayerRecord cannot be a non-computer and specify a difficulty
             raise ValueError("%s type %s=%s does not have a difficulty"%(
                 self.__class__.__name__, self.type.__class__.__name__, self.type.type))
-        else: self.difficulty = c.ComputerDifficulties(None)
-    ############################################################################
-    def matchSubset(**kwargs):
-        """extract matches from player's entire match history given matching criteria kwargs"""
-        ret = []
-        for m in self.matches:
-            allMatched = True
-            for k,v in iteritems(kwargs):
-                mVal = getattr(m, k)
-                try:
-                    if v == mVal or v in mVal: continue # this check passed
-                except Exception: pass # if attempting to check __contains__ and exception is raised, it's assumed to be false
-                allMatched = False
-                break
-            if allMatched: ret.append(m)
-        return ret
+        else: self.difficulty = internType(c.ComputerDifficulties, None)
+    ############################################################################
+    def matchSubset(self, **criteria):
+        """extract matches from player's entire match history given matching criteria"""
+        history = self.matches
+        return [history[i] for i in history.select(**criteria)]
     ############################################################################
     def apmRecent(self, maxMatches=c.RECENT_MATCHES, **criteria):
         """collect recent match history's apm data to report player's calculated MMR"""
         if not self.matches: return 0 # no apm information without match history
-        #try:        maxMatches = criteria["maxMatches"]
-        #except:     maxMatches = c.RECENT_MATCHES
-        apms = [m.apm(self) for m in self.recentMatches(maxMatches=maxMatches, **criteria)]
-        return sum(apms) / len(apms)
+        return self.matches.apmMean(self.matches.recent(maxMatches, **criteria))
     ############################################################################
     def apmAggregate(self, **criteria):
         """collect all match history's apm data to report player's calculated MMR"""
-        apms = [m.apm(self) for m in self.matchSubset(**criteria)]
-        if not apms: return 0 # no apm information without match history
-        return sum(apms) / len(apms)
+        if not self.matches: return 0 # no apm information without match history
+        return self.matches.apmMean(self.matches.select(**criteria))
     ############################################################################
     def recentMatches(self, **criteria):
-        """identify all recent matches for player given optional, additional criteria"""
+        """identify the most recent matches (most recent first) for player given optional, additional criteria"""
         if not self.matches: return [] # no match history
-        try: # maxMatches is a specially handled parameter (not true criteria)
-            maxMatches = criteria["maxMatches"]
-            del criteria["maxMatches"]
-        except AttributeError:
-            maxMatches = c.RECENT_MATCHES
-        alLMatches = self.matchSubset(**criteria)
-        matchTimes = [(m.endTime, m) for m in matches]
-        selMatches = sorted(matchTimes)[:maxMatches] # slice off X most recet matches
-        retMatches = [m for endTime,m in selMatches] # extract matches only
-        return retMatches
-        
+        maxMatches = criteria.pop("maxMatches", c.RECENT_MATCHES) # a specially handled parameter (not true criteria)
+        history = self.matches
+        return [history[i] for i in history.recent(maxMatches, **criteria)]
+    ############################################################################
+    def addMatch(self, endTime, opponent, race=None, duration=0.0, apm=0.0):
+        """record a match this player finished; saved along with this player"""
+        self.matches.append(endTime, opponent, race=race, duration=duration, apm=apm)
+        if endTime > self.lastActivity:
+            self.lastActivity = endTime
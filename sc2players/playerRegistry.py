@@ -0,0 +1,387 @@
+"""
+PURPOSE: a lazily populated mapping of player names to PlayerRecord objects
+
+Only player names are enumerated up front (the storage backend provides them
+cheaply, e.g. from filenames).  A player's stored attributes are parsed and
+validated only when that entry is accessed.  The number (or approximate size)
+of players held in memory may be bounded, in which case the least recently
+used players are forgotten and loaded again when next accessed.
+"""
+
+from __future__ import absolute_import
+from __future__ import division       # python 2/3 compatibility
+from __future__ import print_function # python 2/3 compatibility
+
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+try:    from collections.abc import MutableMapping
+except ImportError: # python 2
+        from collections import MutableMapping
+import os
+import sys
+import threading
+
+from sc2players import constants as c
+from sc2players import playerStorage
+from sc2players.playerLocks import ReadWriteLock
+from sc2players.playerIndex import PlayerIndex
+from sc2players.playerNames import NameIndex
+from sc2players.playerRecord import PlayerRecord, addRatingListener
+
+
+################################################################################
+PlayerChanges = namedtuple("PlayerChanges", ["added", "updated", "removed"])
+CacheStats    = namedtuple("CacheStats", ["hits", "misses", "evictions", "records", "bytes"])
+
+
+################################################################################
+def recordSize(player):
+    """the approximate number of bytes held by a loaded player (its type values are shared)"""
+    size = sys.getsizeof(player) + sys.getsizeof(player.name) + sys.getsizeof(player.initCmd)
+    if player._initOptions:
+        size += sys.getsizeof(player._initOptions) + sum(sys.getsizeof(k) + sys.getsizeof(v)
+            for k, v in player._initOptions.items())
+    return size
+
+
+################################################################################
+class PlayerRegistry(MutableMapping):
+    """dict-like mapping of lowercase player names to PlayerRecord objects.
+    Hold lock for reading while looking up players and for writing while
+    changing them; a player is loaded at most once under a read lock.
+    At most maxRecords players (and approximately maxBytes) are kept loaded;
+    None is unbounded.  pinned names are never evicted; None pins Blizzard's
+    built-in bots."""
+    ############################################################################
+    def __init__(self, storage=None, maxRecords=c.CACHE_MAX_RECORDS, maxBytes=c.CACHE_MAX_BYTES, pinned=None):
+        self._storage   = storage # if unspecified, the active backend is evaluated on every use
+        self._records   = OrderedDict() # name -> PlayerRecord, for each materialized player, least recently used first
+        self._sizes     = {} # name -> approximate bytes of each materialized player
+        self._bytes     = 0 # approximate bytes of all materialized players
+        self._lru       = threading.Lock() # guards the order and sizes of materialized players
+        self.hits       = 0 # lookups of materialized players
+        self.misses     = 0 # lookups that loaded a player
+        self.evictions  = 0 # materialized players forgotten to satisfy the cache bounds
+        self.setPolicy(maxRecords, maxBytes, pinned)
+        self._sources   = {} # name -> name as known by the storage backend, for each known player
+        self._signatures= {} # name -> storage signature when the record was last loaded or scanned
+        self._indexed   = False # whether all stored names have been enumerated
+        self._index_    = None # PlayerIndex of attributes, built on first use
+        self._names_    = None # NameIndex of every known name, built on first use
+        self.lock       = ReadWriteLock()
+        addRatingListener(self._ratingChanged)
+    ############################################################################
+    def __repr__(self):
+        return "<%s %d loaded of %s known>"%(self.__class__.__name__, len(self._records),
+            len(self._sources) if self._indexed else "?")
+    ############################################################################
+    def setPolicy(self, maxRecords=None, maxBytes=None, pinned=None):
+        """bound the loaded players to maxRecords and approximately maxBytes (None:
+        unbounded), never evicting the pinned names (None: Blizzard's built-in bots)"""
+        self.maxRecords = maxRecords
+        self.maxBytes   = maxBytes
+        self._pinned    = None if pinned is None else frozenset(name.lower() for name in pinned)
+        if self.bounded:
+            with self._lru: # players loaded while unbounded weren't sized
+                self._sizes = dict((name, recordSize(player)) for name, player in self._records.items())
+                self._bytes = sum(self._sizes.values())
+        self._evict()
+    ############################################################################
+    @property
+    def bounded(self):
+        return self.maxRecords is not None or self.maxBytes is not None
+    ############################################################################
+    @property
+    def pinned(self):
+        """the names of the players that are never evicted"""
+        if self._pinned is None: # found by the storage backend; no player need be loaded
+            self._pinned = frozenset(name.lower() for name in self.storage.namesWhere("type", c.COMPUTER))
+        return self._pinned
+    ############################################################################
+    @property
+    def stats(self):
+        """CacheStats of the lookups and evictions so far and of the loaded players"""
+        return CacheStats(self.hits, self.misses, self.evictions, len(self._records), self._bytes)
+    ############################################################################
+    def _admit(self, name):
+        """account for a newly (re)materialized player and evict others if needed"""
+        if not self.bounded: return
+        with self._lru:
+            try:    size = recordSize(self._records[name])
+            except KeyError: return # already removed
+            self._bytes += size - self._sizes.get(name, 0)
+            self._sizes[name] = size
+        self._evict()
+    ############################################################################
+    def _forget(self, name):
+        """stop accounting for a player that is no longer materialized"""
+        with self._lru:
+            self._bytes -= self._sizes.pop(name, 0)
+    ############################################################################
+    def _evict(self):
+        """forget the least recently used players until within bounds; pinned players
+        and players with unsaved changes are kept"""
+        if not self.bounded: return
+        maxRecords = len(self._records) if self.maxRecords is None else self.maxRecords
+        maxBytes   = self._bytes        if self.maxBytes   is None else self.maxBytes
+        if len(self._records) <= maxRecords and self._bytes <= maxBytes: return
+        pinned = self.pinned
+        with self._lru:
+            count, size, victims = len(self._records), self._bytes, []
+            for name, player in self._records.items():
+                if count <= maxRecords and size <= maxBytes: break
+                if name in pinned or player.isDirty: continue
+                victims.append(name)
+                count -= 1
+                size -= self._sizes.get(name, 0)
+            for name in victims:
+                self._records.pop(name, None)
+                self._bytes -= self._sizes.pop(name, 0)
+            self.evictions += len(victims)
+    ############################################################################
+    @property
+    def storage(self):
+        return self._storage or playerStorage.getStorage()
+    ############################################################################
+    @property
+    def index(self):
+        """secondary indexes of every known player's attributes, kept consistent with this registry"""
+        if self._index_ is None:
+            self._index_ = PlayerIndex(self._indexedAttrs(self._index()))
+        return self._index_
+    ############################################################################
+    @property
+    def names(self):
+        """NameIndex of every known player's name, kept consistent with this registry"""
+        if self._names_ is None:
+            self._names_ = NameIndex(self._index())
+        return self._names_
+    ############################################################################
+    def _ratingChanged(self, player, oldRating, newRating):
+        """keep the index's ladder current when one of this registry's records is re-rated"""
+        if self._index_ is None: return
+        name = player.name.lower()
+        if self._records.get(name) is player:
+            self._index_.setRating(name, newRating)
+    ############################################################################
+    def _indexedAttrs(self, names):
+        """generate (name, attrs) to index for the given names without materializing records"""
+        storage = self.storage
+        for name in names:
+            try:    yield name, self._records[name].simpleAttrs
+            except KeyError: pass
+            else:   continue
+            try:    yield name, storage.load(self._sources[name])
+            except (KeyError, ValueError): pass # disappeared or invalid; not indexed
+    ############################################################################
+    def _index(self):
+        """enumerate the names of all stored players (but not their data) once"""
+        if not self._indexed:
+            for storedName in self.storage.names():
+                self._sources.setdefault(storedName.lower(), storedName)
+            self._indexed = True
+        return self._sources
+    ############################################################################
+    def _locate(self, name, scan=True):
+        """identify the stored name of the given player without enumerating all players, if possible"""
+        try:    return self._sources[name]
+        except KeyError: pass
+        if self._indexed: return None
+        if self.storage.exists(name): return name # direct lookup avoids a scan of every name
+        if scan: return self._index().get(name)
+    ############################################################################
+    def storedName(self, name, scan=True):
+        """the name by which the storage backend knows the given player (which may
+        differ in case).  Unless scan, names not found directly aren't sought
+        among every stored name."""
+        return self._locate(name.lower(), scan) or name
+    ############################################################################
+    def __getitem__(self, name):
+        try:    player = self._records[name]
+        except KeyError: pass
+        else:
+            self.hits += 1
+            if self.bounded:
+                with self._lru:
+                    if name in self._records: self._records.move_to_end(name) # most recently used
+            return player
+        storedName = self._locate(name)
+        if storedName is None: raise KeyError(name)
+        self.misses += 1
+        signature = self.storage.signature(storedName)
+        player = self._load(storedName)
+        with self._lru: # concurrent readers keep the first player loaded
+            player = self._records.setdefault(name, player)
+        self._signatures[name] = signature
+        self._sources[name] = storedName
+        self._admit(name)
+        return player
+    ############################################################################
+    def _load(self, storedName):
+        """a validated PlayerRecord of the named record of this registry's storage backend"""
+        try:    attrs = self.storage.load(storedName)
+        except KeyError:
+            raise ValueError("invalid profile, '%s'. record does not exist in %s"%(storedName, self.storage))
+        player = PlayerRecord(dict(attrs, name=attrs.get("name") or storedName))
+        if not attrs.get("name"): player.name = storedName # the json layout allows the filename to provide the name
+        player.markClean() # identical to what is stored
+        return player
+    ############################################################################
+    def __setitem__(self, name, player):
+        storedName = self._sources.get(name) or player.name # an existing record keeps its stored name
+        self._records[name] = player
+        self._sources[name] = storedName
+        self._signatures[name] = self.storage.signature(storedName) # the caller just stored this record
+        if self._index_ is not None: self._index_.add(name, player.simpleAttrs)
+        if self._names_ is not None: self._names_.add(name)
+        self._admit(name)
+    ############################################################################
+    def __delitem__(self, name):
+        if self._locate(name) is None: raise KeyError(name)
+        self._records.pop(name, None)
+        self._forget(name)
+        self._sources.pop(name, None)
+        self._signatures.pop(name, None)
+        if self._index_ is not None: self._index_.remove(name)
+        if self._names_ is not None: self._names_.remove(name)
+    ############################################################################
+    def __contains__(self, name):
+        return name in self._records or self._locate(name) is not None
+    ############################################################################
+    def __iter__(self):
+        return iter(list(self._index()))
+    ############################################################################
+    def __len__(self):
+        return len(self._index())
+    ############################################################################
+    def revalidate(self, names):
+        """make the given players current with their stored records, which another
+        process may have added, changed or removed, before they are changed here.
+        Changes to loaded players that haven't been saved are kept."""
+        storage = self.storage
+        for name in names:
+            name = name.lower()
+            storedName = self._sources.get(name)
+            if storedName is None:
+                if self._indexed and storage.exists(name): # added by another process
+                    self._sources[name] = name
+                    if self._names_ is not None: self._names_.add(name)
+                continue
+            signature = storage.signature(storedName)
+            if signature is None: # removed by another process
+                del self[name]
+                continue
+            player = self._records.get(name)
+            if player is None: continue # the current record is read when first accessed
+            try:    player.reload(storage.load(storedName)) # coarse timestamps may hide a change from signature
+            except KeyError: continue # removed while reading
+            self._signatures[name] = signature
+            if self._index_ is not None: self._index_.add(name, player.simpleAttrs)
+    ############################################################################
+    def noteStored(self, storedName, attrs):
+        """account for a record this process just stored without materializing
+        it; a loaded player is read again when next accessed"""
+        name = storedName.lower()
+        if name in self._records:
+            self._records.pop(name, None)
+            self._forget(name)
+        self._signatures.pop(name, None)
+        if not self._indexed and name not in self._sources: return # found by lookup or the first scan
+        self._sources.setdefault(name, storedName)
+        if self._index_ is not None: self._index_.add(name, attrs)
+        if self._names_ is not None: self._names_.add(name)
+    ############################################################################
+    def isLoaded(self, name):
+        """determine whether the named player's record is already materialized"""
+        return name in self._records
+    ############################################################################
+    def loadAll(self, workers=None, useProcesses=True):
+        """materialize every player that isn't loaded yet by splitting the work
+        across a pool of worker processes (or threads).  Valid records are
+        always kept; any invalid ones are reported together afterward."""
+        names       = [name for name in self._index() if name not in self._records]
+        signatures  = self.storage.signatures() # before loading so that later changes are detected
+        workers     = workers or c.LOAD_WORKERS or os.cpu_count() or 1
+        numChunks   = min(len(names), workers * c.LOAD_CHUNKS) or 1
+        chunks      = [[self._sources[n] for n in names[i::numChunks]] for i in range(numChunks)]
+        loader      = partial(_loadChunk, self.storage.kind, self.storage.location)
+        if workers <= 1 or numChunks <= 1:
+            results = [loader(chunk) for chunk in chunks]
+        else:
+            Executor = ProcessPoolExecutor if useProcesses else ThreadPoolExecutor
+            with Executor(max_workers=workers) as pool:
+                results = list(pool.map(loader, chunks))
+        errors = []
+        for chunk in results:
+            for storedName, attrs, error in chunk:
+                if error:
+                    errors.append((storedName, error))
+                    continue
+                name = storedName.lower()
+                self._records[name]     = PlayerRecord.fromTrustedDict(attrs) # validated by the worker
+                self._signatures[name]  = signatures.get(storedName)
+                self._admit(name)
+        if errors:
+            raise c.InvalidPlayerRecordsException(sorted(errors))
+        return self
+    ############################################################################
+    def refresh(self):
+        """rescan the storage backend, re-parsing only the loaded records that
+        changed since they were last seen; return the names of all changes"""
+        current = {}
+        for storedName, signature in self.storage.signatures().items():
+            current[storedName.lower()] = (storedName, signature)
+        added, updated = [], []
+        removed = sorted(name for name in self._sources if name not in current)
+        for name in removed:
+            del self[name]
+        for name, (storedName, signature) in current.items():
+            if name not in self._sources:
+                added.append(name)
+                self._sources[name] = storedName
+            elif name in self._signatures and self._signatures[name] != signature:
+                updated.append(name)
+                if name in self._records: # only materialized players are re-parsed
+                    self._records[name] = self._load(storedName)
+                    self._admit(name)
+            self._signatures[name] = signature
+        if self._names_ is not None: self._names_.update(added)
+        self._indexed = True
+        if self._index_ is not None:
+            for name, attrs in self._indexedAttrs(added + updated):
+                self._index_.add(name, attrs)
+        return PlayerChanges(sorted(added), sorted(updated), removed)
+    ############################################################################
+    def clear(self):
+        """forget all known names and records; they are rediscovered on next use"""
+        self._records   = OrderedDict()
+        self._sizes     = {}
+        self._bytes     = 0
+        self._sources   = {}
+        self._signatures= {}
+        self._indexed   = False
+        self._index_    = None
+        self._names_    = None
+
+
+################################################################################
+def _loadChunk(kind, location, storedNames):
+    """load and validate the named players in a worker; return (name, simpleAttrs, error) for each"""
+    storage = playerStorage.openStorage(kind, location)
+    ret = []
+    try:
+        for storedName in storedNames:
+            try:
+                attrs = storage.load(storedName)
+                attrs.setdefault("name", storedName) # the json layout allows the filename to provide the name
+                ret.append((storedName, PlayerRecord(attrs).simpleAttrs, None))
+            except Exception as e:
+                ret.append((storedName, None, "%s: %s"%(type(e).__name__, e)))
+    finally:
+        storage.close()
+    return ret
+
+
+################################################################################
+__all__ = ["PlayerRegistry", "PlayerChanges", "CacheStats", "recordSize"]
@@ -0,0 +1,249 @@
+"""
+PURPOSE: compile every stored player into a packed, read-only snapshot file and
+         look players up directly within a memory mapping of it
+
+A snapshot is laid out as (all values little-endian):
+    header      MAGIC, format version, number of records, number of hash slots
+                and the offsets of the hash index and string pool
+    records     one fixed-width RECORD per player, ordered by name
+    hash index  open addressing slots holding 1 + a record number (0: empty),
+                located by the crc32 of the player's lowercase name
+    string pool utf-8 text of every distinct string the records refer to as
+                (offset, length) pairs; zero length means None
+
+Because the file is mapped rather than read, every process that attaches the
+same snapshot (including forked workers) shares one copy of its pages, and
+attaching only reads the header.  A player is decoded when it is looked up.
+"""
+
+from __future__ import absolute_import
+from __future__ import division       # python 2/3 compatibility
+from __future__ import print_function # python 2/3 compatibility
+
+try:    from collections.abc import Mapping
+except ImportError: # python 2
+        from collections import Mapping
+import json
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import zlib
+
+from sc2players import constants as c
+from sc2players.playerIndex import PlayerIndex
+from sc2players.playerLocks import ReadWriteLock
+from sc2players.playerNames import NameIndex
+from sc2players.playerRecord import PlayerRecord
+from sc2players.playerRegistry import CacheStats, PlayerChanges
+
+
+################################################################################
+MAGIC       = b"SC2PS"
+VERSION     = 1
+HEADER      = struct.Struct("<5sBxxIIQQQ") # magic, version, records, slots, records, hash, pool offsets
+RECORD      = struct.Struct("<IIIIIIIIIIIIidd") # (offset, length) of name, type, difficulty,
+                # raceDefault, initCmd and initOptions json; rating, created, lastActivity (nan: None)
+SLOT        = struct.Struct("<I")
+STRINGS     = ["name", "type", "difficulty", "raceDefault", "initCmd", "initOptions"]
+
+
+################################################################################
+def _hash(key):
+    return zlib.crc32(key.encode("utf-8")) & 0xffffffff
+
+
+################################################################################
+def compileSnapshot(records, filename):
+    """write (name, simpleAttrs) of records into a snapshot file at filename,
+    replacing any existing snapshot atomically; return the number of records"""
+    pool, offsets = bytearray(), {}
+    def intern(text):
+        if text is None: return (0, 0)
+        data = text.encode("utf-8")
+        if not data: return (0, 0)
+        if data not in offsets:
+            offsets[data] = len(pool)
+            pool.extend(data)
+        return (offsets[data], len(data))
+    rows = []
+    for name, attrs in sorted(records, key=lambda pair: pair[0].lower()):
+        attrs = dict(attrs, name=attrs.get("name") or name)
+        options = attrs.get("initOptions")
+        values = [attrs.get(key) for key in STRINGS[:-1]] + [
+            json.dumps(options, sort_keys=True) if options else None]
+        fields = []
+        for value in values:
+            fields.extend(intern(None if value is None else str(value)))
+        lastActivity = attrs.get("lastActivity")
+        fields.append(int(attrs.get("rating", c.DEFAULT_RATING)))
+        fields.append(float(attrs.get("created") or 0.0))
+        fields.append(float("nan") if lastActivity is None else float(lastActivity))
+        rows.append((attrs["name"].lower(), RECORD.pack(*fields)))
+    numSlots = 1 << max(3, (2 * len(rows)).bit_length()) # at most half full
+    slots = [0] * numSlots
+    for i, (key, row) in enumerate(rows):
+        slot = _hash(key) & (numSlots - 1)
+        while slots[slot]:
+            slot = (slot + 1) & (numSlots - 1)
+        slots[slot] = i + 1
+    recordsOffset = HEADER.size
+    hashOffset = recordsOffset + RECORD.size * len(rows)
+    poolOffset = hashOffset + SLOT.size * numSlots
+    folder = os.path.dirname(os.path.abspath(filename))
+    if not os.path.isdir(folder): os.makedirs(folder)
+    fd, tempName = tempfile.mkstemp(suffix=".tmp", dir=folder)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(rows), numSlots, recordsOffset, hashOffset, poolOffset))
+            f.write(b"".join(row for key, row in rows))
+            f.write(struct.pack("<%dI"%numSlots, *slots))
+            f.write(bytes(pool))
+        os.replace(tempName, filename) # attached workers keep mapping the snapshot they opened
+    except Exception:
+        os.remove(tempName)
+        raise
+    return len(rows)
+
+
+################################################################################
+class SnapshotRegistry(Mapping):
+    """a read-only mapping of lowercase player names to PlayerRecord objects
+    decoded on demand from a memory-mapped snapshot file"""
+    ############################################################################
+    def __init__(self, filename=None):
+        self.filename = filename or c.PLAYERS_SNAPSHOT
+        with open(self.filename, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self._count, self._slots, self._recordsOffset, self._hashOffset, \
+            self._poolOffset = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError("'%s' is not a player snapshot"%(self.filename))
+        if version != VERSION:
+            raise ValueError("player snapshot '%s' has unsupported version %d"%(self.filename, version))
+        self._records   = {} # name -> PlayerRecord, for each decoded player
+        self._lookups   = threading.Lock()
+        self._index_    = None
+        self._names_    = None
+        self.lock       = ReadWriteLock() # for interchangeability with PlayerRegistry
+        self.hits       = 0
+        self.misses     = 0
+    ############################################################################
+    def __repr__(self):
+        return "<%s %d decoded of %d %s>"%(self.__class__.__name__, len(self._records), self._count, self.filename)
+    ############################################################################
+    def _string(self, offset, length):
+        if not length: return None
+        start = self._poolOffset + offset
+        return self._map[start:start + length].decode("utf-8")
+    ############################################################################
+    def _key(self, i):
+        """the lowercase name of record i"""
+        offset, length = struct.unpack_from("<II", self._map, self._recordsOffset + RECORD.size * i)
+        return self._string(offset, length).lower()
+    ############################################################################
+    def _find(self, key):
+        """the record number of the lowercase name key, or None"""
+        mask = self._slots - 1
+        slot = _hash(key) & mask
+        while True:
+            entry, = SLOT.unpack_from(self._map, self._hashOffset + SLOT.size * slot)
+            if not entry: return None
+            if self._key(entry - 1) == key: return entry - 1
+            slot = (slot + 1) & mask
+    ############################################################################
+    def _attrs(self, i):
+        """the simpleAttrs of record i"""
+        fields = RECORD.unpack_from(self._map, self._recordsOffset + RECORD.size * i)
+        attrs = {}
+        for j, key in enumerate(STRINGS):
+            value = self._string(fields[2 * j], fields[2 * j + 1])
+            if value is not None: attrs[key] = value
+        attrs["initOptions"] = json.loads(attrs["initOptions"]) if "initOptions" in attrs else {}
+        attrs["rating"], attrs["created"], lastActivity = fields[-3:]
+        attrs["lastActivity"] = None if math.isnan(lastActivity) else lastActivity
+        return attrs
+    ############################################################################
+    def __getitem__(self, name):
+        try:    player = self._records[name]
+        except KeyError: pass
+        else:
+            self.hits += 1
+            return player
+        i = self._find(name)
+        if i is None: raise KeyError(name)
+        self.misses += 1
+        player = PlayerRecord.fromTrustedDict(self._attrs(i))
+        with self._lookups: # concurrent readers keep the first
+            return self._records.setdefault(name, player)
+    ############################################################################
+    def __contains__(self, name):
+        return name in self._records or self._find(name) is not None
+    ############################################################################
+    def __iter__(self):
+        return (self._key(i) for i in range(self._count))
+    ############################################################################
+    def __len__(self):
+        return self._count
+    ############################################################################
+    def iterAttrs(self):
+        """generate (lowercase name, simpleAttrs) of every player without decoding PlayerRecords"""
+        for i in range(self._count):
+            attrs = self._attrs(i)
+            yield attrs["name"].lower(), attrs
+    ############################################################################
+    @property
+    def index(self):
+        """secondary indexes of every player's attributes, built on first use"""
+        if self._index_ is None:
+            self._index_ = PlayerIndex(self.iterAttrs())
+        return self._index_
+    ############################################################################
+    @property
+    def names(self):
+        """NameIndex of every player's name, built on first use"""
+        if self._names_ is None:
+            self._names_ = NameIndex(self)
+        return self._names_
+    ############################################################################
+    @property
+    def stats(self):
+        return CacheStats(self.hits, self.misses, 0, len(self._records), None)
+    ############################################################################
+    def isLoaded(self, name):
+        return name in self._records
+    ############################################################################
+    def storedName(self, name, scan=True):
+        i = self._find(name.lower())
+        return name if i is None else self._attrs(i)["name"]
+    ############################################################################
+    def loadAll(self, workers=None, useProcesses=True):
+        """decode every player now"""
+        for name in self:
+            self[name]
+        return self
+    ############################################################################
+    def clear(self):
+        """forget the decoded players; they are decoded again on next use"""
+        self._records = {}
+    ############################################################################
+    def refresh(self):
+        """a snapshot never changes; no changes are found"""
+        return PlayerChanges([], [], [])
+    ############################################################################
+    def setPolicy(self, maxRecords=None, maxBytes=None, pinned=None):
+        """ignored: players are decoded at most once from the shared snapshot"""
+        pass
+    ############################################################################
+    def _readOnly(self, *args, **kwargs):
+        raise TypeError("%s is read-only; change players in the storage backend and compile a new snapshot"%(self))
+    __setitem__ = __delitem__ = revalidate = noteStored = _readOnly
+    ############################################################################
+    def close(self):
+        self._map.close()
+
+
+################################################################################
+__all__ = ["SnapshotRegistry", "compileSnapshot"]
@@ -0,0 +1,581 @@
+"""
+PURPOSE: pluggable storage backends that persist PlayerRecord attributes
+
+Each backend exchanges records as plain attribute dictionaries (the same
+content produced by PlayerRecord.simpleAttrs) so that no backend depends on
+PlayerRecord itself.
+"""
+
+from __future__ import absolute_import
+from __future__ import division       # python 2/3 compatibility
+from __future__ import print_function # python 2/3 compatibility
+
+from six import iteritems, itervalues # python 2/3 compatibility
+
+import atexit
+import itertools
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from sc2players import constants as c
+from sc2players import playerCodec
+from sc2players import playerLocks
+
+
+################################################################################
+class PlayerStorage(object):
+    """the interface that each player storage backend implements"""
+    kind = None
+    _codec = None
+    ############################################################################
+    def __repr__(self):
+        return "<%s %s>"%(self.__class__.__name__, self.location)
+    ############################################################################
+    @property
+    def codec(self):
+        """the kind of encoding in which records are saved (default: PLAYERS_CODEC);
+        records are loaded whichever encoding they were saved in"""
+        return self._codec or c.PLAYERS_CODEC
+    @codec.setter
+    def codec(self, kind):
+        playerCodec.getCodec(kind) # validate
+        self._codec = kind
+    ############################################################################
+    @property
+    def location(self):
+        """where this backend's data resides"""
+        raise NotImplementedError("must be implemented by %s"%(self.__class__.__name__))
+    ############################################################################
+    @property
+    def lockFilename(self):
+        """the file locked by every process while it changes this backend's records"""
+        return self.location + ".lock"
+    ############################################################################
+    def filename(self, name):
+        """the absolute path to the file holding the named player's record"""
+        return os.path.abspath(self.location) # shared by every record unless overridden
+    ############################################################################
+    def names(self):
+        """list the names of all stored players"""
+        raise NotImplementedError("must be implemented by %s"%(self.__class__.__name__))
+    ############################################################################
+    def exists(self, name):
+        """determine whether a record with name is stored"""
+        return name in self.names()
+    ############################################################################
+    def signature(self, name):
+        """a value that changes whenever the named player's stored record changes; None if unknown"""
+        raise NotImplementedError("must be implemented by %s"%(self.__class__.__name__))
+    ############################################################################
+    def signatures(self):
+        """map the names of all stored players to their current signature"""
+        return dict((name, self.signature(name)) for name in self.names())
+    ############################################################################
+    def load(self, name):
+        """retrieve the attribute dictionary of the named player; KeyError if unknown"""
+        raise NotImplementedError("must be implemented by %s"%(self.__class__.__name__))
+    ############################################################################
+    def save(self, name, attrs):
+        """store the attribute dictionary of the named player, replacing any existing record"""
+        raise NotImplementedError("must be implemented by %s"%(self.__class__.__name__))
+    ############################################################################
+    def delete(self, name):
+        """remove the named player's record, if it exists"""
+        raise NotImplementedError("must be implemented by %s"%(self.__class__.__name__))
+    ############################################################################
+    def commit(self, saves=None, deletes=()):
+        """store every (name, attrs) of saves and remove every name of deletes
+        as one operation.  Records are always stored before any is removed."""
+        saves = saves or {}
+        for name, attrs in iteritems(saves):
+            self.save(name, attrs)
+        for name in deletes:
+            if name not in saves: self.delete(name)
+    ############################################################################
+    def iterRecords(self):
+        """generate (name, attrs) pairs for every stored player"""
+        for name in self.names():
+            yield name, self.load(name)
+    ############################################################################
+    def namesWhere(self, key, value):
+        """list the names of stored players whose attribute key equals value"""
+        return [name for name, attrs in self.iterRecords() if attrs.get(key) == value]
+    ############################################################################
+    def flush(self):
+        """write any changes this backend holds back"""
+        pass
+    ############################################################################
+    def close(self):
+        """release any resources held by this backend"""
+        pass
+
+
+################################################################################
+class JsonFolderStorage(PlayerStorage):
+    """one file per player within PLAYERS_FOLDER, pretty-printed json unless
+    another codec is selected.  Each file's suffix names its encoding; a record
+    is found whichever encoding it was saved in and replaces any file of the
+    player in another encoding."""
+    kind = c.STORAGE_JSON
+    PREFIX = "player_"
+    SUFFIXES = { # codec -> suffix of the files it encodes
+        c.CODEC_JSON    : ".json",
+        c.CODEC_BINARY  : ".sc2pr",
+    }
+    ############################################################################
+    def __init__(self, folder=None, codec=None):
+        self._folder = folder # if unspecified, PLAYERS_FOLDER is evaluated on every use
+        if codec: self.codec = codec
+    ############################################################################
+    @property
+    def location(self):
+        return self._folder or c.PLAYERS_FOLDER
+    ############################################################################
+    @property
+    def lockFilename(self):
+        return os.path.join(self.location, ".players.lock") # not listed as a player
+    ############################################################################
+    def filename(self, name, codec=None):
+        """return the absolute path to the named player's file in the codec
+        (default: this storage's) encoding"""
+        return os.path.join(self.location, "%s%s%s"%(self.PREFIX, name, self.SUFFIXES[codec or self.codec]))
+    ############################################################################
+    def _filenames(self, name):
+        """the paths the named player's file may have, this storage's encoding first"""
+        return [self.filename(name)] + [self.filename(name, codec) for codec in self.SUFFIXES if codec != self.codec]
+    ############################################################################
+    def _entries(self):
+        """generate (name, DirEntry) for each player file, once per player"""
+        try:    entries = os.scandir(self.location)
+        except OSError: return # no folder means no players
+        prefixLen, suffixes = len(self.PREFIX), tuple(itervalues(self.SUFFIXES))
+        seen = set() # a player may briefly have a file in each encoding while it is replaced
+        with entries:
+            for entry in entries:
+                if not entry.name.endswith(suffixes): continue
+                name = entry.name[:entry.name.rindex(".")]
+                if name.startswith(self.PREFIX): name = name[prefixLen:]
+                if name in seen: continue
+                seen.add(name)
+                yield name, entry
+    ############################################################################
+    def names(self):
+        return [name for name, entry in self._entries()]
+    ############################################################################
+    def exists(self, name):
+        return any(os.path.isfile(filename) for filename in self._filenames(name))
+    ############################################################################
+    def signature(self, name):
+        for filename in self._filenames(name):
+            try:    stat = os.stat(filename)
+            except OSError: continue
+            return (stat.st_mtime_ns, stat.st_size)
+        return None
+    ############################################################################
+    def signatures(self):
+        ret = {}
+        for name, entry in self._entries():
+            try:    stat = entry.stat()
+            except OSError: continue # removed while scanning
+            ret[name] = (stat.st_mtime_ns, stat.st_size)
+        return ret
+    ############################################################################
+    def load(self, name):
+        for filename in self._filenames(name):
+            try:
+                with open(filename, "rb") as f:
+                    data = f.read()
+            except (IOError, OSError): continue
+            return playerCodec.decode(data) # identified by its content rather than its suffix
+        raise KeyError(name)
+    ############################################################################
+    def iterRecords(self):
+        """generate (name, attrs) while scanning the folder rather than listing it first"""
+        for name, entry in self._entries():
+            try:    yield name, self.load(name)
+            except KeyError: continue # removed while scanning
+    ############################################################################
+    def save(self, name, attrs):
+        self.commit({name: attrs}) # readers never observe a partially written file
+    ############################################################################
+    def delete(self, name):
+        for filename in self._filenames(name):
+            try:    os.remove(filename)
+            except (IOError, OSError): pass # nothing to remove
+    ############################################################################
+    def _writeTemp(self, attrs):
+        """write a record to a new temporary file (not listed as a player) within the folder"""
+        fd, tempName = tempfile.mkstemp(prefix=".%s"%(self.PREFIX), suffix=".tmp", dir=self.location)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(playerCodec.encode(attrs, self.codec))
+        except Exception:
+            os.remove(tempName)
+            raise
+        return tempName
+    ############################################################################
+    def commit(self, saves=None, deletes=()):
+        """every record is fully written to a temporary file before any player
+        file is replaced, and each replacement is an atomic rename"""
+        saves, staged = saves or {}, []
+        if saves and not os.path.isdir(self.location):
+            os.makedirs(self.location)
+        try:
+            for name, attrs in iteritems(saves):
+                staged.append((self._writeTemp(attrs), self.filename(name)))
+        except Exception:
+            for tempName, filename in staged: os.remove(tempName)
+            raise
+        for tempName, filename in staged:
+            os.replace(tempName, filename)
+        for name in saves: # the files of a replaced encoding
+            for filename in self._filenames(name)[1:]:
+                try:    os.remove(filename)
+                except (IOError, OSError): pass
+        for name in deletes:
+            if name not in saves: self.delete(name)
+
+
+################################################################################
+class SqliteStorage(PlayerStorage):
+    """all players within a single sqlite database; frequently queried attributes are indexed columns"""
+    kind = c.STORAGE_SQLITE
+    COLUMNS = [ # (name, type) of every table column
+        ("name"         , "TEXT PRIMARY KEY"),
+        ("type"         , "TEXT"),
+        ("difficulty"   , "TEXT"),
+        ("rating"       , "INTEGER"),
+        ("created"      , "REAL"),
+        ("data"         , "TEXT NOT NULL"),
+        ("modified"     , "REAL"),
+        ("lastActivity" , "REAL"),
+    ]
+    INDEXED_COLUMNS = ["type", "difficulty", "rating", "created", "lastActivity"]
+    ############################################################################
+    def __init__(self, filename=None, codec=None):
+        self._filename = filename
+        if codec: self.codec = codec
+        self._db = None
+        self._lock = threading.RLock() # every thread shares the connection, so each use of it holds the lock
+    ############################################################################
+    @property
+    def location(self):
+        return self._filename or c.PLAYERS_DATABASE
+    ############################################################################
+    @property
+    def db(self):
+        """the database connection, opened (and its schema created) on first use"""
+        with self._lock:
+            if self._db is None: self._db = self._connect()
+            return self._db
+    ############################################################################
+    def _connect(self):
+        """a new database connection, its schema created or upgraded"""
+        folder = os.path.dirname(os.path.abspath(self.location))
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        db = sqlite3.connect(self.location, check_same_thread=False)
+        db.execute("CREATE TABLE IF NOT EXISTS players (%s)"%(
+            ", ".join("%s %s"%(col, colType) for col, colType in self.COLUMNS)))
+        existing = [row[1] for row in db.execute("PRAGMA table_info(players)")]
+        for col, colType in self.COLUMNS: # upgrade a database created by an earlier version
+            if col in existing: continue
+            db.execute("ALTER TABLE players ADD COLUMN %s %s"%(col, colType))
+        for col in self.INDEXED_COLUMNS:
+            db.execute("CREATE INDEX IF NOT EXISTS idx_players_%s "
+                "ON players (%s)"%(col, col))
+        db.commit()
+        return db
+    ############################################################################
+    def _query(self, sql, params=()):
+        """every row sql selects, fetched while holding the connection"""
+        with self._lock:
+            return self.db.execute(sql, params).fetchall()
+    ############################################################################
+    def _row(self, name, attrs):
+        """the column values stored for a single record"""
+        if self.codec == c.CODEC_JSON:  data = json.dumps(attrs, sort_keys=True) # compact text
+        else:                           data = sqlite3.Binary(playerCodec.encode(attrs, self.codec))
+        return (name, attrs.get("type"), attrs.get("difficulty"), attrs.get("rating"),
+            attrs.get("created"), data, time.time(), attrs.get("lastActivity") or attrs.get("created"))
+    ############################################################################
+    def names(self):
+        return [row[0] for row in self._query("SELECT name FROM players")]
+    ############################################################################
+    def exists(self, name):
+        return bool(self._query("SELECT 1 FROM players WHERE name=?", (name,)))
+    ############################################################################
+    def signature(self, name):
+        rows = self._query("SELECT rowid, modified FROM players WHERE name=?", (name,))
+        return tuple(rows[0]) if rows else None
+    ############################################################################
+    def signatures(self):
+        return dict((name, (rowid, modified)) for name, rowid, modified in
+            self._query("SELECT name, rowid, modified FROM players"))
+    ############################################################################
+    def load(self, name):
+        rows = self._query("SELECT data FROM players WHERE name=?", (name,))
+        if not rows: raise KeyError(name)
+        return playerCodec.decode(rows[0][0])
+    ############################################################################
+    def save(self, name, attrs):
+        self.commit({name: attrs})
+    ############################################################################
+    def delete(self, name):
+        self.commit(deletes=[name])
+    ############################################################################
+    def commit(self, saves=None, deletes=()):
+        """all changes are applied within a single transaction"""
+        saves = saves or {}
+        with self._lock, self.db:
+            self.db.executemany("INSERT OR REPLACE INTO players (%s) VALUES (%s)"%(
+                ", ".join(col for col, colType in self.COLUMNS), ", ".join("?" for col in self.COLUMNS)),
+                [self._row(name, attrs) for name, attrs in iteritems(saves)])
+            self.db.executemany("DELETE FROM players WHERE name=?",
+                [(name,) for name in deletes if name not in saves])
+    ############################################################################
+    def iterRecords(self):
+        for name, data in self._query("SELECT name, data FROM players"):
+            yield name, playerCodec.decode(data)
+    ############################################################################
+    def namesWhere(self, key, value):
+        if key not in self.INDEXED_COLUMNS: return PlayerStorage.namesWhere(self, key, value)
+        return [row[0] for row in self._query("SELECT name FROM players WHERE %s=?"%(key), (value,))]
+    ############################################################################
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+################################################################################
+class WriteBehindStorage(PlayerStorage):
+    """hold saves and deletes for another backend, coalescing repeated changes to
+    the same record, and write them together at most interval seconds later"""
+    ############################################################################
+    def __init__(self, backend, interval=None):
+        self.backend    = backend
+        self.interval   = c.WRITE_BEHIND_INTERVAL if interval is None else interval
+        self._saves     = {} # name -> attrs awaiting storage
+        self._deletes   = set() # names awaiting removal
+        self._pending   = {} # name -> signature given out for its latest held save
+        self._written   = {} # name -> (signature given out, backend signature) once its save was flushed
+        self._saveIds   = itertools.count()
+        self._timer     = None
+        self._lock      = threading.RLock()
+    ############################################################################
+    def __repr__(self):
+        return "<%s %s>"%(self.__class__.__name__, self.backend)
+    ############################################################################
+    @property
+    def kind(self):     return self.backend.kind
+    ############################################################################
+    @property
+    def location(self): return self.backend.location
+    ############################################################################
+    @property
+    def lockFilename(self): return self.backend.lockFilename
+    ############################################################################
+    def filename(self, name):   return self.backend.filename(name)
+    ############################################################################
+    @property
+    def codec(self):    return self.backend.codec
+    @codec.setter
+    def codec(self, kind):  self.backend.codec = kind
+    ############################################################################
+    @property
+    def pending(self):
+        """the number of changes awaiting a flush"""
+        return len(self._saves) + len(self._deletes)
+    ############################################################################
+    def names(self):
+        with self._lock:
+            ret = set(self.backend.names()) - self._deletes
+            ret.update(self._saves)
+        return list(ret)
+    ############################################################################
+    def exists(self, name):
+        with self._lock:
+            if name in self._saves:     return True
+            if name in self._deletes:   return False
+        return self.backend.exists(name)
+    ############################################################################
+    def namesWhere(self, key, value):
+        with self._lock:
+            ret = set(self.backend.namesWhere(key, value)) - self._deletes - set(self._saves)
+            ret.update(name for name, attrs in iteritems(self._saves) if attrs.get(key) == value)
+        return list(ret)
+    ############################################################################
+    def signature(self, name):
+        """a held save's signature is a marker that stands in for the backend's
+        until another writer changes the record"""
+        with self._lock:
+            if name in self._pending:   return self._pending[name]
+            if name in self._deletes:   return None
+            signature = self.backend.signature(name)
+            if name in self._written and self._written[name][1] == signature:
+                return self._written[name][0]
+        return signature
+    ############################################################################
+    def signatures(self):
+        with self._lock:
+            ret = self.backend.signatures()
+            for name in self._deletes:
+                ret.pop(name, None)
+            for name, (given, signature) in iteritems(self._written):
+                if ret.get(name) == signature: ret[name] = given
+            ret.update(self._pending)
+        return ret
+    ############################################################################
+    def load(self, name):
+        with self._lock:
+            if name in self._saves:     return dict(self._saves[name])
+            if name in self._deletes:   raise KeyError(name)
+        return self.backend.load(name)
+    ############################################################################
+    def save(self, name, attrs):
+        self.commit({name: attrs})
+    ############################################################################
+    def delete(self, name):
+        self.commit(deletes=[name])
+    ############################################################################
+    def commit(self, saves=None, deletes=()):
+        saves = saves or {}
+        with self._lock:
+            for name in deletes:
+                if name in saves: continue
+                self._saves.pop(name, None)
+                self._pending.pop(name, None)
+                self._written.pop(name, None)
+                self._deletes.add(name)
+            for name, attrs in iteritems(saves):
+                self._deletes.discard(name)
+                self._saves[name] = dict(attrs) # only the latest version is written
+                self._pending[name] = ("pending", next(self._saveIds))
+            if self.interval > 0 and self._timer is None and self.pending:
+                self._timer = threading.Timer(self.interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if self.interval <= 0: self.flush() # once released; see flush
+    ############################################################################
+    def flush(self):
+        """write the held changes.  The file lock is taken before this storage's
+        own lock, in the same order as writers that change players, so a flush
+        and a concurrent change never wait for each other."""
+        if self._timer is None and not self.pending: return
+        with playerLocks.fileLock(self.lockFilename), self._lock: # held back changes are written like any other
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self.pending: return
+            self.backend.commit(self._saves, self._deletes)
+            for name, given in iteritems(self._pending): # still given out by signature() until changed elsewhere
+                self._written[name] = (given, self.backend.signature(name))
+            self._saves, self._deletes, self._pending = {}, set(), {}
+    ############################################################################
+    def close(self):
+        self.flush()
+        self.backend.close()
+
+
+################################################################################
+BACKENDS = {
+    c.STORAGE_JSON      : JsonFolderStorage,
+    c.STORAGE_SQLITE    : SqliteStorage,
+}
+activeStorage = None # the backend used by PlayerRecord and playerManagement
+
+
+################################################################################
+def openStorage(kind, location=None):
+    """create a new storage backend of the given kind"""
+    try:    backend = BACKENDS[kind]
+    except KeyError:
+        raise ValueError("unknown player storage '%s'.  Allowed: %s"%(kind, list(BACKENDS)))
+    return backend(location)
+
+
+################################################################################
+def getStorage():
+    """the storage backend currently in use"""
+    global activeStorage
+    if activeStorage is None:
+        activeStorage = openStorage(c.PLAYERS_STORAGE)
+    return activeStorage
+
+
+################################################################################
+def setStorage(storage, location=None):
+    """select the backend to use; storage is either a backend kind or a PlayerStorage"""
+    global activeStorage
+    if not isinstance(storage, PlayerStorage):
+        storage = openStorage(storage, location)
+    if activeStorage is not None and activeStorage is not storage:
+        if isinstance(activeStorage, WriteBehindStorage) and activeStorage.backend is storage:
+            activeStorage.flush() # keep the backend open
+        else: activeStorage.close()
+    activeStorage = storage
+    return storage
+
+
+################################################################################
+def setWriteBehind(interval=None):
+    """hold back saves to the active backend and write them at most interval
+    seconds later (default: WRITE_BEHIND_INTERVAL).  A False interval flushes
+    all held changes and resumes writing immediately."""
+    storage = getStorage()
+    if isinstance(storage, WriteBehindStorage):
+        storage.flush()
+        storage = storage.backend
+    if interval is not False:
+        storage = WriteBehindStorage(storage, interval)
+    return setStorage(storage)
+
+
+################################################################################
+def _flushAtExit():
+    if activeStorage is not None: activeStorage.flush()
+atexit.register(_flushAtExit)
+
+
+################################################################################
+def convertStorage(storage, codec, batchSize=c.BATCH_SIZE):
+    """save records in the codec kind of encoding from now on and rewrite every
+    stored record in it, batchSize records at a time; return the number rewritten"""
+    storage.codec = codec
+    storage.flush()
+    names, count = storage.names(), 0 # listed first; records are replaced while converting
+    for first in range(0, len(names), batchSize):
+        saves = {}
+        for name in names[first : first + batchSize]:
+            try:    saves[name] = storage.load(name)
+            except KeyError: continue # removed meanwhile
+        storage.commit(saves)
+        count += len(saves)
+    return count
+
+
+################################################################################
+def migrateStorage(source, destination, batchSize=c.BATCH_SIZE):
+    """copy every player record from the source backend into the destination
+    backend, batchSize records at a time; return the number copied"""
+    saves, count = {}, 0
+    for name, attrs in source.iterRecords():
+        name = attrs.get("name", name).lower() # the record's own name takes precedence; all names are lowercase
+        saves[name] = dict(attrs, name=name) # the json layout allows the filename to provide the name
+        if len(saves) >= batchSize:
+            destination.commit(saves)
+            count += len(saves)
+            saves = {}
+    if saves: destination.commit(saves)
+    return count + len(saves)
+
+
+################################################################################
+__all__ = ["PlayerStorage", "JsonFolderStorage", "SqliteStorage", "WriteBehindStorage",
+           "openStorage", "getStorage", "setStorage", "setWriteBehind", "convertStorage", "migrateStorage"]
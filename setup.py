@@ -17,7 +17,7 @@ DESCRIPTION = "A suystem of managing Starcraft 2 player profiles."
 URL = "https://github.com/ttinies/sc2players"
 EMAIL = "help.fool@versentiedge.com"
 AUTHOR = "Versentiedge LLC"
-REQUIRES_PYTHON = ">3.4"
+REQUIRES_PYTHON = ">=3.7"
 VERSION = None
 
 # What packages are required for this module to be executed?
@@ -110,7 +110,8 @@ setup(
         "License :: OSI Approved :: Apache Software License",
         "Programming Language :: Python",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.6",
+        "Programming Language :: Python :: 3.7",
+        "Programming Language :: Python :: 3.8",
         "Programming Language :: Python :: Implementation :: CPython",
         "Programming Language :: Python :: Implementation :: PyPy",
         "Topic :: Games/Entertainment :: Real Time Strategy",
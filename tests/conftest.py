@@ -0,0 +1,24 @@
+
+import os
+import shutil
+
+import pytest
+
+from sc2players import constants as c
+from sc2players import playerManagement
+from sc2players import playerStorage
+from sc2players.playerRegistry import PlayerRegistry
+
+
+@pytest.fixture
+def playersFolder(tmp_path, monkeypatch):
+    """operate on a private copy of the packaged player records"""
+    folder = str(tmp_path / "dataPlayers")
+    shutil.copytree(c.PLAYERS_FOLDER, folder)
+    monkeypatch.setattr(c, "PLAYERS_FOLDER", folder)
+    monkeypatch.setattr(c, "PLAYERS_DATABASE", os.path.join(folder, "players.sqlite"))
+    monkeypatch.setattr(playerStorage, "activeStorage", None)
+    monkeypatch.setattr(playerManagement, "playerCache", PlayerRegistry())
+    yield folder
+    playerStorage.setStorage(c.STORAGE_JSON).close()
+    playerStorage.activeStorage = None
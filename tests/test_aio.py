@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+import pytest
+
+from sc2players import aio
+from sc2players import playerStorage
+
+
+@pytest.fixture
+def loads(playersFolder, monkeypatch):
+    """count (slowed) loads of each stored player"""
+    counts = {}
+    load = playerStorage.JsonFolderStorage.load
+    def slowLoad(self, name):
+        counts[name] = counts.get(name, 0) + 1
+        time.sleep(0.05)
+        return load(self, name)
+    monkeypatch.setattr(playerStorage.JsonFolderStorage, "load", slowLoad)
+    yield counts
+    aio.shutdown()
+
+
+def test_concurrent_loads_are_coalesced(loads):
+    async def lookups():
+        return await asyncio.gather(*([aio.getPlayer("test") for i in range(50)] +
+                                      [aio.getPlayer("TEST"), aio.getPlayer("defaulthuman")]))
+    players = asyncio.run(lookups())
+    assert loads == {"test": 1, "defaulthuman": 1}
+    assert all(p is players[0] for p in players[:51])
+    assert asyncio.run(aio.getPlayer("test")) is players[0] # already loaded
+    with pytest.raises(ValueError):
+        asyncio.run(aio.getPlayer("unknown"))
+
+
+def test_writes_to_a_record_are_serialized(loads):
+    active, overlapped = set(), []
+    update = aio.playerManagement.updatePlayers
+    def slowUpdate(updates):
+        name = updates[0][0]
+        if name in active: overlapped.append(name)
+        active.add(name)
+        time.sleep(0.01)
+        try:    return update(updates)
+        finally: active.discard(name)
+    aio.playerManagement.updatePlayers, restore = slowUpdate, update
+    async def updates():
+        return await asyncio.gather(*[aio.updatePlayer("test", {"rating": rating})
+                                      for rating in range(600, 620)])
+    try:    asyncio.run(updates())
+    finally: aio.playerManagement.updatePlayers = restore
+    assert not overlapped
+    assert asyncio.run(aio.getPlayer("test")).rating == 619 # applied in the order requested
+
+
+def test_add_and_delete(loads):
+    async def changes():
+        await aio.addPlayer({"name": "newplayer", "type": "human"})
+        known = await aio.getKnownPlayers()
+        assert "newplayer" in known
+        await aio.delPlayer("newplayer")
+        return "newplayer" in known
+    assert not asyncio.run(changes())
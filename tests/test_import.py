@@ -1,8 +1,50 @@
+import os
+import subprocess
+import sys
 
 import sc2players
 
 
+IMPORT_BUDGET   = 0.05 # seconds that importing the package may take
+HELP_BUDGET     = 0.10 # seconds of imports that the command-line --help may take
+DEFERRED        = ["sc2common", "sc2players.playerManagement", "sc2players.playerRecord", "six"]
+
+
+def importTimes(module, *args):
+    """module -> cumulative seconds spent importing each module by python -X importtime
+    args, from the run of 3 that imported module fastest"""
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(sc2players.__file__))))
+    best = None
+    for attempt in range(3):
+        process = subprocess.run([sys.executable, "-X", "importtime"] + list(args),
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=env, universal_newlines=True, check=True)
+        times = {}
+        for line in process.stderr.splitlines():
+            if not line.startswith("import time:") or "[us]" in line: continue
+            selfTime, cumulative, name = line[len("import time:"):].split("|")
+            times[name.strip()] = int(cumulative) / 1e6
+        if best is None or times[module] < best[module]: best = times
+    return best
+
+
 def test_import():
     print(bool(sc2players))
     assert True
 
+
+def test_lazy_attributes():
+    assert "addPlayers" in dir(sc2players) and "addPlayers" in sc2players.__all__
+    assert sc2players.getPlayer is sc2players.playerManagement.getPlayer
+    assert sc2players.playerLadder.__name__ == "sc2players.playerLadder"
+
+
+def test_import_time():
+    times = importTimes("sc2players", "-c", "import sc2players")
+    assert times["sc2players"] < IMPORT_BUDGET
+    assert not [module for module in DEFERRED if module in times]
+
+
+def test_help_import_time():
+    times = importTimes("sc2players.cli", "-m", "sc2players", "--help")
+    assert times["sc2players.cli"] < HELP_BUDGET
+    assert not [module for module in DEFERRED if module in times]
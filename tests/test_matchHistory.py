@@ -0,0 +1,68 @@
+
+import pytest
+
+from sc2players import constants as c
+from sc2players import matchHistory
+from sc2players.matchHistory import MatchHistory
+import sc2players
+
+
+def _history(numpy):
+    history = MatchHistory("someone")
+    for i in range(100):
+        history.append(1000.0 + i, "opp%d"%(i % 3), race=[c.ZERG, c.TERRAN][i % 2],
+            duration=600 + i, apm=100 + i)
+    return history
+
+
+@pytest.fixture(params=[True, False], ids=["numpy", "python"])
+def history(request, monkeypatch):
+    if not request.param:
+        monkeypatch.setattr(matchHistory, "np", None)
+    elif matchHistory.np is None:
+        pytest.skip("numpy is not installed")
+    return _history(request.param)
+
+
+def test_select(history):
+    assert len(history.select()) == 100
+    assert list(history.select(race=c.ZERG))[:3] == [0, 2, 4]
+    assert len(history.select(opponent="opp1", race="terran")) == 17
+    assert list(history.select(apm=(195, None))) == [95, 96, 97, 98, 99]
+    with pytest.raises(ValueError):
+        history.select(map="abyssal reef")
+
+
+def test_recent_and_apm(history):
+    assert list(history.recent(3)) == [99, 98, 97]
+    assert list(history.recent(2, race=c.ZERG)) == [98, 96]
+    assert list(history.recent(3, apm=(None, 101))) == [1, 0] # fewer than asked for, beyond the first windows
+    assert list(history.recent(40, opponent="opp1")) == list(history.select(opponent="opp1"))[::-1][:40]
+    assert list(MatchHistory("nobody").recent(3, race=c.ZERG)) == []
+    assert history.apmMean(history.recent(3)) == 198
+    assert history.apmMean(history.select()) == 149.5
+
+
+def test_player_matches(playersFolder):
+    player = sc2players.getPlayer("test")
+    assert not player.matches and player.apmAggregate() == 0
+    for i in range(20):
+        player.addMatch(2e9 + i, "blizzbot5_hard", race=c.PROTOSS, duration=700, apm=50 + i)
+    assert player.lastActivity == 2e9 + 19 and player.hasPlayed
+    player.save()
+    reloaded = sc2players.getKnownPlayers(reset=True)["test"]
+    assert len(reloaded.matches) == 20
+    assert [m.apm() for m in reloaded.recentMatches(maxMatches=2)] == [69, 68]
+    assert reloaded.apmRecent(maxMatches=4) == 67.5
+    assert len(reloaded.matchSubset(opponent="blizzbot")) == 20
+    sc2players.delPlayer("test")
+    assert len(MatchHistory.load("test")) == 0
+
+
+def test_time_order(history):
+    history.append(1050.5, "late", race=c.ZERG, apm=1)
+    history.append(5.0, "ancient", race=c.ZERG, apm=2)
+    times = list(history.endTime)
+    assert times == sorted(times)
+    assert history[52].opponent == "late" and history[0].opponent == "ancient"
+    assert [history[i].opponent for i in history.recent(1, apm=(None, 10))] == ["late"]
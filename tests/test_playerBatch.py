@@ -0,0 +1,69 @@
+import io
+import json
+
+import pytest
+
+from sc2players import playerBatch
+from sc2players import playerManagement
+from sc2players import playerStorage
+import sc2players
+
+
+@pytest.fixture
+def local(monkeypatch):
+    monkeypatch.setattr(playerManagement, "_useDaemon", False)
+
+
+def test_parseLine():
+    assert playerBatch.parseLine("  # comment") is None
+    assert playerBatch.parseLine("") is None
+    request = playerBatch.parseLine("update test rating=7 'raceDefault=zerg'", 3)
+    assert request == (3, "update", "test", {"rating": "7", "raceDefault": "zerg"}, False)
+    request = playerBatch.parseLine('{"op": "add", "name": "x", "settings": {"type": "bot"}}')
+    assert request.settings == {"name": "x", "type": "bot"} and request.isJson
+    assert playerBatch.parseLine('{"op": "stale", "days": "2"}').target == 2.0
+    for text in ["fly test", "get", "add oops name=x", "rm a b", "[1]", '{"op": "get"}', '{"op": "stale", "days": [1]}',
+            '{"op": "get", "name": 5}']:
+        with pytest.raises(ValueError):
+            playerBatch.parseLine(text)
+
+
+def test_runBatch(playersFolder, local, monkeypatch):
+    calls = []
+    addPlayers = playerManagement.addPlayers
+    monkeypatch.setitem(playerBatch.WRITES, "add", lambda settings: calls.append(len(settings)) or addPlayers(settings))
+    script = ["add name=bulk%d type=human"%i for i in range(5)] + [
+        "add name=bad created=1",
+        "add name=bulk5 type=human",
+        "get bulk3",
+        "bogus",
+        '{"op": "update", "name": "bulk1", "settings": {"rating": 11}}',
+        "update missing rating=1",
+        "update bulk2 rating=12",
+        "rm bulk4",
+        "get bulk4",
+    ]
+    results = list(playerBatch.runBatch(script, batchSize=4))
+    assert [r.line for r in results] == list(range(1, len(script) + 1))
+    assert [r.error is None for r in results] == [True] * 5 + [False, True, True, False, True, False, True, True, False]
+    assert calls[:2] == [4, 3] # the second batch failed and was retried one at a time
+    assert [p.name for p in results[7].players] == ["bulk3"]
+    assert sc2players.getPlayer("bulk1").rating == 11
+    assert playerStorage.getStorage().load("bulk2")["rating"] == 12
+    assert not playerStorage.getStorage().exists("bad")
+    assert not playerStorage.getStorage().exists("bulk4")
+    assert playerStorage.getStorage().exists("bulk5")
+
+
+def test_runScript(playersFolder, local):
+    stream = io.StringIO(u'get test\n{"op": "get", "name": "nobody"}\n\n{"op": "stale", "days": 100000}\n'
+        u'{"op": "stale", "days": [1]}\n')
+    output = io.StringIO()
+    assert playerBatch.runScript(stream, output) == 2
+    lines = output.getvalue().splitlines()
+    assert lines[0].startswith("1 get: ") and "test" in lines[0]
+    failed = json.loads(lines[1])
+    assert failed["line"] == 2 and not failed["ok"] and "nobody" in failed["error"]
+    stale = json.loads(lines[2])
+    assert stale["line"] == 4 and stale["ok"] and all("name" in attrs for attrs in stale["players"])
+    assert json.loads(lines[3])["line"] == 5 and not json.loads(lines[3])["ok"] # reported, not raised
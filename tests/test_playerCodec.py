@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from sc2players import constants as c
+from sc2players import playerCodec
+from sc2players import playerStorage
+import sc2players
+
+
+RECORDS = [
+    {"name": "test", "type": "human", "initCmd": "", "initOptions": {}, "raceDefault": "random",
+        "rating": 500, "created": 1527480750.078507, "lastActivity": None},
+    {"name": "blizzbot5_hard", "type": "computer", "difficulty": "hard", "initOptions": {"raw": True, "n": [1, 2]},
+        "rating": -7, "created": 1.5, "lastActivity": 2.5},
+    {"name": u"über bot", "rating": "1200", "created": 3, "custom": {"a": None}, "difficulty": None},
+    {},
+]
+
+
+@pytest.mark.parametrize("attrs", RECORDS)
+def test_round_trip(attrs):
+    for kind in c.CODEC_KINDS:
+        data = playerCodec.encode(attrs, kind)
+        assert playerCodec.isBinary(data) == (kind == c.CODEC_BINARY)
+        assert playerCodec.decode(data) == attrs
+    assert playerCodec.decode(playerCodec.encode(attrs, c.CODEC_JSON).decode("utf-8")) == attrs # text, as in sqlite
+
+
+def test_binary_is_compact():
+    assert len(playerCodec.encode(RECORDS[1], c.CODEC_BINARY)) < len(playerCodec.encode(RECORDS[1], c.CODEC_JSON)) / 2
+
+
+def test_invalid():
+    data = playerCodec.encode(RECORDS[0], c.CODEC_BINARY)
+    for bad in [data[:20], data[:-3], data[:-8], data[:5] + b"\x09" + data[6:]]:
+        with pytest.raises(ValueError):
+            playerCodec.decode(bad)
+    with pytest.raises(ValueError):
+        playerCodec.getCodec("xml")
+    with pytest.raises(ValueError):
+        playerStorage.JsonFolderStorage(codec="xml")
+
+
+@pytest.mark.parametrize("kind", [c.STORAGE_JSON, c.STORAGE_SQLITE])
+def test_convert(playersFolder, kind):
+    storage = playerStorage.setStorage(kind)
+    if kind == c.STORAGE_SQLITE: playerStorage.migrateStorage(playerStorage.JsonFolderStorage(), storage)
+    before = dict(storage.iterRecords())
+    assert sc2players.convertPlayers(c.CODEC_BINARY) == len(before)
+    assert storage.codec == c.CODEC_BINARY
+    assert dict(storage.iterRecords()) == before
+    if kind == c.STORAGE_JSON:
+        with open(storage.filename("test"), "rb") as f:
+            assert playerCodec.isBinary(f.read())
+        assert storage.filename("test").endswith(".sc2pr") # the json file was replaced
+        assert not os.path.exists(storage.filename("test", c.CODEC_JSON))
+    sc2players.updatePlayer("test", {"rating": 3})
+    assert storage.load("test")["rating"] == 3
+    assert len(sc2players.getKnownPlayers(reset=True).loadAll()) == len(before) # also by worker processes
+    assert sc2players.convertPlayers(c.CODEC_JSON) == len(before)
+    if kind == c.STORAGE_JSON:
+        with open(storage.filename("test"), "rb") as f:
+            assert f.read().startswith(b"{")
+        assert not os.path.exists(storage.filename("test", c.CODEC_BINARY))
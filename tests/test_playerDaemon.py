@@ -0,0 +1,116 @@
+
+import multiprocessing
+import os
+import shutil
+import socket
+import tempfile
+import time
+
+import pytest
+
+from sc2players import constants as c
+from sc2players import playerDaemon
+from sc2players import playerManagement
+from sc2players import playerStorage
+import sc2players
+
+
+def serve(path):
+    server = playerDaemon.PlayerServer(path, refresh=0)
+    server.serve_forever(poll_interval=0.05)
+
+
+def serveSlowly(path):
+    remove = playerDaemon.OPERATIONS["remove"]
+    playerDaemon.OPERATIONS["remove"] = lambda names: (remove(names), time.sleep(2))[0] # answered after the client gives up
+    serve(path)
+
+
+def startDaemon(path, target=serve):
+    process = multiprocessing.get_context("fork").Process(target=target, args=(path,))
+    process.start()
+    for i in range(100):
+        if playerDaemon.PlayerClient.reachable(path): break
+        time.sleep(0.05)
+    return process
+
+
+@pytest.fixture
+def socketPath(playersFolder, monkeypatch):
+    folder = tempfile.mkdtemp() # unix socket paths must be short
+    path = os.path.join(folder, "players.sock")
+    monkeypatch.setattr(c, "PLAYERS_SOCKET", path)
+    monkeypatch.setattr(playerManagement, "_daemons", {})
+    monkeypatch.setattr(playerManagement, "_useDaemon", True)
+    yield path
+    playerManagement.useDaemon(False)
+    shutil.rmtree(folder)
+
+
+@pytest.fixture
+def daemon(socketPath):
+    process = startDaemon(socketPath)
+    yield process
+    process.terminate()
+    process.join()
+
+
+def test_requests_are_answered_by_the_daemon(daemon):
+    client = playerManagement._daemon()
+    assert client.call("ping") == daemon.pid
+    player = sc2players.getPlayer("test")
+    assert player.rating == 500 and not playerManagement.playerCache.isLoaded("test")
+    assert len(sc2players.listPlayers()) == 14
+    assert [p.name for p in sc2players.queryPlayers(type="computer", rating=(594, None))] == ["blizzbotx_cheat3"]
+    assert [p.name for p in sc2players.findPlayers("tset")] == ["test"]
+    sc2players.addPlayer({"name": "remote", "type": "human"})
+    assert sc2players.updatePlayer("remote", {"rating": 900}).rating == 900
+    assert sc2players.getPlayer("remote").rating == 900
+    assert os.path.isfile(os.path.join(c.PLAYERS_FOLDER, "player_remote.json")) # stored by the daemon
+    assert sc2players.updatePlayer("remote", {"type": c.PlayerDesigns(c.BOT), "initCmd": "x.y"}).isBot # sent by name
+    assert not playerManagement.playerCache.isLoaded("remote")
+    sc2players.delPlayer("remote")
+    with pytest.raises(ValueError): # errors are raised by the client
+        sc2players.getPlayer("remote")
+
+
+def test_fallback_when_the_daemon_stops(daemon):
+    assert sc2players.getPlayer("test").rating == 500
+    daemon.terminate()
+    daemon.join()
+    assert sc2players.getPlayer("test").rating == 500 # performed locally instead
+    assert playerManagement.playerCache.isLoaded("test")
+
+
+def test_requests_that_time_out_are_not_repeated(socketPath, monkeypatch):
+    monkeypatch.setattr(c, "DAEMON_TIMEOUT", 0.5)
+    daemon = startDaemon(socketPath, serveSlowly)
+    try:
+        sc2players.addPlayer({"name": "slow", "type": "human"})
+        with pytest.raises(OSError): # performed by the daemon, but not answered in time
+            sc2players.delPlayer("slow")
+        assert not playerStorage.getStorage().exists("slow")
+        with pytest.raises(ValueError): # later requests are performed locally
+            sc2players.getPlayer("slow")
+    finally:
+        daemon.terminate()
+        daemon.join()
+
+
+@pytest.mark.parametrize("frame", [
+    playerDaemon.FRAME.pack(5) + b"{oops", # not json
+    playerDaemon.FRAME.pack(playerDaemon.MAX_FRAME + 1), # too large
+])
+def test_malformed_requests_are_refused(daemon, socketPath, frame):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(5)
+    sock.connect(socketPath)
+    try:
+        sock.sendall(frame)
+        response = playerDaemon.receiveFrame(sock)
+        assert not response["ok"] and response["error"] == "ValueError"
+        with pytest.raises(EOFError): # closed by the daemon
+            playerDaemon.receiveFrame(sock)
+    finally:
+        sock.close()
+    assert playerDaemon.PlayerClient(socketPath).call("ping") == daemon.pid # still serving others
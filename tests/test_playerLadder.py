@@ -0,0 +1,36 @@
+
+import pytest
+
+from sc2players.playerLadder import RatingLadder
+import sc2players
+
+
+def test_order_statistics():
+    ladder = RatingLadder(low=0, high=3000)
+    for i, rating in enumerate([1000, 1500, 1500, 800, 2200, 5000]):
+        ladder.add("p%d"%i, rating)
+    assert ladder.rankOf("p5") == 1 # beyond the ladder's highest rating
+    assert ladder.rankOf("p1") == ladder.rankOf("p2") == 3
+    assert ladder.rankOf("p3") == 6
+    assert ladder.percentileOf("p0") == pytest.approx(100.0 / 6)
+    assert ladder.topN(3) == [("p5", 5000), ("p4", 2200), ("p1", 1500)]
+    assert ladder.playersInRange(900, 1500) == ["p0", "p1", "p2"]
+    assert ladder.countInRange(900, 1500) == 3
+    ladder.setRating("p3", 2500)
+    assert ladder.rankOf("p3") == 2 and ladder.rankOf("p0") == 6
+    ladder.remove("p5")
+    assert len(ladder) == 5 and ladder.rankOf("p3") == 1
+    with pytest.raises(ValueError):
+        ladder.rankOf("p5")
+
+
+def test_registry_ladder(playersFolder):
+    ladder = sc2players.getLadder()
+    assert len(ladder) == 14
+    assert ladder.topN(1) == [("blizzbotx_cheat3", 594)]
+    sc2players.updatePlayer("test", {"rating": 900})
+    assert ladder.rankOf("test") == 1
+    sc2players.getPlayer("test").rating = 10 # re-rating a record also re-ranks it
+    assert ladder.rankOf("test") == 13 # only mapexplorer (rated 0) is lower
+    sc2players.delPlayer("test")
+    assert "test" not in ladder
@@ -0,0 +1,85 @@
+
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+from sc2players import constants as c
+from sc2players import playerManagement
+from sc2players import playerStorage
+from sc2players.playerLocks import ReadWriteLock, fileLock
+from sc2players.playerRegistry import PlayerRegistry
+import sc2players
+
+
+def test_readers_share_and_writers_exclude():
+    lock = ReadWriteLock()
+    bothReading = threading.Barrier(2, timeout=5)
+    def reader():
+        with lock.reading():
+            bothReading.wait() # deadlocks unless both readers hold the lock together
+    threads = [threading.Thread(target=reader) for i in range(2)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    events = []
+    def writer():
+        with lock.writing():
+            events.append("write")
+    with lock.reading():
+        t = threading.Thread(target=writer)
+        t.start()
+        time.sleep(0.05)
+        events.append("read") # the writer waits for this reader
+    t.join()
+    assert events == ["read", "write"]
+    with lock.writing():
+        with lock.writing(), lock.reading(): pass # re-entrant while writing
+    with lock.reading():
+        with pytest.raises(RuntimeError):
+            lock.acquireWrite()
+
+
+def increment(times):
+    for i in range(times):
+        sc2players.modifyPlayer("test", lambda player: {"rating": player.rating + 1})
+
+
+def hammer(folder, threads, times):
+    """increment the shared record and read others from many threads of a new process"""
+    c.PLAYERS_FOLDER = folder
+    playerStorage.activeStorage = None
+    playerManagement.playerCache = PlayerRegistry()
+    workers = [threading.Thread(target=increment, args=(times,)) for i in range(threads)]
+    workers += [threading.Thread(target=lambda: [sc2players.getPlayer("defaulthuman") for i in range(times)])]
+    for t in workers: t.start()
+    for t in workers: t.join()
+
+
+def test_no_lost_updates_across_threads_and_processes(playersFolder):
+    start = sc2players.getPlayer("test").rating
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=hammer, args=(playersFolder, 4, 10)) for i in range(3)]
+    for p in processes: p.start()
+    increment(10) # this process also takes part
+    for p in processes: p.join(timeout=60)
+    assert [p.exitcode for p in processes] == [0, 0, 0]
+    assert sc2players.modifyPlayer("test", lambda player: {}).rating == start + 3 * 4 * 10 + 10
+    assert not [f for f in os.listdir(playersFolder) if f.endswith(".tmp")]
+
+
+def test_changes_by_another_process_are_adopted(playersFolder):
+    player = sc2players.getPlayer("test")
+    storage = playerStorage.getStorage()
+    attrs = storage.load("test")
+    attrs["raceDefault"] = c.ZERG
+    storage.save("test", attrs) # as if by another process
+    sc2players.updatePlayer("test", {"rating": 700})
+    assert player.raceDefault == c.ZERG and player.rating == 700
+    assert storage.load("test")["raceDefault"] == c.ZERG # not overwritten with stale data
+    storage.delete("defaulthuman")
+    with pytest.raises(ValueError):
+        sc2players.updatePlayer("defaulthuman", {"rating": 1})
+    with fileLock(storage.lockFilename): # re-entrant within a process
+        sc2players.addPlayer({"name": "locked", "type": "human"})
@@ -0,0 +1,118 @@
+
+import io
+import json
+import os
+import time
+
+import pytest
+
+from sc2players import constants as c
+from sc2players import playerStorage
+import sc2players
+
+
+@pytest.mark.parametrize("kind", [c.STORAGE_JSON, c.STORAGE_SQLITE])
+def test_batch_operations(playersFolder, kind):
+    playerStorage.setStorage(kind)
+    added = sc2players.addPlayers([{"name": "bulk%d"%i, "type": "human"} for i in range(20)])
+    assert len(added) == 20
+    assert set(playerStorage.getStorage().names()) >= set("bulk%d"%i for i in range(20))
+    sc2players.updatePlayers(dict(("bulk%d"%i, {"rating": i}) for i in range(20)))
+    assert playerStorage.getStorage().load("bulk7")["rating"] == 7
+    sc2players.updatePlayer("bulk0", {"name": "renamed"})
+    assert not playerStorage.getStorage().exists("bulk0")
+    assert sc2players.getPlayer("renamed").rating == 0
+    sc2players.delPlayers(["bulk%d"%i for i in range(1, 20)] + ["renamed"])
+    assert not [n for n in playerStorage.getStorage().names() if n.startswith("bulk")]
+
+
+def test_batch_validated_first(playersFolder):
+    with pytest.raises(ValueError):
+        sc2players.updatePlayers([("test", {"rating": 1}), ("blizzbot5_hard", {"bogus": 1})])
+    assert sc2players.getPlayer("test").rating == 500
+    with pytest.raises(ValueError):
+        sc2players.addPlayers([{"name": "fine"}, {"name": "bad", "created": 1}])
+    assert not playerStorage.getStorage().exists("fine")
+    assert not [f for f in os.listdir(playersFolder) if f.endswith(".tmp")]
+
+
+def test_queryPlayers(playersFolder):
+    bots = sc2players.getBlizzBotPlayers()
+    assert len(bots) == 10 and all(p.isComputer for p in bots.values())
+    assert [p.name for p in sc2players.queryPlayers(difficulty="hard")] == ["blizzbot5_hard"]
+    sc2players.addPlayers([
+        {"name": "zergling", "type": "human", "raceDefault": "zerg", "rating": 900},
+        {"name": "hydra", "type": "bot", "initCmd": "x.y", "raceDefault": "zerg", "rating": 1500},
+    ])
+    assert [p.name for p in sc2players.queryPlayers(raceDefault="zerg")] == ["hydra", "zergling"]
+    assert [p.name for p in sc2players.queryPlayers(rating=(800, None))] == ["zergling", "hydra"]
+    assert [p.name for p in sc2players.queryPlayers(type=[c.AI, c.BOT], raceDefault="zerg")] == ["hydra"]
+    sc2players.updatePlayer("zergling", {"raceDefault": "terran", "rating": 100})
+    assert [p.name for p in sc2players.queryPlayers(raceDefault="zerg")] == ["hydra"]
+    assert [p.name for p in sc2players.queryPlayers(rating=100)] == ["zergling"]
+    sc2players.delPlayer("hydra")
+    assert sc2players.queryPlayers(raceDefault="zerg", type="bot") == []
+    with pytest.raises(ValueError):
+        sc2players.queryPlayers(initCmd="x.y")
+
+
+def test_ratings_beyond_the_ladder(playersFolder):
+    sc2players.addPlayers([{"name": "negative", "rating": -50}, {"name": "huge", "rating": 15000}])
+    sc2players.updatePlayer("mapexplorer", {"rating": 0})
+    query = lambda rating: [p.name for p in sc2players.queryPlayers(rating=rating)]
+    assert query((-100, -1)) == ["negative"]
+    assert query((0, 0)) == ["mapexplorer"]
+    assert query(12000) == [] and query(15000) == ["huge"] and query(10000) == []
+    ladder = sc2players.getLadder()
+    assert ladder.topN(1) == [("huge", 15000)] and ladder.rankOf("negative") == 16
+    assert ladder.countInRange(None, -1) == 1 and ladder.countInRange(10001, None) == 1
+
+
+def test_stale_records(playersFolder):
+    now = time.time()
+    day = 24 * 60 * 60
+    sc2players.addPlayers([{"name": "fresh", "type": "human"}])
+    sc2players.getPlayer("fresh") # loaded record is used for its activity
+    storage = playerStorage.getStorage()
+    storage.save("veteran", {"name": "veteran", "type": "human", "created": now - 400 * day,
+        "lastActivity": now - 5 * day})
+    storage.save("retired", {"name": "retired", "type": "human", "created": now - 400 * day,
+        "lastActivity": now - 200 * day})
+    sc2players.refreshKnownPlayers()
+    stale = [p.name for p in sc2players.getStaleRecords(limit=90)]
+    assert "retired" in stale and "test" in stale # packaged players never played a match
+    assert "veteran" not in stale and "fresh" not in stale
+    removed = sc2players.removeStaleRecords(limit=90)
+    assert sorted(p.name for p in removed) == sorted(stale)
+    assert sorted(n.lower() for n in storage.names()) == ["fresh", "veteran"]
+    assert sorted(sc2players.getKnownPlayers()) == ["fresh", "veteran"]
+
+
+@pytest.mark.parametrize("kind", [c.STORAGE_JSON, c.STORAGE_SQLITE])
+def test_export_import(playersFolder, kind):
+    stream = io.StringIO()
+    count = sc2players.exportPlayers(stream)
+    lines = stream.getvalue().splitlines()
+    assert count == len(lines) == len(sc2players.getKnownPlayers())
+    assert sorted(json.loads(line)["name"].lower() for line in lines) == sorted(sc2players.getKnownPlayers())
+    assert [attrs["name"] for attrs in sc2players.iterPlayers()] == [json.loads(line)["name"] for line in lines]
+    playerStorage.setStorage(kind, os.path.join(playersFolder, "imported"))
+    cache = sc2players.getKnownPlayers(reset=True)
+    assert list(cache.names.containing("tes")) == [] and len(cache.index) == 0 # indexed before the import
+    stream = io.StringIO(stream.getvalue().replace('"rating":500', '"rating":501') + "\n")
+    assert sc2players.importPlayers(stream, batchSize=3) == count
+    assert cache.stats.records == 0 # imported players aren't held in memory
+    assert "test" in cache.names.containing("tes")
+    assert sorted(cache) == sorted(json.loads(line)["name"].lower() for line in lines)
+    assert sc2players.getPlayer("test").rating == 501
+    assert "test" in [p.name for p in sc2players.queryPlayers(rating=501)]
+    assert sc2players.queryPlayers(rating=500) == []
+
+
+def test_import_invalid(playersFolder):
+    lines = ['{"name": "first%d"}'%i for i in range(3)] + ['{"name": "late"}', '{"bogus": 1}', "{oops"]
+    with pytest.raises(c.InvalidPlayerRecordsException) as error:
+        sc2players.importPlayers(io.StringIO(u"\n".join(lines)), batchSize=3)
+    assert [line for line, reason in error.value.errors] == ["line 5", "line 6"]
+    storage = playerStorage.getStorage()
+    assert storage.exists("first2") and not storage.exists("late") # earlier chunks are stored
@@ -0,0 +1,58 @@
+
+import pytest
+
+from sc2players import constants as c
+from sc2players.playerMatchmaking import MatchmakingQueue
+from sc2players.playerPreGame import PlayerPreGame
+import sc2players
+
+
+def queuedPlayers(ratings):
+    return [sc2players.buildPlayer("p%d"%i, c.HUMAN, rating=rating) for i, rating in enumerate(ratings)]
+
+
+def test_pairs_nearest_ratings():
+    queue = MatchmakingQueue(maxSpread=100)
+    queue.enqueueMany(queuedPlayers([1000, 2000, 1040, 1500, 1990, 3000]))
+    queue.enqueue(sc2players.buildPlayer("late", c.HUMAN, rating=1520), c.ZERG)
+    assert len(queue) == 7
+    lobbies = queue.makeLobbies()
+    pairs = [sorted(p.name for p in lobby.players) for lobby in lobbies]
+    assert pairs == [["p0", "p2"], ["late", "p3"], ["p1", "p4"]]
+    assert [lobby.spread for lobby in lobbies] == [40, 20, 10]
+    for lobby in lobbies:
+        assert [p.playerID for p in lobby.players] == [1, 2]
+        assert all(isinstance(p, PlayerPreGame) for p in lobby.players)
+    assert lobbies[1].teams[0][0].name == "late" # the higher rated player is player 1
+    assert lobbies[1].teams[0][0].selectedRace.type == c.ZERG
+    assert len(queue) == 1 and "p5" in queue # nobody is within reach of 3000
+
+
+def test_places_most_players_with_least_spread():
+    queue = MatchmakingQueue()
+    queue.enqueueMany(queuedPlayers([100, 110, 200, 210, 220]))
+    lobbies = queue.makeLobbies()
+    assert sum(lobby.spread for lobby in lobbies) == 20
+    assert len(queue) == 1
+
+
+def test_balanced_teams():
+    queue = MatchmakingQueue(teamSize=2)
+    queue.enqueueMany(queuedPlayers([1000, 1100, 1200, 1300]))
+    lobby, = queue.makeLobbies()
+    assert [[p.name for p in team] for team in lobby.teams] == [["p3", "p0"], ["p2", "p1"]]
+    assert [p.playerID for p in lobby.players] == [1, 2, 3, 4]
+    assert not queue
+
+
+def test_dequeue(playersFolder):
+    queue = MatchmakingQueue()
+    queue.enqueueMany(["test", ("blizzbotx_cheat3", c.PROTOSS), "defaulthuman"])
+    queue.enqueue("defaulthuman", rating=50) # requeue with a new rating
+    queue.dequeue("test")
+    queue.dequeue("unknown")
+    assert len(queue) == 2 and "test" not in queue
+    lobby, = queue.makeLobbies()
+    assert lobby.spread == 594 - 50
+    with pytest.raises(ValueError):
+        MatchmakingQueue(numTeams=1)
@@ -0,0 +1,53 @@
+
+from sc2players.playerNames import NameIndex, EXACT, PREFIX, SUBSTRING, SIMILAR, editDistance
+import sc2players
+
+
+def test_edit_distance():
+    assert editDistance("kitten", "sitting") == 3
+    assert editDistance("kitten", "sitting", limit=2) is None
+    assert editDistance("", "abc") == 3
+
+
+def test_name_index():
+    index = NameIndex(["alpha", "alphabet", "beta", "gamma", "alphonse", "zalpha"])
+    assert index.prefixed("alph") == ["alpha", "alphabet", "alphonse"]
+    assert index.prefixed("alph", limit=1) == ["alpha"]
+    assert index.containing("lph") == ["alpha", "alphabet", "alphonse", "zalpha"]
+    assert index.containing("a") == ["alpha", "alphabet", "alphonse", "beta", "gamma", "zalpha"]
+    assert index.similar("gamme") == [(1, "gamma")]
+    assert index.search("alpha") == [(EXACT, "alpha"), (PREFIX, "alphabet"), (SUBSTRING, "zalpha")]
+    assert index.search("alphons", limit=1) == [(PREFIX, "alphonse")]
+    assert index.search("bteta") == [(SIMILAR, "beta")]
+    index.remove("alphabet")
+    index.remove("missing")
+    assert "alphabet" not in index and len(index) == 5
+    assert index.prefixed("alph") == ["alpha", "alphonse"]
+    for name in ["alpha", "beta", "gamma", "alphonse"]:
+        index.remove(name) # enough removals to rebuild the postings
+    assert list(index) == ["zalpha"] and index.containing("alp") == ["zalpha"]
+    index.add("alphabet")
+    assert index.search("alpha") == [(PREFIX, "alphabet"), (SUBSTRING, "zalpha")]
+
+
+def test_short_queries():
+    names = ["ab", "b", "abc", "cab", "bcd", "xyzzy", "a" * 20]
+    index = NameIndex(reversed(names)) # unsorted input
+    assert list(index) == sorted(names)
+    for text in ["", "a", "b", "ab", "zz", "aa", "q"]:
+        assert index.containing(text) == sorted(n for n in names if text in n)
+    assert index.search("ab", limit=2) == [(EXACT, "ab"), (PREFIX, "abc")]
+    index.update(["zab", "ab", "aab"])
+    assert list(index) == sorted(names + ["zab", "aab"])
+    assert index.containing("ab") == ["aab", "ab", "abc", "cab", "zab"]
+
+
+def test_find_players(playersFolder):
+    assert [p.name for p in sc2players.findPlayers("blizzbot5")] == ["blizzbot5_hard"]
+    assert [p.name for p in sc2players.findPlayers("tset")] == ["test"]
+    names = [p.name.lower() for p in sc2players.findPlayers("cheat", limit=None)]
+    assert names == ["blizzbotx_cheat1", "blizzbotx_cheat2", "blizzbotx_cheat3"]
+    sc2players.addPlayer({"name": "tester", "type": "human"})
+    assert [p.name for p in sc2players.findPlayers("test")] == ["test", "tester"]
+    sc2players.delPlayer("test")
+    assert [p.name for p in sc2players.findPlayers("test")] == ["tester"]
@@ -0,0 +1,52 @@
+
+import pytest
+
+from sc2players import playerRatings
+from sc2players.playerRatings import WIN, DRAW, LOSS
+import sc2players
+
+
+@pytest.fixture(params=["numpy", "python"])
+def useNumpy(request):
+    if request.param == "numpy": pytest.importorskip("numpy")
+    return request.param == "numpy"
+
+
+def test_schedule_preserves_each_players_order():
+    games = [("a", "b"), ("c", "d"), ("a", "c"), ("b", "d"), ("e", "f"), ("a", "b")]
+    assert playerRatings.scheduleRounds(games) == [[0, 1, 4], [2, 3], [5]]
+    with pytest.raises(ValueError):
+        playerRatings.scheduleRounds([("a", "a")])
+
+
+def test_rate_games(useNumpy):
+    ratings = {"a": 1500, "b": 1500, "c": 1700}
+    games = [("a", "b", WIN), ("a", "c", DRAW), ("b", "c", LOSS)]
+    new, after = playerRatings.rateGames(ratings, games, kFactor=32, useNumpy=useNumpy)
+    a, b, c = 1500.0, 1500.0, 1700.0 # rated one game after another
+    for p, o, score in [("a", "b", WIN), ("a", "c", DRAW), ("b", "c", LOSS)]:
+        current = {"a": a, "b": b, "c": c}
+        change = 32 * (score - playerRatings.expectedScore(current[p], current[o]))
+        current[p] += change
+        current[o] -= change
+        a, b, c = current["a"], current["b"], current["c"]
+    assert new == pytest.approx({"a": a, "b": b, "c": c})
+    assert after[0] == pytest.approx((1516, 1484))
+    assert sum(new.values()) == pytest.approx(4700) # elo is zero-sum
+
+
+def test_apply_results(playersFolder):
+    sc2players.addPlayers([{"name": "p%d"%i, "type": "human", "rating": 1000} for i in range(3)])
+    players = sc2players.applyResults([("p0", "p1"), ("p1", "p2", DRAW), ("p0", "p2")], history=True)
+    assert sorted(p.name for p in players) == ["p0", "p1", "p2"]
+    ratings = dict((p.name, p.rating) for p in players)
+    assert ratings["p0"] > 1000 > ratings["p2"]
+    sc2players.getKnownPlayers(reset=True)
+    assert sc2players.getPlayer("p0").rating == ratings["p0"] # stored
+    assert sc2players.getLadder().ratingOf("p0") == ratings["p0"]
+    assert [rating for when, rating in playerRatings.loadHistory("p0")] == [1016, ratings["p0"]]
+    assert len(playerRatings.loadHistory("p2")) == 2
+    sc2players.updatePlayer("p0", {"name": "p9"})
+    assert len(playerRatings.loadHistory("p9")) == 2
+    sc2players.delPlayer("p9")
+    assert playerRatings.loadHistory("p9") == []
@@ -0,0 +1,39 @@
+
+import pytest
+
+from sc2players import constants as c
+from sc2players.playerRecord import PlayerRecord
+
+
+def test_update_coercion():
+    p = PlayerRecord(name="MixedCase", type="bot", initCmd="Pkg.Mod.Init",
+        initOptions="{raw:true, 'speed':1.5, steps:8}", rating="612")
+    assert p.name == "mixedcase"
+    assert p.type == c.BOT
+    assert p.initCmd == "Pkg.Mod.Init"
+    assert p.initOptions == {"raw": True, "speed": 1.5, "steps": 8}
+    assert p.rating == 612
+    with pytest.raises(ValueError):
+        p.update({"notAnAttribute": 1})
+    with pytest.raises(ValueError):
+        p.update({"difficulty": "hard"})
+
+
+def test_fromTrustedDict():
+    source = PlayerRecord(name="bot7", type="computer", difficulty="veryhard", rating=1234)
+    p = PlayerRecord.fromTrustedDict(source.simpleAttrs)
+    assert p.simpleAttrs == source.simpleAttrs
+    assert p.difficulty == c.VERYHARD and p.isComputer
+    assert not p.isDirty and source.isDirty
+
+
+def test_compact_layout():
+    a = PlayerRecord(name="a", type="computer", difficulty="hard")
+    b = PlayerRecord.fromTrustedDict(dict(a.simpleAttrs, name="b"))
+    assert not hasattr(a, "__dict__")
+    assert a.type is b.type and a.difficulty is b.difficulty
+    assert PlayerRecord(name="h").difficulty is PlayerRecord(name="i").difficulty # shared while unused
+    assert a.attrs["initOptions"] == {} and a._initOptions is None
+    a.initOptions["raw"] = True # still a mutable dict once used
+    assert a.simpleAttrs["initOptions"] == {"raw": True}
+    assert PlayerRecord(a).simpleAttrs == dict(a.simpleAttrs, created=a.created)
@@ -0,0 +1,137 @@
+
+import os
+
+import pytest
+from six import iteritems
+
+from sc2players import constants as c
+from sc2players import playerStorage
+from sc2players.playerRegistry import PlayerRegistry
+import sc2players
+
+
+def test_lazy_lookup(playersFolder):
+    registry = PlayerRegistry()
+    player = registry["blizzbot5_hard"]
+    assert player.rating == 457
+    assert registry.isLoaded("blizzbot5_hard")
+    assert not registry.isLoaded("test")
+    assert "blizzbotx_cheat3" in registry # stored name differs in case
+    assert "nobody" not in registry
+
+
+def test_own_storage(playersFolder, tmpdir):
+    storage = playerStorage.JsonFolderStorage(str(tmpdir))
+    storage.save("onlyhere", {"name": "onlyhere", "type": "human", "rating": 42})
+    registry = PlayerRegistry(storage=storage)
+    assert "onlyhere" in registry and registry["onlyhere"].rating == 42 # not the active backend's
+    storage.save("onlyhere", {"name": "onlyhere", "type": "human", "rating": 43})
+    assert registry.refresh().updated == ["onlyhere"] and registry["onlyhere"].rating == 43
+
+
+def test_dict_interface(playersFolder):
+    registry = PlayerRegistry()
+    assert len(registry) == 14
+    assert not registry.isLoaded("test")
+    records = dict(iteritems(registry))
+    assert records["test"].initOptions == {"raw": True}
+    del registry["test"]
+    assert len(registry) == 13 and "test" not in registry
+
+
+def test_getPlayer_single_load(playersFolder):
+    cache = sc2players.getKnownPlayers(reset=True)
+    sc2players.getPlayer("efishandsee")
+    assert [n for n in cache._records] == ["efishandsee"]
+
+
+def test_refresh(playersFolder):
+    registry = PlayerRegistry()
+    registry["blizzbot5_hard"] # loaded, so a change to it is re-parsed
+    first = registry.refresh() # the first scan reports every player not yet known
+    assert len(first.added) == 13 and "blizzbot5_hard" not in first.added
+    storage = registry.storage
+    attrs = storage.load("blizzbot5_hard")
+    attrs["rating"] = 999
+    storage.save("blizzbot5_hard", attrs)
+    storage.save("newcomer", {"name": "newcomer", "type": "human"})
+    storage.delete("test")
+    changes = registry.refresh()
+    assert changes.added == ["newcomer"]
+    assert changes.updated == ["blizzbot5_hard"]
+    assert changes.removed == ["test"]
+    assert registry["blizzbot5_hard"].rating == 999
+    assert registry.refresh() == ([], [], [])
+
+
+@pytest.mark.parametrize("useProcesses", [False, True])
+def test_parallel_load(playersFolder, useProcesses):
+    registry = PlayerRegistry()
+    registry.loadAll(workers=3, useProcesses=useProcesses)
+    assert all(registry.isLoaded(name) for name in registry)
+    assert registry["blizzbot5_hard"].rating == 457
+
+
+def test_parallel_load_errors(playersFolder):
+    for name in ["zzbroken", "aabroken"]:
+        with open(os.path.join(playersFolder, "player_%s.json"%name), "w") as f:
+            f.write("{not json")
+    registry = PlayerRegistry()
+    with pytest.raises(c.InvalidPlayerRecordsException) as err:
+        registry.loadAll(workers=2, useProcesses=False)
+    assert [name for name, reason in err.value.errors] == ["aabroken", "zzbroken"]
+    assert registry.isLoaded("test")
+
+
+def test_lru_eviction(playersFolder):
+    stats = sc2players.setCachePolicy(maxRecords=12)
+    cache = sc2players.getKnownPlayers()
+    assert stats.records == 0 and len(cache.pinned) == 10 # the blizzard bots, found without loading them
+    assert cache._index_ is None
+    sc2players.getBlizzBotPlayers()
+    for name in ["test", "defaulthuman", "test", "efishandsee"]: # test is used more recently
+        sc2players.getPlayer(name)
+    assert cache.isLoaded("test") and not cache.isLoaded("defaulthuman")
+    assert all(cache.isLoaded(name) for name in cache.pinned)
+    stats = sc2players.getCacheStats()
+    assert stats.evictions == 1 and stats.records == 12
+    assert stats.hits == 1 and stats.misses == 13
+    assert sc2players.getPlayer("defaulthuman").name == "defaulthuman" # transparently reloaded
+    player = sc2players.getPlayer("mapexplorer")
+    player.rating = 5 # unsaved changes are never evicted
+    for name in ["test", "defaulthuman", "efishandsee"]:
+        sc2players.getPlayer(name)
+    assert cache.isLoaded("mapexplorer")
+    player.markClean()
+    sc2players.loadKnownPlayers(workers=1)
+    assert sc2players.getPlayer("efishandsee").initOptions is not None # read, not changed
+    sc2players.getPlayer("test"), sc2players.getPlayer("defaulthuman")
+    stats = sc2players.setCachePolicy(maxRecords=2, pinned=[]) # loaded records are clean, so evictable
+    assert stats.records == 2 and not cache.isLoaded("efishandsee")
+
+
+def test_byte_bound(playersFolder):
+    sc2players.setCachePolicy(maxBytes=1, pinned=["test"])
+    for name in sc2players.getKnownPlayers():
+        sc2players.getPlayer(name)
+    stats = sc2players.getCacheStats()
+    assert stats.records == 1 and sc2players.getKnownPlayers().isLoaded("test")
+    assert stats.evictions == 13
+    sc2players.setCachePolicy(pinned=[]) # unbounded again
+    sc2players.loadKnownPlayers(workers=1)
+    assert sc2players.getCacheStats().records == 14
+    stats = sc2players.setCachePolicy(maxBytes=1, pinned=[]) # players loaded while unbounded are sized too
+    assert stats.records == 0 and stats.bytes == 0 and stats.evictions == 27
+
+
+def test_refresh_after_write_behind(playersFolder):
+    storage = playerStorage.setWriteBehind(60)
+    registry = sc2players.getKnownPlayers(reset=True)
+    registry.refresh()
+    sc2players.updatePlayer("test", {"rating": 601})
+    assert registry.refresh() == ([], [], []) # held
+    sc2players.flushPlayers()
+    assert registry.refresh() == ([], [], []) # this process's own write
+    storage.backend.save("test", dict(storage.backend.load("test"), rating=123456)) # another process's
+    assert registry.refresh().updated == ["test"]
+    playerStorage.setWriteBehind(False)
@@ -0,0 +1,70 @@
+
+import multiprocessing
+import os
+
+import pytest
+
+from sc2players import playerSnapshot
+from sc2players import playerStorage
+import sc2players
+
+
+@pytest.fixture
+def snapshot(playersFolder):
+    filename = os.path.join(playersFolder, "players.snapshot")
+    sc2players.updatePlayer("efishandsee", {"rating": 1234})
+    assert sc2players.snapshotPlayers(filename) == 14
+    expected = dict((name, player.simpleAttrs) for name, player in sc2players.getKnownPlayers().items())
+    sc2players.attachSnapshot(filename)
+    yield expected
+    sc2players.detachSnapshot()
+
+
+def test_lookups(snapshot):
+    registry = sc2players.getKnownPlayers()
+    assert isinstance(registry, playerSnapshot.SnapshotRegistry) and len(registry) == 14
+    assert sorted(registry) == sorted(snapshot)
+    for name, attrs in snapshot.items():
+        assert sc2players.getPlayer(name.upper()).simpleAttrs == attrs
+    assert sc2players.getPlayer("efishandsee").rating == 1234
+    assert sc2players.getPlayer("test") is sc2players.getPlayer("test") # decoded once
+    assert "unknown" not in registry
+    with pytest.raises(ValueError):
+        sc2players.getPlayer("unknown")
+    assert sorted(sc2players.getBlizzBotPlayers()) == sorted(n for n in snapshot if n.startswith("blizzbot"))
+    assert [p.name for p in sc2players.findPlayers("tset")] == ["test"]
+    assert registry.stats.misses == 14
+
+
+def test_listing(snapshot):
+    assert sorted(p.name.lower() for p in sc2players.listPlayers()) == sorted(snapshot)
+    assert sc2players.refreshKnownPlayers() == ([], [], [])
+    assert sc2players.setCachePolicy(maxRecords=1).records == 14 # nothing to evict from a shared snapshot
+
+
+def test_read_only(snapshot):
+    with pytest.raises(TypeError):
+        sc2players.updatePlayer("test", {"rating": 1})
+    with pytest.raises(TypeError):
+        sc2players.addPlayer({"name": "new", "type": "human"})
+    assert not playerStorage.getStorage().exists("new") # refused before anything was stored
+
+
+def decodeAll(filename, queue):
+    registry = playerSnapshot.SnapshotRegistry(filename)
+    queue.put(sorted((name, registry[name].rating) for name in registry))
+
+
+def test_shared_with_workers(snapshot):
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    worker = context.Process(target=decodeAll, args=(sc2players.getKnownPlayers().filename, queue))
+    worker.start()
+    assert queue.get(timeout=30) == sorted((name, attrs["rating"]) for name, attrs in snapshot.items())
+    worker.join()
+
+
+def test_not_a_snapshot(playersFolder):
+    filename = os.path.join(playersFolder, "player_test.json")
+    with pytest.raises(ValueError):
+        playerSnapshot.SnapshotRegistry(filename)
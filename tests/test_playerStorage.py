@@ -0,0 +1,127 @@
+import os
+
+import threading
+
+import pytest
+
+from sc2players import constants as c
+from sc2players import playerStorage
+import sc2players
+
+
+def test_sqlite_migration(playersFolder):
+    names = sorted(sc2players.getKnownPlayers())
+    assert sc2players.migratePlayers(c.STORAGE_SQLITE) == len(names)
+    playerStorage.setStorage(c.STORAGE_SQLITE)
+    assert sorted(playerStorage.getStorage().names()) == names
+    assert sc2players.getPlayer("blizzbot5_hard").rating == 457
+    assert sc2players.getPlayer("test").initOptions == {"raw": True}
+
+
+@pytest.mark.parametrize("kind", [c.STORAGE_JSON, c.STORAGE_SQLITE])
+def test_add_update_remove(playersFolder, kind):
+    playerStorage.setStorage(kind)
+    sc2players.addPlayer({"name": "newbie", "type": "human", "rating": 321})
+    assert playerStorage.getStorage().load("newbie")["rating"] == 321
+    sc2players.updatePlayer("newbie", {"rating": 654})
+    assert playerStorage.getStorage().load("newbie")["rating"] == 654
+    sc2players.delPlayer("newbie")
+    assert not playerStorage.getStorage().exists("newbie")
+    with pytest.raises(ValueError):
+        sc2players.getPlayer("newbie")
+
+
+@pytest.mark.parametrize("kind", [c.STORAGE_JSON, c.STORAGE_SQLITE])
+def test_namesWhere(playersFolder, kind):
+    bots = sorted(sc2players.getBlizzBotPlayers())
+    if kind == c.STORAGE_SQLITE:
+        sc2players.migratePlayers(kind)
+        playerStorage.setStorage(kind)
+    storage = playerStorage.setWriteBehind(60)
+    computers = lambda: sorted(name.lower() for name in storage.namesWhere("type", c.COMPUTER)) # as stored
+    assert computers() == bots
+    storage.delete("blizzbot1_veryeasy")
+    storage.save("newbot", dict(storage.load("blizzbot2_easy"), name="newbot"))
+    assert computers() == sorted(bots[1:] + ["newbot"]) # includes held changes
+    playerStorage.setWriteBehind(False)
+
+
+def test_save_only_when_dirty(playersFolder):
+    player = sc2players.getPlayer("test")
+    assert not player.isDirty and not player.save()
+    player.rating = 500 # unchanged value
+    assert not player.isDirty
+    player.rating = 777
+    assert player.isDirty and player.save() and not player.isDirty
+    assert playerStorage.getStorage().load("test")["rating"] == 777
+    player.initOptions["raw"] = False # modified in place
+    assert player.save()
+    assert playerStorage.getStorage().load("test")["initOptions"] == {"raw": False}
+    options = player.initOptions # only reading them changes nothing
+    assert not player.isDirty and not player.save()
+    options["raw"] = True # ...unless they are then modified in place
+    assert player.isDirty and player.save()
+
+
+def test_write_behind(playersFolder):
+    storage = playerStorage.setWriteBehind(60)
+    player = sc2players.getPlayer("test")
+    for rating in range(600, 610):
+        player.rating = rating
+        player.save()
+    assert storage.pending == 1
+    assert storage.load("test")["rating"] == 609 # readers see held changes
+    assert storage.backend.load("test")["rating"] == 500
+    sc2players.flushPlayers()
+    assert storage.pending == 0
+    assert storage.backend.load("test")["rating"] == 609
+    playerStorage.setWriteBehind(False)
+    assert not isinstance(playerStorage.getStorage(), playerStorage.WriteBehindStorage)
+
+
+def test_write_behind_alongside_locked_writes(playersFolder):
+    playerStorage.setWriteBehind(0.0005) # timer flushes interleave with the writes below
+    writers = [threading.Thread(target=lambda: [sc2players.updatePlayer("test", {"rating": i}) for i in range(200)])
+        for n in range(2)]
+    for t in writers: t.start()
+    for t in writers: t.join(timeout=30)
+    assert not [t for t in writers if t.is_alive()] # no deadlock
+    playerStorage.setWriteBehind(False)
+    assert playerStorage.getStorage().load("test")["rating"] == 199
+
+
+def test_sqlite_shared_across_threads(playersFolder):
+    sc2players.migratePlayers(c.STORAGE_SQLITE)
+    storage = playerStorage.SqliteStorage() # connects upon first use, from whichever thread is first
+    names = sorted(storage.names())
+    errors = []
+    def reader():
+        try:
+            for i in range(50):
+                assert sorted(storage.names()) == names
+                assert storage.load("test")["name"] == "test" and storage.signature("test")
+        except Exception as e: errors.append(e)
+    def writer():
+        try:
+            for i in range(50):
+                storage.save("test", dict(storage.load("test"), rating=i))
+        except Exception as e: errors.append(e)
+    threads = [threading.Thread(target=target) for target in [reader, reader, writer, reader]]
+    for t in threads: t.start()
+    for t in threads: t.join(timeout=30)
+    storage.close()
+    assert not errors and not [t for t in threads if t.is_alive()]
+
+
+@pytest.mark.parametrize("kind", [c.STORAGE_JSON, c.STORAGE_SQLITE])
+def test_player_filename(playersFolder, kind):
+    if kind == c.STORAGE_SQLITE:
+        sc2players.migratePlayers(kind)
+        playerStorage.setStorage(kind)
+    sc2players.convertPlayers(c.CODEC_BINARY)
+    player = sc2players.getPlayer("test")
+    storage = playerStorage.setWriteBehind(60)
+    if kind == c.STORAGE_JSON:  assert player.filename.endswith("player_test.sc2pr")
+    else:                       assert player.filename == os.path.abspath(storage.location)
+    assert os.path.isfile(player.filename)
+    playerStorage.setWriteBehind(False)